@@ -0,0 +1,271 @@
+"""
+Plans routes for many takeoff/landing pairs across many maps, offline.
+
+The manifest is NDJSON, one map per line (relative paths are relative to the manifest):
+    {"map": "maps/north.png", "satellite": "maps/north_sat.png",
+     "topLeft": [177700, 613500], "bottomRight": [178200, 613000],
+     "pairs": [{"id": "a1", "takeoff": [177750, 613400], "landing": [178100, 613100]}, ...]}
+Pair coordinates are real-world coordinates, like the API's; "id" defaults to the pair's index.
+
+Maps are spread over a process pool. Each worker preprocesses its map once (through the map
+cache and the upload store, so maps seen before are not processed again), attaches every pair
+endpoint to one copy of the skeleton graph and runs one multi-target Dijkstra per takeoff point.
+
+Results are appended to the output file as NDJSON while they are computed: one "pair" record per
+pair (path, length and timings) and one "map" record per map. Running again with the same output
+file skips the pairs that already have a record (failed pairs are retried).
+
+Usage:
+    python -m batch.batch_planner manifest.ndjson --output results.ndjson [--workers N] [--render]
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import queue
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from core.graph_builder import attach_points
+from core.pathfinder import dijkstra_many, reconstruct_path, optimize_path
+from core.metrics import compute_path_length
+from services.mission_utils import pixel_to_real, real_to_pixel
+from services.map_cache import get_map, map_cache
+
+# כל worker שולח את הרשומות דרך התור הזה, והתהליך הראשי כותב אותן לקובץ לפי הסדר שבו הגיעו
+_results = None
+
+
+def _init_worker(results):
+    global _results
+    _results = results
+
+
+def _emit(record):
+    _results.put(json.dumps(record))
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Reads the manifest; entries of the same map are merged into one task
+def read_manifest(manifest_path):
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    tasks = {}
+    with open(manifest_path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            map_path = os.path.normpath(os.path.join(base, entry["map"]))
+            task = tasks.setdefault(map_path, {
+                "map": entry["map"],
+                "path": map_path,
+                "satellite": os.path.normpath(os.path.join(base, entry["satellite"])) if entry.get("satellite") else None,
+                "corners": (*entry["topLeft"], *entry["bottomRight"]),
+                "pairs": [],
+            })
+            for index, pair in enumerate(entry["pairs"]):
+                task["pairs"].append({
+                    "id": str(pair.get("id", f"{line_number}:{index}")),
+                    "takeoff": tuple(pair["takeoff"]),
+                    "landing": tuple(pair["landing"]),
+                })
+    return list(tasks.values())
+
+
+# Returns {(map, pair id)} of the pairs that already have a successful record in the output file
+def completed_pairs(output_path):
+    done = set()
+    if not os.path.isfile(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # שורה חלקית מריצה שנקטעה
+            if record.get("type") == "pair" and record.get("status") != "error":
+                done.add((record["map"], record["pair"]))
+    return done
+
+
+def _to_pixel(real, corners, width, height):
+    pixel = real_to_pixel(real[0], real[1], corners, width, height)
+    if not (0 <= pixel[0] < width and 0 <= pixel[1] < height):
+        raise ValueError(f"Point ({real[0]}, {real[1]}) is outside the map.")
+    return pixel
+
+
+# Routes every pair of one map (runs in a worker); records are emitted as they are computed
+def plan_map(task, render=False):
+    started = time.perf_counter()
+    seconds = {}
+    pair_records = {"ok": 0, "no-path": 0, "error": 0}
+
+    def emit_pair(pair, status, **fields):
+        pair_records[status] += 1
+        _emit({"type": "pair", "map": task["map"], "pair": pair["id"], "status": status, **fields})
+
+    try:
+        t = time.perf_counter()
+        digest = _file_digest(task["path"])
+        map_artifacts = get_map(task["path"], digest)
+        seconds["load"] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        final_image, node_list, adjacency_dict = map_artifacts.skeleton_graph()
+        seconds["graph"] = time.perf_counter() - t
+    except Exception as ex:
+        _emit({"type": "map", "map": task["map"], "status": "error", "error": str(ex),
+               "seconds": {**seconds, "total": time.perf_counter() - started}})
+        return task["map"]
+
+    building_mask = map_artifacts.building_mask
+    height, width = building_mask.shape[:2]
+    corners = task["corners"]
+
+    # כל נקודות הקצה מחוברות פעם אחת לאותו עותק של הגרף; זוג שהקו ביניהם פנוי מקבל קשת ישירה
+    t = time.perf_counter()
+    points, index, pairs = [], {}, []
+    for pair in task["pairs"]:
+        try:
+            ends = [_to_pixel(pair[key], corners, width, height) for key in ("takeoff", "landing")]
+        except ValueError as ex:
+            emit_pair(pair, "error", error=str(ex))
+            continue
+        for pixel in ends:
+            if pixel not in index:
+                index[pixel] = len(points)
+                points.append(pixel)
+        pairs.append((pair, *ends))
+    failed = attach_points(points, adjacency_dict, building_mask, final_image, node_list,
+                           direct_pairs=sorted({(index[a], index[b]) for _, a, b in pairs if a != b}))
+    seconds["attach"] = time.perf_counter() - t
+    if failed is not None:
+        for pair, _, _ in pairs:
+            emit_pair(pair, "error", error=f"Could not connect point {points[failed]} to the graph.")
+        pairs = []
+
+    # חיפוש אחד מכל נקודת המראה לכל נקודות הנחיתה שלה
+    by_takeoff = {}
+    for pair, takeoff, landing in pairs:
+        by_takeoff.setdefault(takeoff, []).append((pair, landing))
+    for takeoff, group in by_takeoff.items():
+        t = time.perf_counter()
+        distances, came_from = dijkstra_many(takeoff, [landing for _, landing in group], adjacency_dict)
+        search_seconds = time.perf_counter() - t
+        for pair, landing in group:
+            item_started = time.perf_counter()
+            timings = {"search": search_seconds}
+            if distances[landing] == float('inf'):
+                emit_pair(pair, "no-path", seconds=timings, searchSharedBy=len(group))
+                continue
+            path = reconstruct_path(came_from, takeoff, landing) if landing != takeoff else [takeoff]
+            t = time.perf_counter()
+            path_int = [(int(x), int(y)) for (x, y) in optimize_path(path, building_mask)]
+            timings["optimize"] = time.perf_counter() - t
+            real_path = [pixel_to_real(x, y, corners, width, height) for (x, y) in path_int]
+            fields = {
+                "lengthPixels": compute_path_length(path_int),
+                "routeLength": compute_path_length(real_path),
+                "path": [{"x": x, "y": y} for (x, y) in real_path],
+            }
+            if render:
+                t = time.perf_counter()
+                outputs = render_pair(task, final_image, path_int)
+                timings["render"] = time.perf_counter() - t
+                fields.update(outputs)
+            timings["total"] = search_seconds / len(group) + time.perf_counter() - item_started
+            emit_pair(pair, "ok", seconds=timings, searchSharedBy=len(group), **fields)
+
+    # המפה לא תשמש שוב ב-worker הזה
+    map_cache.invalidate(digest)
+    _emit({"type": "map", "map": task["map"], "status": "ok", "pairs": pair_records,
+           "nodes": len(node_list), "seconds": {**seconds, "total": time.perf_counter() - started}})
+    return task["map"]
+
+
+# Route image, satellite image and coordinates file of one pair, stored like the API's outputs
+def render_pair(task, final_image, path_int):
+    from services.mission_io import render_mission_outputs
+    response = render_mission_outputs(path_int, final_image, task["satellite"], *task["corners"], verbose=False)
+    return {key: value for key, value in response.items() if key.endswith("Url")}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Plan routes for a manifest of maps and takeoff/landing pairs.")
+    parser.add_argument("manifest", help="NDJSON manifest, one map per line")
+    parser.add_argument("--output", required=True, help="NDJSON results file; appended to, so a run can be resumed")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes (default: CPU count)")
+    parser.add_argument("--render", action="store_true",
+                        help="also render route and satellite images (the map entries need a satellite image)")
+    args = parser.parse_args(argv)
+
+    tasks = read_manifest(args.manifest)
+    if args.render:
+        missing = [task["map"] for task in tasks if not task["satellite"]]
+        if missing:
+            parser.error(f"--render needs a satellite image for: {', '.join(missing)}")
+
+    done = completed_pairs(args.output)
+    total_pairs = sum(len(task["pairs"]) for task in tasks)
+    for task in tasks:
+        task["pairs"] = [pair for pair in task["pairs"] if (task["map"], pair["id"]) not in done]
+    tasks = [task for task in tasks if task["pairs"]]
+    remaining = sum(len(task["pairs"]) for task in tasks)
+    print(f"{len(tasks)} maps, {remaining} of {total_pairs} pairs to plan "
+          f"({total_pairs - remaining} already done), {args.workers} workers", file=sys.stderr)
+
+    started = time.perf_counter()
+    results = multiprocessing.get_context().Queue()
+    written = 0
+    with open(args.output, "a", encoding="utf-8") as output, \
+            ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(results,)) as pool:
+        futures = {pool.submit(plan_map, task, args.render): task for task in tasks}
+
+        def write(record):
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+
+        # ריצה שנקטעה באמצע שורה – הרשומה הבאה מתחילה בשורה חדשה
+        if output.tell() > 0:
+            with open(args.output, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    output.write("\n")
+
+        # רשומת ה-map היא האחרונה של כל מפה; ממשיכים עד שהגיעה אחת לכל מפה
+        maps_left = len(tasks)
+        while maps_left:
+            try:
+                record = json.loads(results.get(timeout=1))
+            except queue.Empty:
+                # worker שנפל באמצע מפה לא ישלח את רשומת ה-map שלה
+                for future in [f for f in futures if f.done() and f.exception() is not None]:
+                    task = futures.pop(future)
+                    write({"type": "map", "map": task["map"], "status": "error", "error": str(future.exception())})
+                    maps_left -= 1
+                continue
+            write(record)
+            if record["type"] == "pair":
+                written += 1
+            else:
+                maps_left -= 1
+                print(f"[{written}/{remaining}] {record['map']}: {record['status']} "
+                      f"in {record['seconds']['total']:.2f}s", file=sys.stderr)
+    print(f"Planned {written} pairs in {time.perf_counter() - started:.1f}s → {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
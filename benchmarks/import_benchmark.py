@@ -0,0 +1,65 @@
+"""
+Measures worker startup cost: the time to import the application in a fresh interpreter.
+
+Three scenarios are timed, each in its own subprocess so nothing is cached between runs:
+  - eager:   the heavy imports the old shared.dependencies ran at import time, then `import main`
+  - lazy:    `import main` with the lazy-loading shared.dependencies
+  - warm-up: `import main` followed by dependencies.warm_up()
+
+Usage:
+    python -m benchmarks.import_benchmark [--repeat N]
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+EAGER_IMPORTS = """
+import cv2
+import numpy as np
+import matplotlib.pyplot as plt
+from skimage.morphology import skeletonize
+from skimage.measure import label, regionprops
+from skimage.draw import line
+"""
+
+SCENARIOS = {
+    "eager": EAGER_IMPORTS + "import main\n",
+    "lazy": "import main\n",
+    "warm-up": "import main\nmain.dependencies.warm_up()\n",
+}
+
+TIMER = """
+import sys, time, json
+sys.path.insert(0, {root!r})
+_start = time.perf_counter()
+{body}
+print(json.dumps({{"seconds": time.perf_counter() - _start, "modules": len(sys.modules)}}))
+"""
+
+
+def time_scenario(body):
+    code = TIMER.format(root=os.path.abspath(ROOT), body=body)
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark application import time with eager and lazy dependencies.")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    print(f"{'scenario':<10} {'median s':>9} {'min s':>9} {'modules':>8}")
+    for name, body in SCENARIOS.items():
+        runs = [time_scenario(body) for _ in range(args.repeat)]
+        seconds = [r["seconds"] for r in runs]
+        print(f"{name:<10} {statistics.median(seconds):>9.3f} {min(seconds):>9.3f} {runs[-1]['modules']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmarks the planning engines on the same maps.
+
+Each map must be a buildings image with one green (takeoff) and one red (landing) pixel.
+For every map the skeleton engine (skeleton graph + Dijkstra + optimize_path), the
+Theta* engine and the visibility-graph engine are timed, and their path lengths are
+compared, so each map can be sent to the faster engine.
+
+Usage:
+    python -m benchmarks.planner_benchmark [map.png ...] [--repeat N] [--downsample F] [--output results.json]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from shared import dependencies as dep
+from core.image_loader import load_and_preprocess_image
+from core.graph_builder import build_skeleton_graph, add_point_to_graph
+from core.pathfinder import dijkstra, optimize_path
+from core.theta_star import theta_star
+from core.visibility_graph import build_visibility_graph, visibility_path
+from core.metrics import compute_path_length
+from services.mission_utils import find_color_pixel
+
+GREEN = (0, 255, 0)
+RED = (0, 0, 255)
+
+DEFAULT_MAPS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'static', 'uploads')
+
+
+def run_skeleton(binary_image, building_mask, takeoff, landing):
+    _, _, adjacency_dict = build_skeleton_graph(binary_image)
+    scratch = dep.np.zeros((*building_mask.shape, 3), dtype=dep.np.uint8)
+    if not add_point_to_graph(takeoff, adjacency_dict, building_mask, scratch, ignore_building=True):
+        return None
+    if not add_point_to_graph(landing, adjacency_dict, building_mask, scratch, ignore_building=True):
+        return None
+    path = dijkstra(takeoff, landing, adjacency_dict)
+    if path is None:
+        return None
+    return optimize_path(path, building_mask)
+
+
+def run_theta(binary_image, building_mask, takeoff, landing, downsample):
+    return theta_star(takeoff, landing, building_mask, downsample=downsample)
+
+
+def run_visibility(building_mask, takeoff, landing):
+    return visibility_path(takeoff, landing, build_visibility_graph(building_mask), building_mask)
+
+
+def time_engine(fn, repeat):
+    best = None
+    path = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        path = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, path
+
+
+def benchmark_map(map_path, repeat, downsample):
+    original_image, binary_image = load_and_preprocess_image(map_path)
+    if len(original_image.shape) == 3 and original_image.shape[2] == 4:
+        original_image = dep.cv2.cvtColor(original_image, dep.cv2.COLOR_BGRA2BGR)
+    takeoff = find_color_pixel(original_image, GREEN)
+    landing = find_color_pixel(original_image, RED)
+    if takeoff is None or landing is None:
+        return None
+    building_mask = (binary_image == 1).astype(dep.np.uint8)
+
+    engines = {
+        "skeleton": lambda: run_skeleton(binary_image, building_mask, takeoff, landing),
+        "theta": lambda: run_theta(binary_image, building_mask, takeoff, landing, downsample),
+        "visibility": lambda: run_visibility(building_mask, takeoff, landing),
+    }
+    result = {"map": os.path.basename(map_path), "size": list(building_mask.shape), "engines": {}}
+    for name, fn in engines.items():
+        seconds, path = time_engine(fn, repeat)
+        result["engines"][name] = {
+            "seconds": round(seconds, 4),
+            "path_length": round(compute_path_length(path), 2) if path else None,
+            "nodes": len(path) if path else 0,
+        }
+    found = {k: v for k, v in result["engines"].items() if v["path_length"] is not None}
+    result["fastest"] = min(found, key=lambda k: found[k]["seconds"]) if found else None
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the skeleton, Theta* and visibility planners on the same maps.")
+    parser.add_argument("maps", nargs="*", help="buildings images with takeoff/landing markers")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--downsample", type=int, default=4, help="Theta* grid downsampling factor")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    maps = args.maps or sorted(
+        os.path.join(DEFAULT_MAPS_FOLDER, name)
+        for name in os.listdir(DEFAULT_MAPS_FOLDER) if name.lower().endswith(".png")
+    )
+
+    results = []
+    print(f"{'map':<32} {'engine':<10} {'seconds':>9} {'length px':>10} {'nodes':>6}")
+    for map_path in maps:
+        result = benchmark_map(map_path, args.repeat, args.downsample)
+        if result is None:
+            continue
+        results.append(result)
+        for name, stats in result["engines"].items():
+            length = f"{stats['path_length']:.2f}" if stats["path_length"] is not None else "-"
+            print(f"{result['map']:<32} {name:<10} {stats['seconds']:>9.4f} {length:>10} {stats['nodes']:>6}")
+        print(f"{'':<32} → fastest: {result['fastest']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+from core.pathfinder import dijkstra_many, dijkstra_multi_source, reconstruct_path
+
+# Ranks the bases by route distance to the target with one search from the target.
+# The map graph is undirected, so searching from the target equals the reverse search from every base.
+def rank_bases(target, bases, adjacency_dict, limit=None):
+    distances, came_from = dijkstra_many(target, bases, adjacency_dict)
+    ranked = []
+    for index, base in enumerate(bases):
+        if distances[base] == float('inf'):
+            continue
+        path = reconstruct_path(came_from, target, base)
+        ranked.append({"index": index, "base": base, "distance": distances[base], "path": path[::-1]})
+    ranked.sort(key=lambda item: item["distance"])
+    return ranked[:limit] if limit else ranked
+
+# Finds only the closest base with one multi-source search seeded by all bases
+def nearest_base(target, bases, adjacency_dict):
+    distance, path, base = dijkstra_multi_source(bases, target, adjacency_dict)
+    if path is None:
+        return []
+    return [{"index": bases.index(base), "base": base, "distance": distance, "path": path}]
@@ -1,6 +1,8 @@
 # graphBuilder.py
 
 from shared import dependencies as dep
+from core.skeletonizer import skeletonize_image, remove_deadends, merge_images
+from core.junction_detector import highlight_dense_skeleton_nodes, refine_yellow_nodes
 import math
 
 # Returns all (x, y) points on the line between (x1, y1) and (x2, y2) using Bresenham's algorithm
@@ -84,10 +86,10 @@ def connect_yellow_junctions(merged_image, yellow_mask, skeleton_mask):
             dep.cv2.line(image_with_lines, (start_x, start_y), (end_x, end_y), (255, 0, 0), 1)
     return image_with_lines, node_list, adjacency_dict
 
-# Adds new_xy as a node to adjacency_dict and connects to nearest node if possible
-def add_point_to_graph(new_xy, adjacency_dict, building_mask, image_to_draw, ignore_building=False):
+# Adds new_xy as a node to adjacency_dict and connects to nearest node (out of candidates, default all) if possible
+def add_point_to_graph(new_xy, adjacency_dict, building_mask, image_to_draw, ignore_building=False, candidates=None):
     (new_x, new_y) = new_xy
-    existing_nodes = list(adjacency_dict.keys())
+    existing_nodes = list(adjacency_dict.keys() if candidates is None else candidates)
     if not existing_nodes:
         return [new_xy]
     def dist(a, b):
@@ -106,6 +108,39 @@ def add_point_to_graph(new_xy, adjacency_dict, building_mask, image_to_draw, ign
             return new_xy
     return None
 
+# Returns the nearest candidate whose straight line from new_xy is clear (checking at most max_clear_checks
+# candidates), or the nearest candidate regardless of buildings; None when there are no candidates
+def nearest_clear_node(new_xy, candidates, building_mask, max_clear_checks=50):
+    nodes = sorted((node for node in candidates if node != new_xy),
+                   key=lambda node: math.hypot(new_xy[0] - node[0], new_xy[1] - node[1]))
+    for node in nodes[:max_clear_checks]:
+        if not line_intersects_building(new_xy[0], new_xy[1], node[0], node[1], building_mask):
+            return node
+    return nodes[0] if nodes else None
+
+# Connects every point to its nearest junction (or with `connect`, e.g. connect_to_simplified) and adds a direct edge
+# for each pair (default: all pairs) whose straight line is clear; returns the index of the first point that could
+# not be connected, or None
+def attach_points(points, adjacency_dict, building_mask, image_to_draw, node_list, direct_pairs=None, connect=None):
+    for index, point in enumerate(points):
+        adjacency_dict.setdefault(point, [])
+        if connect is None:
+            connected = add_point_to_graph(point, adjacency_dict, building_mask, image_to_draw,
+                                           ignore_building=True, candidates=node_list)
+        else:
+            connected = connect(point, adjacency_dict, building_mask, image_to_draw, candidates=node_list)
+        if not connected:
+            return index
+    if direct_pairs is None:
+        direct_pairs = [(i, j) for i in range(len(points)) for j in range(i + 1, len(points))]
+    for i, j in direct_pairs:
+        (x1, y1), (x2, y2) = points[i], points[j]
+        if points[i] != points[j] and not line_intersects_building(x1, y1, x2, y2, building_mask):
+            dist = math.hypot(x2 - x1, y2 - y1)
+            adjacency_dict[points[i]].append([points[i], points[j], dist])
+            adjacency_dict[points[j]].append([points[j], points[i], dist])
+    return None
+
 # Returns True if the line between (x1, y1) and (x2, y2) crosses a building in building_mask
 def line_intersects_building(x1, y1, x2, y2, building_mask):
     points_on_line = bresenham_line_points(x1, y1, x2, y2)
@@ -114,4 +149,52 @@ def line_intersects_building(x1, y1, x2, y2, building_mask):
             return True
         if building_mask[py, px] == 1:
             return True
-    return False
\ No newline at end of file
+    return False
+
+# Batched line_intersects_building: returns a boolean array telling which segments (rows of x1, y1, x2, y2)
+# are clear of buildings. Each segment is sampled once per pixel step; at most max_samples points per chunk.
+def segments_clear(segments, building_mask, max_samples=2_000_000):
+    np = dep.np
+    segments = np.asarray(segments, dtype=np.float64).reshape(-1, 4)
+    x1, y1, x2, y2 = segments.T
+    steps = np.maximum(np.abs(x2 - x1), np.abs(y2 - y1)).astype(np.int64) + 1
+    total = np.cumsum(steps)
+    h, w = building_mask.shape
+    clear = np.ones(len(segments), dtype=bool)
+    start = 0
+    while start < len(segments):
+        done = total[start - 1] if start else 0
+        end = max(start + 1, int(np.searchsorted(total, done + max_samples, side="right")))
+        counts = steps[start:end]
+        owner = np.repeat(np.arange(start, end), counts)
+        index = np.arange(len(owner)) - np.repeat(np.cumsum(counts) - counts, counts)
+        t = index / np.maximum(counts - 1, 1)[owner - start]
+        xs = np.rint(x1[owner] + t * (x2 - x1)[owner]).astype(np.int64)
+        ys = np.rint(y1[owner] + t * (y2 - y1)[owner]).astype(np.int64)
+        hit = (xs < 0) | (xs >= w) | (ys < 0) | (ys >= h)
+        inside = ~hit
+        hit[inside] = building_mask[ys[inside], xs[inside]] == 1
+        clear[start:end] = np.bincount(owner[hit] - start, minlength=end - start) == 0
+        start = end
+    return clear
+
+# Runs skeletonize -> prune -> junction detection; returns merged image, junction (yellow) mask and skeleton mask
+def skeleton_junctions(binary_image):
+    skeleton_image = skeletonize_image(binary_image)
+    refined_skeleton = remove_deadends(skeleton_image)
+    merged_image = merge_images(binary_image, refined_skeleton)
+
+    junctions_highlighted = highlight_dense_skeleton_nodes(merged_image)
+    refined_junctions = refine_yellow_nodes(junctions_highlighted)
+
+    yellow_mask = ((refined_junctions[:, :, 0] == 255) &
+                   (refined_junctions[:, :, 1] == 255) &
+                   (refined_junctions[:, :, 2] == 0))
+    skeleton_mask = ((merged_image[:, :, 0] == 0) &
+                     (merged_image[:, :, 1] == 0) &
+                     (merged_image[:, :, 2] == 255))
+    return merged_image, yellow_mask, skeleton_mask
+
+# Runs skeletonize -> prune -> junction detection -> edge tracing; returns image with lines, node list, and adjacency dict
+def build_skeleton_graph(binary_image):
+    return connect_yellow_junctions(*skeleton_junctions(binary_image))
@@ -0,0 +1,202 @@
+from core.graph_builder import line_intersects_building, nearest_clear_node, add_point_to_graph
+import math
+
+DEFAULT_MERGE_RADIUS = 5
+
+# Edge weight as a number; contracted edges store (weight, polyline) like the tuples dijkstra accepts
+def edge_weight(w):
+    return w[0] if isinstance(w, tuple) else w
+
+# Polyline of an edge from u to v (just the two end points for plain edges)
+def edge_geometry(u, v, w):
+    return list(w[1]) if isinstance(w, tuple) else [u, v]
+
+def polyline_length(points):
+    return sum(math.hypot(x2 - x1, y2 - y1) for (x1, y1), (x2, y2) in zip(points, points[1:]))
+
+# Counts nodes and (undirected) edges of an adjacency dict
+def graph_stats(adjacency_dict):
+    return {
+        "nodes": len(adjacency_dict),
+        "edges": sum(len(edges) for edges in adjacency_dict.values()) // 2,
+    }
+
+def _add_edge(adjacency_dict, u, v, polyline):
+    # בין כל זוג צמתים נשמרת רק הקשת הקצרה ביותר
+    weight = polyline_length(polyline)
+    for edge in adjacency_dict[u]:
+        if edge[1] == v:
+            if edge_weight(edge[2]) <= weight:
+                return
+            adjacency_dict[u].remove(edge)
+            adjacency_dict[v] = [e for e in adjacency_dict[v] if e[1] != u]
+            break
+    value = weight if len(polyline) == 2 else (weight, tuple(polyline))
+    adjacency_dict[u].append([u, v, value])
+    adjacency_dict[v].append([v, u, value if len(polyline) == 2 else (weight, tuple(polyline[::-1]))])
+
+def _dedupe(points):
+    out = [points[0]]
+    for p in points[1:]:
+        if p != out[-1]:
+            out.append(p)
+    return out
+
+# Merges nodes closer than `radius` into one representative (the member nearest to the cluster centre).
+# A node joins a cluster only if the straight line to the representative is clear of buildings.
+def merge_nearby_junctions(adjacency_dict, radius, building_mask):
+    nodes = list(adjacency_dict)
+    parent = {n: n for n in nodes}
+
+    def find(n):
+        while parent[n] != n:
+            parent[n] = parent[parent[n]]
+            n = parent[n]
+        return n
+
+    cell = max(1, int(radius))
+    buckets = {}
+    for n in nodes:
+        buckets.setdefault((n[0] // cell, n[1] // cell), []).append(n)
+    for (bx, by), members in buckets.items():
+        for n in members:
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    for m in buckets.get((bx + dx, by + dy), ()):
+                        if m != n and math.hypot(n[0] - m[0], n[1] - m[1]) <= radius:
+                            parent[find(n)] = find(m)
+
+    clusters = {}
+    for n in nodes:
+        clusters.setdefault(find(n), []).append(n)
+
+    representative = {}
+    for members in clusters.values():
+        cx = sum(p[0] for p in members) / len(members)
+        cy = sum(p[1] for p in members) / len(members)
+        rep = min(members, key=lambda p: (p[0] - cx) ** 2 + (p[1] - cy) ** 2)
+        for m in members:
+            clear = m == rep or not line_intersects_building(m[0], m[1], rep[0], rep[1], building_mask)
+            representative[m] = rep if clear else m
+
+    merged = {rep: [] for rep in set(representative.values())}
+    for u, edges in adjacency_dict.items():
+        for _, v, w in edges:
+            ru, rv = representative[u], representative[v]
+            if ru == rv or (ru, rv) > (rv, ru):
+                continue
+            _add_edge(merged, ru, rv, _dedupe([ru] + edge_geometry(u, v, w) + [rv]))
+    return merged
+
+# Replaces chains of degree-2 nodes by single edges that keep the chain's polyline and total length
+def contract_degree2(adjacency_dict, protected=()):
+    protected = set(protected)
+    neighbors = {u: {e[1] for e in edges if e[1] != u} for u, edges in adjacency_dict.items()}
+    through = {u for u, n in neighbors.items() if len(n) == 2 and u not in protected}
+
+    def geometry(u, v):
+        edge = min((e for e in adjacency_dict[u] if e[1] == v), key=lambda e: edge_weight(e[2]))
+        return edge_geometry(u, v, edge[2])
+
+    contracted = {}
+    walked = set()
+    covered = set()
+
+    def walk_from(u):
+        contracted.setdefault(u, [])
+        for first in neighbors[u]:
+            if (u, first) in walked:
+                continue
+            polyline = geometry(u, first)
+            prev, cur = u, first
+            while cur in through and cur != u:
+                covered.add(cur)
+                nxt = next(n for n in neighbors[cur] if n != prev)
+                polyline += geometry(cur, nxt)[1:]
+                prev, cur = cur, nxt
+            walked.add((u, first))
+            walked.add((cur, prev))
+            if cur != u:
+                contracted.setdefault(cur, [])
+                _add_edge(contracted, u, cur, polyline)
+
+    for u in adjacency_dict:
+        if u not in through:
+            walk_from(u)
+    # מעגל שכולו צמתי מעבר – צומת אחד ממנו נשאר
+    for u in adjacency_dict:
+        if u in through and u not in covered:
+            through.discard(u)
+            covered.add(u)
+            walk_from(u)
+    return contracted
+
+# Merges nearby junctions, then contracts degree-2 chains; returns (graph, stats before/after)
+def simplify_graph(adjacency_dict, building_mask, merge_radius=DEFAULT_MERGE_RADIUS, protected=()):
+    before = graph_stats(adjacency_dict)
+    graph = adjacency_dict
+    if merge_radius and merge_radius > 0:
+        graph = merge_nearby_junctions(graph, merge_radius, building_mask)
+    after_merge = graph_stats(graph)
+    graph = contract_degree2(graph, protected=protected)
+    after = graph_stats(graph)
+    stats = {
+        "nodesBefore": before["nodes"],
+        "edgesBefore": before["edges"],
+        "nodesAfterMerge": after_merge["nodes"],
+        "nodesAfter": after["nodes"],
+        "edgesAfter": after["edges"],
+        "mergeRadius": merge_radius,
+    }
+    return graph, stats
+
+# Expands a path found on a simplified graph back to the full polyline of the edges it used
+def expand_path(path, adjacency_dict):
+    if not path:
+        return path
+    expanded = [path[0]]
+    for u, v in zip(path, path[1:]):
+        edges = [e for e in adjacency_dict[u] if e[1] == v]
+        if not edges:
+            expanded.append(v)
+            continue
+        _, _, w = min(edges, key=lambda e: edge_weight(e[2]))
+        expanded.extend(edge_geometry(u, v, w)[1:])
+    return expanded
+
+# All vertices of the graph, including the interior polyline vertices of contracted edges
+def polyline_vertices(adjacency_dict):
+    vertices = set(adjacency_dict)
+    for edges in adjacency_dict.values():
+        for _, _, w in edges:
+            if isinstance(w, tuple):
+                vertices.update(w[1])
+    return vertices
+
+# Makes `point`, an interior polyline vertex of a contracted edge, a node by splitting that edge in two
+def split_edge_at(adjacency_dict, point):
+    if point in adjacency_dict:
+        return
+    found = next(((u, edge) for u, edges in adjacency_dict.items() for edge in edges
+                  if isinstance(edge[2], tuple) and point in edge[2][1]), None)
+    if found is None:
+        return
+    u, (_, v, (_, polyline)) = found
+    k = polyline.index(point)
+    adjacency_dict[u] = [e for e in adjacency_dict[u] if e[1] != v]
+    adjacency_dict[v] = [e for e in adjacency_dict[v] if e[1] != u]
+    adjacency_dict[point] = []
+    _add_edge(adjacency_dict, u, point, list(polyline[:k + 1]))
+    _add_edge(adjacency_dict, point, v, list(polyline[k:]))
+
+# Connects new_xy to a simplified graph: the contracted edges keep the original skeleton vertices, so the point
+# attaches to the nearest of those whose line is clear (splitting its edge) and not only to the remaining junctions
+def connect_to_simplified(new_xy, adjacency_dict, building_mask, image_to_draw, candidates=None):
+    vertices = polyline_vertices(adjacency_dict)
+    if candidates is not None:
+        vertices -= set(adjacency_dict) - set(candidates)
+    node = nearest_clear_node(new_xy, vertices, building_mask)
+    if node is not None:
+        split_edge_at(adjacency_dict, node)
+    return add_point_to_graph(new_xy, adjacency_dict, building_mask, image_to_draw,
+                              ignore_building=True, candidates=[node] if node is not None else [])
@@ -0,0 +1,136 @@
+from collections.abc import MutableMapping
+from shared import dependencies as dep
+from core.graph_builder import skeleton_junctions, find_neighbors, is_line_clear_of_buildings
+import math
+import threading
+
+
+class SkeletonEdgeTracer:
+    """
+    Traces the edges of one junction of the skeleton graph when first asked, the same way
+    connect_yellow_junctions does for every junction up front (skeleton BFS + the same building check
+    on the same image, so both graphs have the same edges).
+    Traced edges and line checks are memoized and shared by all requests on the map.
+    """
+
+    def __init__(self, merged_image, yellow_mask, skeleton_mask):
+        self.yellow_mask = yellow_mask
+        self.skeleton_mask = skeleton_mask
+        yellow_coords = dep.np.column_stack(dep.np.where(yellow_mask > 0))
+        self.node_list = [(int(x), int(y)) for (y, x) in yellow_coords]
+        self.image = merged_image.copy()
+        for (x, y) in self.node_list:
+            dep.cv2.rectangle(self.image, (x - 1, y - 1), (x + 1, y + 1), (255, 255, 0), -1)
+        self._traced = {}
+        self._clear = {}
+        self._lock = threading.Lock()
+
+    # הבדיקה של connect_yellow_junctions: פיקסלים לבנים בתמונה עם ריבועי הצמתים, מהצומת שקודם בסדר השורות
+    def _line_clear(self, u, v):
+        key = (u, v) if (u[1], u[0]) < (v[1], v[0]) else (v, u)
+        clear = self._clear.get(key)
+        if clear is None:
+            (x1, y1), (x2, y2) = key
+            clear = self._clear[key] = is_line_clear_of_buildings(self.image, x1, y1, x2, y2)
+        return clear
+
+    # Returns ((neighbor, distance), ...) for the junction `node`
+    def neighbors(self, node):
+        traced = self._traced.get(node)
+        if traced is not None:
+            return traced
+        x, y = node
+        found = []
+        seen = set()
+        for (ny, nx) in find_neighbors(y, x, self.skeleton_mask, self.yellow_mask):
+            v = (int(nx), int(ny))
+            if v in seen:
+                continue
+            seen.add(v)
+            if self._line_clear(node, v):
+                found.append((v, math.hypot(v[0] - x, v[1] - y)))
+        with self._lock:
+            return self._traced.setdefault(node, tuple(found))
+
+    def traced_count(self):
+        return len(self._traced)
+
+    # Undirected edge total of the map: exact once every junction is traced, otherwise extrapolated from the
+    # degrees of the junctions traced so far; returns (total, estimated), total is None before any tracing
+    def edge_total(self):
+        traced = list(self._traced.items())
+        if len(traced) == len(self.node_list):
+            return len({(u, v) if u < v else (v, u) for u, found in traced for v, _ in found}), False
+        if not traced:
+            return None, True
+        degrees = sum(len(found) for _, found in traced)
+        return round(degrees / len(traced) * len(self.node_list) / 2), True
+
+
+# Prepares the lazy skeleton graph of a binary image (everything but the edge tracing)
+def build_edge_tracer(binary_image):
+    return SkeletonEdgeTracer(*skeleton_junctions(binary_image))
+
+
+class LazyAdjacency(MutableMapping):
+    """
+    Adjacency dict over a SkeletonEdgeTracer: every junction is a key from the start, but its edge list
+    is traced the first time it is read. The lists belong to this instance, so a request can add
+    points and edges (add_point_to_graph) like on a regular adjacency dict.
+    total_edges is the edge count of the map's eager skeleton graph when it is known.
+    """
+
+    def __init__(self, tracer, total_edges=None):
+        self._tracer = tracer
+        self._total_edges = total_edges
+        self._nodes = dict.fromkeys(tracer.node_list)
+        self._edges = {}
+
+    def __getitem__(self, node):
+        edges = self._edges.get(node)
+        if edges is None:
+            if node not in self._nodes:
+                raise KeyError(node)
+            edges = self._edges[node] = [[node, v, w] for v, w in self._tracer.neighbors(node)]
+        return edges
+
+    def __setitem__(self, node, edges):
+        self._nodes[node] = None
+        self._edges[node] = edges
+
+    def __delitem__(self, node):
+        del self._nodes[node]
+        self._edges.pop(node, None)
+
+    def __contains__(self, node):
+        return node in self._nodes
+
+    def __iter__(self):
+        return iter(self._nodes)
+
+    def __len__(self):
+        return len(self._nodes)
+
+    # Draws the materialized edges like connect_yellow_junctions does for the full graph
+    def draw_edges(self, image):
+        for u, edges in self._edges.items():
+            for _, v, _ in edges:
+                if u < v:
+                    dep.cv2.line(image, u, v, (255, 0, 0), 1)
+
+    # Materialized nodes and edges against the totals. The edge total is exact when the eager graph's count was
+    # given or every junction of the map is traced; otherwise it is an estimate and totalEdgesEstimated is set
+    def stats(self):
+        materialized = {(u, v) if u < v else (v, u) for u, edges in self._edges.items() for _, v, _ in edges}
+        if self._total_edges is not None:
+            total_edges, estimated = self._total_edges, False
+        else:
+            total_edges, estimated = self._tracer.edge_total()
+        return {
+            "nodes": len(self._nodes),
+            "materializedNodes": len(self._edges),
+            "materializedEdges": len(materialized),
+            "totalEdges": total_edges,
+            "totalEdgesEstimated": estimated,
+            "tracedNodesOnMap": self._tracer.traced_count(),
+        }
@@ -1,17 +1,137 @@
-import numpy as np
-import math
+from shared import dependencies as dep
 from core.graph_builder import line_intersects_building
 
+# קבוצות המדדים שניתן לבקש; ברירת המחדל היא כל מה שלא דורש בדיקת התנגשויות
+METRIC_GROUPS = ("length", "turns", "deviation", "comparison", "density", "collisions")
+DEFAULT_METRIC_GROUPS = ("length", "turns", "deviation", "comparison")
+
+SHARP_TURN_ANGLE = 150
+STRAIGHT_ANGLE_THRESHOLD = 30
+
+# Converts the path to an (N, 2) float array and computes its segment vectors and lengths once
+def path_geometry(path):
+    points = dep.np.asarray(path, dtype=float).reshape(-1, 2)
+    segments = dep.np.diff(points, axis=0)
+    lengths = dep.np.hypot(segments[:, 0], segments[:, 1])
+    return points, segments, lengths
+
+# Computes the angle (degrees) at every inner vertex of the path; 180 means no turn, NaN for repeated points
+def turning_angles(segments, lengths):
+    if len(segments) < 2:
+        return dep.np.empty(0)
+    ba = -segments[:-1]
+    bc = segments[1:]
+    denom = lengths[:-1] * lengths[1:]
+    with dep.np.errstate(divide="ignore", invalid="ignore"):
+        cos_angle = dep.np.einsum("ij,ij->i", ba, bc) / denom
+    return dep.np.degrees(dep.np.arccos(dep.np.clip(cos_angle, -1.0, 1.0)))
+
+# Computes the distance of every path point from the infinite line through takeoff and landing
+def distances_from_line(points, takeoff, landing):
+    origin = dep.np.asarray(takeoff, dtype=float)
+    line_vec = dep.np.asarray(landing, dtype=float) - origin
+    line_len = dep.np.hypot(line_vec[0], line_vec[1])
+    if line_len == 0:
+        return dep.np.zeros(len(points)), 0.0
+    rel = points - origin
+    return dep.np.abs(rel[:, 0] * line_vec[1] - rel[:, 1] * line_vec[0]) / line_len, line_len
+
+def _finite_angles(segments, lengths):
+    angles = turning_angles(segments, lengths)
+    return angles[~dep.np.isnan(angles)]
+
+def _percent(part, whole):
+    return float(part / whole * 100) if whole else 0.0
+
+# Computes the requested metric groups from one pass over the path geometry and returns them as a dict
+def compute_path_metrics(path, groups=DEFAULT_METRIC_GROUPS, takeoff=None, landing=None,
+                         path_raw=None, building_mask=None, image_size=None):
+    groups = [g for g in groups if g in METRIC_GROUPS]
+    points, segments, lengths = path_geometry(path)
+    total_length = float(lengths.sum())
+    takeoff = takeoff if takeoff is not None else (tuple(points[0]) if len(points) else None)
+    landing = landing if landing is not None else (tuple(points[-1]) if len(points) else None)
+    result = {}
+
+    if "length" in groups:
+        result["length"] = {
+            "pathLength": total_length,
+            "nodes": len(points),
+            "avgStepLength": float(lengths.mean()) if len(lengths) else 0.0,
+            "maxStepLength": float(lengths.max()) if len(lengths) else 0.0,
+        }
+
+    if "turns" in groups:
+        # זוויות ליד נקודות חוזרות (NaN) לא נספרות, גם לא במכנה של האחוזים
+        valid = _finite_angles(segments, lengths)
+        sharp = int(dep.np.count_nonzero(valid < SHARP_TURN_ANGLE))
+        straight = int(dep.np.count_nonzero(valid > 180 - STRAIGHT_ANGLE_THRESHOLD))
+        result["turns"] = {
+            "sharpTurns": sharp,
+            "sharpTurnsPercent": _percent(sharp, len(valid)),
+            "straightSegmentsPercent": _percent(straight, len(valid)),
+            "avgSmoothnessAngle": float(valid.mean()) if len(valid) else 0.0,
+        }
+
+    if "deviation" in groups and takeoff is not None:
+        deviations, line_len = distances_from_line(points, takeoff, landing)
+        result["deviation"] = {
+            "straightLineLength": float(line_len),
+            "detourRatio": total_length / line_len if line_len else 1.0,
+            "avgDeviation": float(deviations.mean()) if line_len else 0.0,
+            "maxDeviation": float(deviations.max()) if line_len else 0.0,
+        }
+
+    if "comparison" in groups and path_raw is not None:
+        _, _, raw_lengths = path_geometry(path_raw)
+        raw_length = float(raw_lengths.sum())
+        result["comparison"] = {
+            "nodesBefore": len(path_raw),
+            "nodesAfter": len(points),
+            "nodeReductionPercent": _percent(len(path_raw) - len(points), len(path_raw)),
+            "lengthBefore": raw_length,
+            "lengthAfter": total_length,
+            "lengthReductionPercent": (1 - total_length / raw_length) * 100 if raw_length else 0.0,
+        }
+
+    if "density" in groups and image_size is not None:
+        area = image_size[0] * image_size[1]
+        result["density"] = {"nodesPerPixel": len(points) / area if area > 0 else 0.0}
+
+    if "collisions" in groups and building_mask is not None:
+        result["collisions"] = {"crossesBuilding": _crosses_building(points, building_mask)}
+
+    return result
+
+def _crosses_building(points, building_mask):
+    pts = points.astype(int)
+    return any(
+        line_intersects_building(int(x1), int(y1), int(x2), int(y2), building_mask)
+        for (x1, y1), (x2, y2) in zip(pts[:-1], pts[1:])
+    )
+
+# Parses the requested metric groups from a comma separated string ("all", "none" or e.g. "length,turns")
+def parse_metric_groups(value):
+    if value is None:
+        return DEFAULT_METRIC_GROUPS
+    value = value.strip().lower()
+    if value == "all":
+        return METRIC_GROUPS
+    if value in ("", "none"):
+        return ()
+    groups = tuple(g.strip() for g in value.split(",") if g.strip())
+    unknown = [g for g in groups if g not in METRIC_GROUPS]
+    if unknown:
+        raise ValueError(f"Unknown metric groups: {', '.join(unknown)}")
+    return groups
+
 # Returns the number of nodes in the path
 def count_nodes(path):
     return len(path)
 
 # Computes the total length of the path
 def compute_path_length(path):
-    return sum(
-        math.hypot(x2 - x1, y2 - y1)
-        for (x1, y1), (x2, y2) in zip(path[:-1], path[1:])
-    )
+    return float(path_geometry(path)[2].sum())
 
 # Computes the average step length in the path
 def compute_average_step_length(path):
@@ -28,94 +148,47 @@ def compute_path_density(path, width, height):
 
 # Compares the raw and optimized paths and prints metrics
 def compare_paths(path_raw, path_opt):
-    len_raw = count_nodes(path_raw)
-    len_opt = count_nodes(path_opt)
-    len_diff = len_raw - len_opt
-    reduction_percent = (len_diff / len_raw) * 100 if len_raw else 0
-
-    dist_raw = compute_path_length(path_raw)
-    dist_opt = compute_path_length(path_opt)
-    length_reduction_percent = (1 - dist_opt / dist_raw) * 100 if dist_raw else 0
-
+    c = compute_path_metrics(path_opt, groups=("comparison",), path_raw=path_raw)["comparison"]
     print("🔍 Fine-Tuning Metrics:")
-    print(f"  ➤ Nodes before:  {len_raw}")
-    print(f"  ➤ Nodes after:   {len_opt}")
-    print(f"  ➤ Node reduction: {len_diff} ({reduction_percent:.2f}%)")
-    print(f"  ➤ Path length before: {dist_raw:.2f} px")
-    print(f"  ➤ Path length after:  {dist_opt:.2f} px")
-    print(f"  ➤ Length change:       {dist_raw - dist_opt:.2f} px ({length_reduction_percent:.2f}%)")
+    print(f"  ➤ Nodes before:  {c['nodesBefore']}")
+    print(f"  ➤ Nodes after:   {c['nodesAfter']}")
+    print(f"  ➤ Node reduction: {c['nodesBefore'] - c['nodesAfter']} ({c['nodeReductionPercent']:.2f}%)")
+    print(f"  ➤ Path length before: {c['lengthBefore']:.2f} px")
+    print(f"  ➤ Path length after:  {c['lengthAfter']:.2f} px")
+    print(f"  ➤ Length change:       {c['lengthBefore'] - c['lengthAfter']:.2f} px ({c['lengthReductionPercent']:.2f}%)")
 
 # Prints the main path metrics: length, node count, detour ratio, and deviation from straight line
 def print_all_metrics(path_raw, path_opt, takeoff, landing, building_mask, image_size):
+    m = compute_path_metrics(path_opt, groups=("comparison", "deviation"),
+                             takeoff=takeoff, landing=landing, path_raw=path_raw)
     print("🔍 Metrics Evaluation:")
-    dist_raw = compute_path_length(path_raw)
-    dist_opt = compute_path_length(path_opt)
-    print(f"  ➤ Path length before: {dist_raw:.2f} px")
-    print(f"  ➤ Path length after:  {dist_opt:.2f} px")
-    len_raw = count_nodes(path_raw)
-    len_opt = count_nodes(path_opt)
-    print(f"  ➤ Node count before: {len_raw}")
-    print(f"  ➤ Node count after:  {len_opt}")
-    ratio = detour_ratio(path_opt, takeoff, landing)
-    print(f"  ➤ Detour ratio (path/straight): {ratio:.2f}x")
-    avg_dev = deviation_from_straight_line(path_opt, takeoff, landing)
-    print(f"  ➤ Avg. deviation from straight line: {avg_dev:.2f} px")
+    print(f"  ➤ Path length before: {m['comparison']['lengthBefore']:.2f} px")
+    print(f"  ➤ Path length after:  {m['comparison']['lengthAfter']:.2f} px")
+    print(f"  ➤ Node count before: {m['comparison']['nodesBefore']}")
+    print(f"  ➤ Node count after:  {m['comparison']['nodesAfter']}")
+    print(f"  ➤ Detour ratio (path/straight): {m['deviation']['detourRatio']:.2f}x")
+    print(f"  ➤ Avg. deviation from straight line: {m['deviation']['avgDeviation']:.2f} px")
     print("=====================================")
 
 # Computes the number of sharp turns in the path
 def compute_angle_changes(path):
-    def angle(a, b, c):
-        ba = np.array([a[0] - b[0], a[1] - b[1]])
-        bc = np.array([c[0] - b[0], c[1] - b[1]])
-        cos_angle = np.dot(ba, bc) / (np.linalg.norm(ba) * np.linalg.norm(bc))
-        cos_angle = np.clip(cos_angle, -1.0, 1.0)
-        return np.degrees(np.arccos(cos_angle))
-
-    count = 0
-    for i in range(1, len(path) - 1):
-        ang = angle(path[i - 1], path[i], path[i + 1])
-        if ang < 150:
-            count += 1
-
-    percent = (count / (len(path) - 2)) * 100 if len(path) >= 3 else 0
-    print(f"  ➤ Sharp turns: {count} ({percent:.2f}%)")
-    return count
+    t = compute_path_metrics(path, groups=("turns",))["turns"]
+    print(f"  ➤ Sharp turns: {t['sharpTurns']} ({t['sharpTurnsPercent']:.2f}%)")
+    return t["sharpTurns"]
 
 # Computes the average deviation from the straight line between takeoff and landing
 def deviation_from_straight_line(path, takeoff, landing):
-    x0, y0 = takeoff
-    x1, y1 = landing
-    line_vec = np.array([x1 - x0, y1 - y0])
-    line_len = np.linalg.norm(line_vec)
-    if line_len == 0:
-        return 0
-
-    deviation_sum = 0
-    for (x, y) in path:
-        point_vec = np.array([x - x0, y - y0])
-        proj_len = np.dot(point_vec, line_vec) / line_len
-        proj_point = (x0 + proj_len * line_vec[0] / line_len,
-                      y0 + proj_len * line_vec[1] / line_len)
-        deviation = np.linalg.norm(np.array([x, y]) - proj_point)
-        deviation_sum += deviation
-
-    avg_deviation = deviation_sum / len(path)
-    percent = (avg_deviation / line_len) * 100
-    return avg_deviation
+    return compute_path_metrics(path, groups=("deviation",), takeoff=takeoff, landing=landing)["deviation"]["avgDeviation"]
 
 # Computes the detour ratio (path length / straight line)
 def detour_ratio(path, takeoff, landing):
-    direct_dist = np.linalg.norm(np.array(takeoff) - np.array(landing))
-    path_len = compute_path_length(path)
-    ratio = path_len / direct_dist if direct_dist != 0 else 1
-    return ratio
+    return compute_path_metrics(path, groups=("deviation",), takeoff=takeoff, landing=landing)["deviation"]["detourRatio"]
 
 # Checks if the path intersects with any buildings
 def check_for_building_collisions(path, building_mask):
-    for (x1, y1), (x2, y2) in zip(path[:-1], path[1:]):
-        if line_intersects_building(x1, y1, x2, y2, building_mask):
-            print("  ➤ ⚠ Path crosses building!")
-            return True
+    if _crosses_building(path_geometry(path)[0], building_mask):
+        print("  ➤ ⚠ Path crosses building!")
+        return True
     print("  ➤ ✅ Path is clear of buildings.")
     return False
 
@@ -123,42 +196,22 @@ def check_for_building_collisions(path, building_mask):
 def max_step_length(path):
     if len(path) < 2:
         return 0
-    steps = [math.hypot(x2 - x1, y2 - y1) for (x1, y1), (x2, y2) in zip(path[:-1], path[1:])]
-    max_step = max(steps)
+    max_step = compute_path_metrics(path, groups=("length",))["length"]["maxStepLength"]
     print(f"  ➤ Max step length: {max_step:.2f} px")
     return max_step
 
 # Computes the ratio of straight segments in the path
-def straight_line_ratio(path, angle_threshold=30):
-    def angle(a, b, c):
-        ba = np.array([a[0] - b[0], a[1] - b[1]])
-        bc = np.array([c[0] - b[0], c[1] - b[1]])
-        cos_angle = np.dot(ba, bc) / (np.linalg.norm(ba) * np.linalg.norm(bc))
-        cos_angle = np.clip(cos_angle, -1.0, 1.0)
-        return np.degrees(np.arccos(cos_angle))
-
-    count_straight = 0
-    for i in range(1, len(path) - 1):
-        ang = angle(path[i - 1], path[i], path[i + 1])
-        if ang > 180 - angle_threshold:
-            count_straight += 1
-
-    percent = (count_straight / (len(path) - 2)) * 100 if len(path) >= 3 else 0
+def straight_line_ratio(path, angle_threshold=STRAIGHT_ANGLE_THRESHOLD):
+    angles = _finite_angles(*path_geometry(path)[1:])
+    count_straight = int(dep.np.count_nonzero(angles > 180 - angle_threshold))
+    percent = _percent(count_straight, len(angles))
     print(f"  ➤ Straight segments ratio: {count_straight} ({percent:.2f}%)")
     return percent
 
 # Computes the average smoothness angle of the path
 def path_smoothness(path):
-    def angle(a, b, c):
-        ba = np.array([a[0] - b[0], a[1] - b[1]])
-        bc = np.array([c[0] - b[0], c[1] - b[1]])
-        cos_angle = np.dot(ba, bc) / (np.linalg.norm(ba) * np.linalg.norm(bc))
-        cos_angle = np.clip(cos_angle, -1.0, 1.0)
-        return np.degrees(np.arccos(cos_angle))
-
-    angles = [angle(path[i - 1], path[i], path[i + 1]) for i in range(1, len(path) - 1)]
-    if not angles:
+    t = compute_path_metrics(path, groups=("turns",))["turns"]
+    if len(path) < 3:
         return 0
-    smoothness = sum(angles) / len(angles)
-    print(f"  ➤ Avg. smoothness angle: {smoothness:.2f}°")
-    return smoothness
\ No newline at end of file
+    print(f"  ➤ Avg. smoothness angle: {t['avgSmoothnessAngle']:.2f}°")
+    return t["avgSmoothnessAngle"]
@@ -1,5 +1,6 @@
 from shared import dependencies as dep
 from core.graph_builder import line_intersects_building
+import math
 
 # Finds the shortest path between start and end using Dijkstra's algorithm
 def dijkstra(start, end, adjacency_dict):
@@ -42,6 +43,107 @@ def dijkstra(start, end, adjacency_dict):
     path.reverse()
     return path
 
+# Runs one Dijkstra from start until every target is settled; returns (distances, came_from)
+def dijkstra_many(start, targets, adjacency_dict):
+    remaining = set(targets)
+    remaining.discard(start)
+    distances = {start: 0.0}
+    came_from = {}
+    visited = set()
+    queue = [(0.0, start)]
+
+    while queue and remaining:
+        current_dist, u = dep.heapq.heappop(queue)
+        if u in visited:
+            continue
+        visited.add(u)
+        remaining.discard(u)
+
+        for edge in adjacency_dict[u]:
+            _, v, w = edge
+            if isinstance(w, tuple):
+                w = w[0]
+            alt = current_dist + w
+            if alt < distances.get(v, float('inf')):
+                distances[v] = alt
+                came_from[v] = u
+                dep.heapq.heappush(queue, (alt, v))
+
+    return {t: distances.get(t, float('inf')) for t in targets}, came_from
+
+# Runs one Dijkstra seeded with all sources until end is settled; returns (distance, path from source, source)
+def dijkstra_multi_source(sources, end, adjacency_dict):
+    distances = {s: 0.0 for s in sources}
+    origin = {s: s for s in sources}
+    came_from = {}
+    visited = set()
+    queue = [(0.0, s) for s in distances]
+    dep.heapq.heapify(queue)
+
+    while queue:
+        current_dist, u = dep.heapq.heappop(queue)
+        if u in visited:
+            continue
+        visited.add(u)
+        if u == end:
+            path = reconstruct_path(came_from, origin[u], u)
+            return current_dist, path, origin[u]
+
+        for edge in adjacency_dict[u]:
+            _, v, w = edge
+            if isinstance(w, tuple):
+                w = w[0]
+            alt = current_dist + w
+            if alt < distances.get(v, float('inf')):
+                distances[v] = alt
+                came_from[v] = u
+                origin[v] = origin[u]
+                dep.heapq.heappush(queue, (alt, v))
+
+    return float('inf'), None, None
+
+# A* with the straight-line distance as heuristic (edge weights are never shorter than it); expands far fewer
+# nodes than dijkstra, which matters when edges are only traced as nodes are expanded (LazyAdjacency)
+def astar(start, end, adjacency_dict):
+    def h(node):
+        return math.hypot(node[0] - end[0], node[1] - end[1])
+
+    distances = {start: 0.0}
+    came_from = {}
+    visited = set()
+    queue = [(h(start), start)]
+
+    while queue:
+        _, u = dep.heapq.heappop(queue)
+        if u in visited:
+            continue
+        visited.add(u)
+
+        if u == end:
+            return reconstruct_path(came_from, start, end)
+
+        for edge in adjacency_dict[u]:
+            _, v, w = edge
+            if isinstance(w, tuple):
+                w = w[0]
+            alt = distances[u] + w
+            if alt < distances.get(v, float('inf')):
+                distances[v] = alt
+                came_from[v] = u
+                dep.heapq.heappush(queue, (alt + h(v), v))
+
+    return None
+
+# Rebuilds the path from start to end out of a came_from dict (None if end was not reached)
+def reconstruct_path(came_from, start, end):
+    if end != start and end not in came_from:
+        return None
+    path = [end]
+    while path[-1] != start:
+        path.append(came_from[path[-1]])
+    path.reverse()
+    return path
+
 # Optimizes the path by removing unnecessary nodes (keeps only turning points and endpoints)
 def optimize_path(path, building_mask):
     optimized = []
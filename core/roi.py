@@ -0,0 +1,43 @@
+from core.graph_builder import build_skeleton_graph
+import math
+
+# אזור העניין: תיבה סביב הסמנים עם שוליים של חצי המרחק ביניהם (לפחות 64 פיקסלים), מוכפלת בכל ניסיון כושל
+ROI_MIN_MARGIN = 64
+ROI_MARGIN_RATIO = 0.5
+ROI_GROWTH = 2
+
+# Returns the (x0, y0, x1, y1) box around the points expanded by `margin` and clipped to the image
+def roi_box(points, shape, margin):
+    h, w = shape[:2]
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    margin = int(math.ceil(margin))
+    return (max(0, min(xs) - margin), max(0, min(ys) - margin),
+            min(w, max(xs) + margin + 1), min(h, max(ys) + margin + 1))
+
+# Yields growing boxes around the points; the last one covers the whole image
+def roi_boxes(points, shape, min_margin=ROI_MIN_MARGIN, ratio=ROI_MARGIN_RATIO, growth=ROI_GROWTH):
+    h, w = shape[:2]
+    span = max((math.hypot(a[0] - b[0], a[1] - b[1]) for a in points for b in points), default=0)
+    margin = max(min_margin, ratio * span)
+    while True:
+        box = roi_box(points, shape, margin)
+        yield box
+        if box == (0, 0, w, h):
+            return
+        margin *= growth
+
+# Moves every node of a graph by (dx, dy)
+def offset_graph(node_list, adjacency_dict, dx, dy):
+    def shift(p):
+        return (int(p[0]) + dx, int(p[1]) + dy)
+    return [shift(n) for n in node_list], {
+        shift(u): [[shift(a), shift(b), w] for a, b, w in edges] for u, edges in adjacency_dict.items()
+    }
+
+# Builds the skeleton graph of the box only; returns (final_image of the box, node_list, adjacency_dict)
+# in full-image coordinates
+def build_roi_graph(binary_image, box):
+    x0, y0, x1, y1 = box
+    final_image, node_list, adjacency_dict = build_skeleton_graph(binary_image[y0:y1, x0:x1])
+    return (final_image, *offset_graph(node_list, adjacency_dict, x0, y0))
@@ -0,0 +1,148 @@
+from shared import dependencies as dep
+from core.graph_builder import line_intersects_building
+import math
+
+GRID_NEIGHBORS = [(-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1)]
+
+# Shrinks the building mask by `factor`: a coarse cell is blocked if any of its pixels is a building
+def downsample_mask(building_mask, factor):
+    if factor <= 1:
+        return building_mask.astype(dep.np.uint8)
+    h, w = building_mask.shape
+    coarse_h, coarse_w = -(-h // factor), -(-w // factor)
+    padded = dep.np.zeros((coarse_h * factor, coarse_w * factor), dtype=dep.np.uint8)
+    padded[:h, :w] = building_mask
+    return padded.reshape(coarse_h, factor, coarse_w, factor).max(axis=(1, 3))
+
+# Maps a full-resolution pixel to its coarse cell and a coarse cell back to the pixel at its center
+def to_cell(pixel, factor):
+    return (pixel[0] // factor, pixel[1] // factor)
+
+def to_pixel(cell, factor, shape):
+    x = min(cell[0] * factor + factor // 2, shape[1] - 1)
+    y = min(cell[1] * factor + factor // 2, shape[0] - 1)
+    return (x, y)
+
+def _line_of_sight(a, b, grid):
+    return not line_intersects_building(a[0], a[1], b[0], b[1], grid)
+
+# Returns True if no pixel the line between a and b can pass through is a building: at every step along the
+# major axis both pixels around the exact line are checked, which covers the pixels line_intersects_building visits
+def clear_at_full_resolution(a, b, building_mask):
+    np = dep.np
+    steps = max(abs(b[0] - a[0]), abs(b[1] - a[1])) + 1
+    xs = np.linspace(a[0], b[0], steps)
+    ys = np.linspace(a[1], b[1], steps)
+    low_x, high_x = np.floor(xs + 1e-9).astype(np.intp), np.ceil(xs - 1e-9).astype(np.intp)
+    low_y, high_y = np.floor(ys + 1e-9).astype(np.intp), np.ceil(ys - 1e-9).astype(np.intp)
+    return not (building_mask[low_y, low_x].any() or building_mask[low_y, high_x].any() or
+                building_mask[high_y, low_x].any() or building_mask[high_y, high_x].any())
+
+# Line of sight that also holds at full resolution: a line between free coarse cells can still clip the
+# corner of a blocked cell, even between diagonal neighbors, so every clear coarse line is re-checked on the
+# full mask between the cells' pixels (`pixels` maps a cell to its pixel, e.g. the exact takeoff point)
+def full_resolution_line_of_sight(building_mask, factor, pixels=None):
+    pixels = pixels or {}
+
+    def pixel(cell):
+        return pixels.get(cell) or to_pixel(cell, factor, building_mask.shape)
+
+    def line_of_sight(a, b, grid):
+        if not _line_of_sight(a, b, grid):
+            return False
+        return factor <= 1 or clear_at_full_resolution(pixel(a), pixel(b), building_mask)
+    return line_of_sight
+
+def _free_neighbors(cell, grid):
+    x, y = cell
+    h, w = grid.shape
+    for dx, dy in GRID_NEIGHBORS:
+        nx, ny = x + dx, y + dy
+        if 0 <= nx < w and 0 <= ny < h and grid[ny, nx] == 0:
+            yield (nx, ny)
+
+# Any-angle search on the grid; `lazy` defers line-of-sight checks until a cell is expanded (Lazy Theta*).
+# Steps between neighboring cells are checked with line_of_sight too, so a stricter test (e.g. at full
+# resolution) also applies to them.
+def theta_star_search(start, goal, grid, lazy=True, line_of_sight=_line_of_sight):
+    def h(c):
+        return math.hypot(c[0] - goal[0], c[1] - goal[1])
+
+    def cost(a, b):
+        return math.hypot(a[0] - b[0], a[1] - b[1])
+
+    g = {start: 0.0}
+    parent = {start: start}
+    closed = set()
+    queue = [(h(start), start)]
+
+    while queue:
+        _, s = dep.heapq.heappop(queue)
+        if s in closed or s not in parent:
+            continue
+
+        if lazy and not line_of_sight(parent[s], s, grid):
+            # ההנחה על קו ראייה נכשלה – מחברים דרך השכן הסגור הטוב ביותר שיש אליו קו ראייה
+            best = None
+            for n in _free_neighbors(s, grid):
+                if n in closed and (best is None or g[n] + cost(n, s) < best[0]) and line_of_sight(n, s, grid):
+                    best = (g[n] + cost(n, s), n)
+            if best is None:
+                # אין דרך פנויה לתא מהתאים שנסגרו; ייתכן שיתווסף שוב דרך תא אחר
+                del g[s], parent[s]
+                continue
+            g[s], parent[s] = best
+
+        if s == goal:
+            break
+        closed.add(s)
+
+        for n in _free_neighbors(s, grid):
+            if n in closed:
+                continue
+            p = parent[s]
+            if lazy or line_of_sight(p, n, grid):
+                alt, via = g[p] + cost(p, n), p
+            elif line_of_sight(s, n, grid):
+                alt, via = g[s] + cost(s, n), s
+            else:
+                continue
+            if alt < g.get(n, float('inf')):
+                g[n] = alt
+                parent[n] = via
+                dep.heapq.heappush(queue, (alt + h(n), n))
+
+    if goal not in g:
+        return None
+
+    path = [goal]
+    while path[-1] != start:
+        path.append(parent[path[-1]])
+    path.reverse()
+    return path
+
+# Plans an any-angle path directly on the building mask, optionally on a downsampled grid
+def theta_star(start, end, building_mask, downsample=1, lazy=True):
+    factor = max(1, int(downsample))
+    grid = downsample_mask(building_mask, factor)
+    start_cell = to_cell(start, factor)
+    end_cell = to_cell(end, factor)
+
+    # נקודות ההמראה והנחיתה תמיד פנויות, כמו ב-add_point_to_graph עם ignore_building; נקודה שעל בניין
+    # יכולה לצאת ממנו בתוך התא שלה, ונקודה פנויה לא משנה את מסכת הבניינים
+    grid = grid.copy()
+    full_mask = building_mask.astype(dep.np.uint8)
+    for point, cell in ((start, start_cell), (end, end_cell)):
+        grid[cell[1], cell[0]] = 0
+        if full_mask[point[1], point[0]]:
+            full_mask[cell[1] * factor:(cell[1] + 1) * factor, cell[0] * factor:(cell[0] + 1) * factor] = 0
+
+    # תאי הקצה מיוצגים בנקודות עצמן, כך שכל קטע במסלול נבדק ברזולוציה מלאה בדיוק כפי שיוחזר
+    pixels = {start_cell: tuple(start), end_cell: tuple(end)}
+    cells = theta_star_search(start_cell, end_cell, grid, lazy=lazy,
+                              line_of_sight=full_resolution_line_of_sight(full_mask, factor, pixels))
+    if cells is None:
+        return None
+    if len(cells) == 1:
+        return [tuple(start), tuple(end)]
+    return [pixels.get(c) or to_pixel(c, factor, building_mask.shape) for c in cells]
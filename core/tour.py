@@ -0,0 +1,87 @@
+from core.pathfinder import dijkstra_many, reconstruct_path
+import itertools
+
+# עד כמה נקודות ביניים פותרים במדויק (Held-Karp); מעבר לזה – שכן קרוב + 2-opt
+EXACT_TOUR_LIMIT = 10
+
+# Computes route costs and paths between all points with one multi-target Dijkstra per point
+def pairwise_routes(points, adjacency_dict):
+    n = len(points)
+    cost = [[0.0 if i == j else float('inf') for j in range(n)] for i in range(n)]
+    paths = {}
+    for i in range(n - 1):
+        targets = points[i + 1:]
+        distances, came_from = dijkstra_many(points[i], targets, adjacency_dict)
+        for j in range(i + 1, n):
+            d = distances[points[j]]
+            if d == float('inf'):
+                continue
+            path = reconstruct_path(came_from, points[i], points[j])
+            cost[i][j] = cost[j][i] = d
+            paths[(i, j)] = path
+            paths[(j, i)] = path[::-1]
+    return cost, paths
+
+# Returns the total cost of visiting the points in the given order
+def tour_cost(order, cost):
+    return sum(cost[a][b] for a, b in zip(order, order[1:]))
+
+# Exact shortest open tour from first to last point through all the others (Held-Karp)
+def _held_karp(cost):
+    n = len(cost)
+    inner = list(range(1, n - 1))
+    best = {(1 << k, k): (cost[0][inner[k]], None) for k in range(len(inner))}
+    for size in range(2, len(inner) + 1):
+        for subset in itertools.combinations(range(len(inner)), size):
+            mask = sum(1 << k for k in subset)
+            for k in subset:
+                prev_mask = mask & ~(1 << k)
+                best[(mask, k)] = min(
+                    (best[(prev_mask, m)][0] + cost[inner[m]][inner[k]], m)
+                    for m in subset if m != k
+                )
+    full = (1 << len(inner)) - 1
+    _, last = min((best[(full, k)][0] + cost[inner[k]][n - 1], k) for k in range(len(inner)))
+    order, mask = [], full
+    while last is not None:
+        order.append(inner[last])
+        mask, last = mask & ~(1 << last), best[(mask, last)][1]
+    return [0] + order[::-1] + [n - 1]
+
+# Nearest neighbour tour improved with 2-opt, keeping the first and last points fixed
+def _nearest_neighbour_2opt(cost):
+    n = len(cost)
+    order, left = [0], set(range(1, n - 1))
+    while left:
+        nxt = min(left, key=lambda j: cost[order[-1]][j])
+        order.append(nxt)
+        left.discard(nxt)
+    order.append(n - 1)
+
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, n - 2):
+            for j in range(i + 1, n - 1):
+                a, b, c, d = order[i - 1], order[i], order[j], order[j + 1]
+                if cost[a][c] + cost[b][d] < cost[a][b] + cost[c][d] - 1e-9:
+                    order[i:j + 1] = order[i:j + 1][::-1]
+                    improved = True
+    return order
+
+# Orders the points for the shortest total route; point 0 is the start and point n-1 the end
+def order_tour(cost):
+    n = len(cost)
+    if n <= 3:
+        return list(range(n))
+    if n - 2 <= EXACT_TOUR_LIMIT:
+        return _held_karp(cost)
+    return _nearest_neighbour_2opt(cost)
+
+# Joins the legs of the tour into one path, without repeating the shared points
+def stitch_tour(order, paths):
+    stitched = []
+    for a, b in zip(order, order[1:]):
+        leg = paths[(a, b)]
+        stitched.extend(leg if not stitched else leg[1:])
+    return stitched
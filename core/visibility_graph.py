@@ -0,0 +1,149 @@
+from shared import dependencies as dep
+from core.graph_builder import segments_clear
+from core.pathfinder import dijkstra
+import math
+
+# מרחק הפינות מהבניין (פיקסלים) ודיוק פישוט קווי המתאר
+DEFAULT_CLEARANCE = 3
+DEFAULT_EPSILON = 2.0
+MAX_OFFSET_FACTOR = 3
+# הסביבה המרבית של נקודת המראה/נחיתה שנחשבת פנויה, כדי שסמן על בניין או צמוד אליו עדיין יראה פינות
+ENDPOINT_CLEARANCE = MAX_OFFSET_FACTOR * DEFAULT_CLEARANCE
+# מספר הזוגות גדל בריבוע מספר הפינות ובדיקות ההתנגשות איתו; מעבר לזה המפה נדחית
+MAX_CORNERS = 3000
+# זוגות מועמדים שנבדקים בבת אחת, כדי שהזיכרון לא יגדל עם מספר הפינות
+TANGENT_BLOCK_PAIRS = 1 << 20
+
+# Returns {corner: (wall_a, wall_b)} for the convex building corners (contours simplified with approxPolyDP),
+# each pushed out along the corner's outer bisector so it stays `clearance` pixels from both walls.
+# wall_a and wall_b are unit vectors along the two walls. Corners on a building or outside the image are dropped.
+def building_corners(building_mask, clearance=DEFAULT_CLEARANCE, epsilon=DEFAULT_EPSILON):
+    h, w = building_mask.shape
+    mask = building_mask.astype(dep.np.uint8)
+    contours, _ = dep.cv2.findContours(mask, dep.cv2.RETR_LIST, dep.cv2.CHAIN_APPROX_SIMPLE)
+    corners = {}
+    for contour in contours:
+        polygon = dep.cv2.approxPolyDP(contour, epsilon, True).reshape(-1, 2).tolist()
+        if len(polygon) < 3:
+            polygon = contour.reshape(-1, 2).tolist()
+        for i, (px, py) in enumerate(polygon):
+            ax, ay = polygon[i - 1][0] - px, polygon[i - 1][1] - py
+            bx, by = polygon[(i + 1) % len(polygon)][0] - px, polygon[(i + 1) % len(polygon)][1] - py
+            la, lb = math.hypot(ax, ay), math.hypot(bx, by)
+            if la == 0 or lb == 0:
+                continue
+            sx, sy = ax / la + bx / lb, ay / la + by / lb
+            s = math.hypot(sx, sy)
+            if s < 1e-6:
+                continue
+            # פינה קמורה: הטריז שבין שתי הצלעות (הקטן מ-180°) הוא בניין
+            wx, wy = int(round(px + 2 * sx / s)), int(round(py + 2 * sy / s))
+            if not (0 <= wx < w and 0 <= wy < h) or mask[wy, wx] != 1:
+                continue
+            half_angle_sin = math.sqrt(max(0.0, 1 - (s / 2) ** 2))
+            offset = min(clearance / max(half_angle_sin, 1e-6), MAX_OFFSET_FACTOR * clearance)
+            cx, cy = int(round(px - offset * sx / s)), int(round(py - offset * sy / s))
+            if 0 <= cx < w and 0 <= cy < h and mask[cy, cx] == 0:
+                corners.setdefault((cx, cy), ((ax / la, ay / la), (bx / lb, by / lb)))
+    return corners
+
+# Yields, a block of rows at a time (about block_pairs candidates each), the pairs whose line is tangent to the
+# building at each corner end (both walls on the same side). Other edges are never part of a shortest path,
+# so they are not collision tested.
+def _tangent_pairs(corners, node_list, block_pairs=TANGENT_BLOCK_PAIRS):
+    np = dep.np
+    n = len(node_list)
+    points = np.array(node_list, dtype=np.float64).reshape(-1, 2)
+    walls = np.array([corners[node] for node in node_list], dtype=np.float64).reshape(-1, 2, 2)
+    rows = max(1, block_pairs // max(n, 1))
+    for first in range(0, n, rows):
+        last = min(n, first + rows)
+        i = np.repeat(np.arange(first, last), n)
+        j = np.tile(np.arange(n), last - first)
+        upper = j > i
+        i, j = i[upper], j[upper]
+        rx, ry = (points[j] - points[i]).T
+
+        def tangent(k):
+            cross_a = rx * walls[k, 0, 1] - ry * walls[k, 0, 0]
+            cross_b = rx * walls[k, 1, 1] - ry * walls[k, 1, 0]
+            return cross_a * cross_b >= 0
+
+        keep = tangent(i) & tangent(j)
+        yield [(node_list[a], node_list[b]) for a, b in zip(i[keep].tolist(), j[keep].tolist())]
+
+def _tangent_at(corner, walls, other):
+    rx, ry = other[0] - corner[0], other[1] - corner[1]
+    (ax, ay), (bx, by) = walls
+    return (rx * ay - ry * ax) * (rx * by - ry * bx) >= 0
+
+# Keeps the pairs of points that see each other; returns them as [u, v, length] edges
+def _visible_pairs(pairs, building_mask):
+    if not pairs:
+        return []
+    clear = segments_clear([(*u, *v) for u, v in pairs], building_mask)
+    return [[u, v, math.hypot(v[0] - u[0], v[1] - u[1])] for (u, v), ok in zip(pairs, clear) if ok]
+
+# Builds the (tangent) visibility graph among the building corners; returns (corners, node_list, adjacency_dict).
+# Raises ValueError when the map has more than max_corners corners.
+def build_visibility_graph(building_mask, clearance=DEFAULT_CLEARANCE, epsilon=DEFAULT_EPSILON, max_corners=MAX_CORNERS):
+    corners = building_corners(building_mask, clearance, epsilon)
+    if len(corners) > max_corners:
+        raise ValueError(f"The map has {len(corners)} building corners; the visibility planner supports up to {max_corners}.")
+    node_list = sorted(corners)
+    adjacency_dict = {node: [] for node in node_list}
+    for pairs in _tangent_pairs(corners, node_list):
+        for u, v, dist in _visible_pairs(pairs, building_mask):
+            adjacency_dict[u].append([u, v, dist])
+            adjacency_dict[v].append([v, u, dist])
+    return corners, node_list, adjacency_dict
+
+# Returns building_mask with the square of `radius` around each point cleared (a copy, only when something is cleared)
+def _clear_around(building_mask, points, radius):
+    cleared = building_mask
+    if radius <= 0:
+        return cleared
+    for x, y in points:
+        window = (slice(max(0, y - radius), y + radius + 1), slice(max(0, x - radius), x + radius + 1))
+        if cleared[window].any():
+            if cleared is building_mask:
+                cleared = building_mask.copy()
+            cleared[window] = 0
+    return cleared
+
+# Radius of the square cleared around an endpoint: 0 in free space; on or next to a building, the smallest
+# radius (up to ENDPOINT_CLEARANCE) at which it sees one of the points in `pairs`
+def _endpoint_radius(point, pairs, building_mask):
+    x, y = point
+    if not building_mask[max(0, y - 1):y + 2, max(0, x - 1):x + 2].any():
+        return 0
+    own = [pair for pair in pairs if point in pair]
+    for radius in range(1, ENDPOINT_CLEARANCE):
+        if _visible_pairs(own, _clear_around(building_mask, [point], radius)):
+            return radius
+    return ENDPOINT_CLEARANCE
+
+# Shortest any-angle path from start to end: both points are joined to every corner they can see
+# (and to each other when the line is clear) on a copy of the cached graph. As with the other planners a
+# point on or next to a building is still usable: the smallest square around it that lets it see a corner
+# counts as clear, and a point that sees no corner at all is joined to the nearest one regardless of buildings.
+def visibility_path(start, end, visibility_graph, building_mask):
+    corners, node_list, cached = visibility_graph
+    adjacency_dict = {node: list(edges) for node, edges in cached.items()}
+    for point in (start, end):
+        adjacency_dict.setdefault(point, [])
+    pairs = [(point, node) for point in (start, end) for node in node_list
+             if _tangent_at(node, corners[node], point)] + [(start, end)]
+    cleared = building_mask
+    for point in (start, end):
+        cleared = _clear_around(cleared, [point], _endpoint_radius(point, pairs, building_mask))
+    edges = _visible_pairs(pairs, cleared)
+    connected = {u for u, _, _ in edges} | {v for _, v, _ in edges}
+    for point in (start, end):
+        if point not in connected and node_list:
+            nearest = min(node_list, key=lambda node: math.hypot(node[0] - point[0], node[1] - point[1]))
+            edges.append([point, nearest, math.hypot(nearest[0] - point[0], nearest[1] - point[1])])
+    for u, v, dist in edges:
+        adjacency_dict[u].append([u, v, dist])
+        adjacency_dict[v].append([v, u, dist])
+    return dijkstra(start, end, adjacency_dict)
@@ -12,9 +12,11 @@ path on both the buildings and satellite images.
 """
 
 import os
-from flask import Flask, request
+from flask import Flask, request, jsonify
 from flask_cors import CORS
-from services import mission_service
+from services import mission_service, dispatch_service, artifacts
+from services.admission import admission_controller
+from shared import dependencies
 
 app = Flask(__name__)
 CORS(app, origins=["https://www.skyops.co.il"])
@@ -26,10 +28,28 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
+# ייבוא מוקדם של התלויות הכבדות (SKYOPS_WARM_UP=1), כדי שהבקשה הראשונה לא תשלם עליו
+if os.environ.get("SKYOPS_WARM_UP") == "1":
+    dependencies.warm_up()
+
 @app.route("/api/create-mission", methods=["POST"])
 def create_mission_route():
     return mission_service.create_mission(request)
 
+@app.route("/api/dispatch", methods=["POST"])
+def dispatch_route():
+    return dispatch_service.dispatch(request)
+
+# עומק התור וזמני ההמתנה של בקרת הכניסה (לכל worker), לצורך קביעת גודל הפריסה
+@app.route("/api/admission-stats", methods=["GET"])
+def admission_stats_route():
+    return jsonify({**admission_controller.stats(), "pid": os.getpid()})
+
+# קבצי הפלט מוגשים עם ETag לפי תוכן, כך ש-If-None-Match מחזיר 304
+@app.route("/static/outputs/<path:filename>")
+def output_artifact_route(filename):
+    return artifacts.send_artifact(OUTPUT_FOLDER, filename)
+
 # Color constants
 GREEN = (0, 255, 0)
 RED = (0, 0, 255)
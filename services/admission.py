@@ -0,0 +1,227 @@
+import os
+import math
+import time
+import struct
+import threading
+from collections import deque
+from contextlib import contextmanager
+from flask import jsonify
+
+# עלות בקשה נמדדת ביחידות של מגה-פיקסל מפה שלא עובדה עדיין; הקיבולת היא סך העלות שרצה במקביל בתהליך
+DEFAULT_CAPACITY = float(os.environ.get("SKYOPS_ADMISSION_CAPACITY", str(2 * (os.cpu_count() or 1))))
+DEFAULT_MAX_QUEUE = int(os.environ.get("SKYOPS_ADMISSION_QUEUE", "16"))
+DEFAULT_MAX_WAIT_SECONDS = float(os.environ.get("SKYOPS_ADMISSION_MAX_WAIT", "30"))
+
+# מפה שכבר במטמון מדלגת על העיבוד ובניית הגרף – נשארים חיפוש וציור
+CACHED_MAP_FACTOR = 0.2
+# בניית הגרף של כל מתכנן ביחס לגרף השלד (נמדד על מפות הדוגמה); Theta* לא בונה גרף אלא מחפש ברשת בכל בקשה,
+# ברזולוציה מלאה – לכן הגורם שלו מחולק בריבוע ההקטנה
+PLANNER_FACTORS = {"skeleton": 1.0, "visibility": 1.5, "theta": 2.0}
+# עיבוד המסכות לבדו, כש-Theta* רץ על מפה שלא עובדה
+PREPROCESS_FACTOR = 0.1
+# כל נקודת ביניים מוסיפה חיפוש בגרף וחיבור לגרף; הסדר המדויק (Held-Karp) מוגבל ממילא ב-EXACT_TOUR_LIMIT
+WAYPOINT_FACTOR = 0.05
+# ציור המסלול על תמונת הלווין, לכל מגה-פיקסל
+SATELLITE_FACTOR = 0.1
+# כשאי אפשר לקרוא את מידות התמונה מהכותרת
+DEFAULT_MEGAPIXELS = 1.0
+# הערכה התחלתית של שניות ליחידת עלות, מתעדכנת מזמני הבקשות
+INITIAL_SECONDS_PER_UNIT = 3.0
+EWMA_ALPHA = 0.2
+WAIT_SAMPLES = 1000
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def _png_size(header):
+    if header[:8] == b"\x89PNG\r\n\x1a\n" and header[12:16] == b"IHDR":
+        return struct.unpack(">II", header[16:24])
+    return None
+
+
+def _jpeg_size(stream):
+    stream.seek(2)
+    while True:
+        if stream.read(1) != b"\xff":
+            return None
+        # לפני כל סמן יכול לבוא מספר כלשהו של בתי ריפוד 0xFF
+        marker = stream.read(1)
+        while marker == b"\xff":
+            marker = stream.read(1)
+        if not marker:
+            return None
+        marker = marker[0]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            continue
+        # EOI או SOS (אחריו נתונים דחוסים) לפני SOF – אין מידות בכותרת
+        if marker in (0xD9, 0xDA):
+            return None
+        length = stream.read(2)
+        if len(length) < 2:
+            return None
+        segment_length = struct.unpack(">H", length)[0]
+        # SOF0..SOF15, חוץ מ-DHT/JPG/DAC
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            frame = stream.read(5)
+            if len(frame) < 5:
+                return None
+            height, width = struct.unpack(">xHH", frame)
+            return width, height
+        if segment_length < 2:
+            return None
+        stream.seek(segment_length - 2, os.SEEK_CUR)
+
+
+# Returns (width, height) read from the PNG/JPEG header of an uploaded file without decoding it, or None
+def image_dimensions(file_storage):
+    stream = file_storage.stream
+    try:
+        header = stream.read(24)
+        if header[:2] == b"\xff\xd8":
+            return _jpeg_size(stream)
+        return _png_size(header)
+    except (OSError, struct.error):
+        return None
+    finally:
+        stream.seek(0)
+
+
+def _megapixels(file_storage):
+    size = image_dimensions(file_storage)
+    return size[0] * size[1] / 1e6 if size else DEFAULT_MEGAPIXELS
+
+
+# Estimated cost of a create-mission request: the map's megapixels weighted by the planner's work (discounted
+# when what the planner needs is already prepared: the graph, or for theta the masks) and the number of
+# waypoints, plus the rendering on the satellite image
+def mission_cost(buildings_file, satellite_file, map_cached=False, planner="skeleton", theta_downsample=1,
+                 waypoints=0):
+    if planner == "theta":
+        planning = PLANNER_FACTORS["theta"] / max(1, theta_downsample) ** 2 + (0.0 if map_cached else PREPROCESS_FACTOR)
+    else:
+        planning = CACHED_MAP_FACTOR if map_cached else PLANNER_FACTORS.get(planner, 1.0)
+    cost = _megapixels(buildings_file) * (planning + WAYPOINT_FACTOR * waypoints)
+    return cost + _megapixels(satellite_file) * SATELLITE_FACTOR
+
+
+class AdmissionController:
+    """
+    Bounds the total estimated cost of the requests running in this worker. Requests that do not fit
+    wait in FIFO order, up to max_queue of them and at most max_wait_seconds each; beyond that they
+    are rejected at once with an estimate of when to retry. A request costlier than the whole capacity
+    runs alone.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, max_queue=DEFAULT_MAX_QUEUE, max_wait_seconds=DEFAULT_MAX_WAIT_SECONDS,
+                 clock=time.monotonic):
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.max_wait_seconds = max_wait_seconds
+        self._clock = clock
+        self._condition = threading.Condition()
+        self._queue = deque()
+        self._in_flight = 0
+        self._in_flight_cost = 0.0
+        self._seconds_per_unit = INITIAL_SECONDS_PER_UNIT
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self.admitted = 0
+        self.queued = 0
+        self.rejected_full = 0
+        self.rejected_timeout = 0
+
+    def _fits(self, cost):
+        return self._in_flight == 0 or self._in_flight_cost + cost <= self.capacity
+
+    # Seconds until the queued and running work is expected to drain
+    def _retry_after(self):
+        backlog = self._in_flight_cost + sum(cost for _, cost in self._queue)
+        return max(1, math.ceil(backlog / self.capacity * self._seconds_per_unit))
+
+    @contextmanager
+    def admit(self, cost):
+        if self.capacity <= 0:
+            yield
+            return
+        ticket = (object(), cost)
+        started = self._clock()
+        with self._condition:
+            if not self._queue and self._fits(cost):
+                waited = False
+            elif len(self._queue) >= self.max_queue:
+                self.rejected_full += 1
+                raise AdmissionRejected("queue full", self._retry_after())
+            else:
+                waited = True
+                self.queued += 1
+                self._queue.append(ticket)
+                deadline = started + self.max_wait_seconds
+                while self._queue[0] is not ticket or not self._fits(cost):
+                    remaining = deadline - self._clock()
+                    if remaining <= 0:
+                        self._queue.remove(ticket)
+                        self.rejected_timeout += 1
+                        self._condition.notify_all()
+                        raise AdmissionRejected("queue wait timed out", self._retry_after())
+                    self._condition.wait(remaining)
+                self._queue.popleft()
+                # הבקשה הבאה בתור אולי נכנסת גם היא
+                self._condition.notify_all()
+            admitted_at = self._clock()
+            self._waits.append(admitted_at - started if waited else 0.0)
+            self._in_flight += 1
+            self._in_flight_cost += cost
+            self.admitted += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._in_flight -= 1
+                self._in_flight_cost -= cost
+                if cost > 0:
+                    # זמן ריצה ליחידת עלות, מחולק במספר הבקשות שרצו במקביל
+                    observed = (self._clock() - admitted_at) / cost / (self._in_flight + 1)
+                    self._seconds_per_unit += EWMA_ALPHA * (observed - self._seconds_per_unit)
+                self._condition.notify_all()
+
+    def stats(self):
+        with self._condition:
+            waits = sorted(self._waits)
+            return {
+                "capacity": self.capacity,
+                "maxQueue": self.max_queue,
+                "maxWaitSeconds": self.max_wait_seconds,
+                "inFlight": self._in_flight,
+                "inFlightCost": round(self._in_flight_cost, 3),
+                "queueDepth": len(self._queue),
+                "queuedCost": round(sum(cost for _, cost in self._queue), 3),
+                "admitted": self.admitted,
+                "queued": self.queued,
+                "rejectedQueueFull": self.rejected_full,
+                "rejectedTimeout": self.rejected_timeout,
+                "secondsPerCostUnit": round(self._seconds_per_unit, 3),
+                "waitSeconds": {
+                    "samples": len(waits),
+                    "mean": sum(waits) / len(waits) if waits else 0.0,
+                    "p50": waits[len(waits) // 2] if waits else 0.0,
+                    "p95": waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0,
+                    "max": waits[-1] if waits else 0.0,
+                },
+            }
+
+
+def rejected_response(rejection):
+    response = jsonify({
+        "message": f"Server busy ({rejection.reason}), retry later.",
+        "success": False,
+        "retryAfterSeconds": rejection.retry_after,
+    })
+    return response, 503, {"Retry-After": str(rejection.retry_after)}
+
+
+# בקר אחד לכל worker
+admission_controller = AdmissionController()
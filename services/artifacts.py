@@ -0,0 +1,57 @@
+import os
+import time
+import shutil
+import hashlib
+import threading
+from flask import abort, send_from_directory
+from werkzeug.security import safe_join
+
+# path → (mtime_ns, size, etag); ה-ETag מחושב מתוכן הקובץ ונשמר עד שהקובץ משתנה
+_etags = {}
+_etags_lock = threading.Lock()
+
+
+def file_etag(path):
+    stat = os.stat(path)
+    with _etags_lock:
+        cached = _etags.get(path)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    etag = digest.hexdigest()
+    with _etags_lock:
+        _etags[path] = (stat.st_mtime_ns, stat.st_size, etag)
+    return etag
+
+
+# Removes the subfolders of `parent` not modified for max_age_seconds, then the least recently modified ones
+# beyond max_folders. Folders modified within grace_seconds (possibly still being written or served) and
+# the names in `keep` are left alone. Returns the number of removed folders.
+def prune_folders(parent, max_folders, max_age_seconds, keep=(), grace_seconds=300):
+    now = time.time()
+    try:
+        with os.scandir(parent) as entries:
+            folders = sorted(((entry.stat().st_mtime, entry.path) for entry in entries
+                              if entry.is_dir(follow_symlinks=False) and entry.name not in keep),
+                             reverse=True)
+    except FileNotFoundError:
+        return 0
+    removed = 0
+    for index, (mtime, path) in enumerate(folders):
+        if now - mtime < grace_seconds:
+            continue
+        if index >= max_folders or now - mtime > max_age_seconds:
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    return removed
+
+
+# Serves a generated artifact with a content-based ETag; If-None-Match answers 304 Not Modified
+def send_artifact(folder, filename):
+    path = safe_join(folder, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    return send_from_directory(folder, filename, etag=file_etag(path), conditional=True)
@@ -0,0 +1,230 @@
+import io
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+
+BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'static')
+# האינדקסים נשמרים מחוץ ל-static, שכולו מוגש כקבצים סטטיים
+INDEX_DIR = os.environ.get("SKYOPS_STORE_INDEX_DIR",
+                           os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'instance'))
+
+# גבולות הגודל והגיל של כל מאגר, ניתנים לשינוי דרך משתני סביבה
+UPLOAD_STORE_MAX_BYTES = int(os.environ.get("SKYOPS_UPLOAD_STORE_MAX_BYTES", str(2 << 30)))
+UPLOAD_STORE_MAX_AGE = float(os.environ.get("SKYOPS_UPLOAD_STORE_MAX_AGE", str(30 * 86400)))
+OUTPUT_STORE_MAX_BYTES = int(os.environ.get("SKYOPS_OUTPUT_STORE_MAX_BYTES", str(1 << 30)))
+OUTPUT_STORE_MAX_AGE = float(os.environ.get("SKYOPS_OUTPUT_STORE_MAX_AGE", str(7 * 86400)))
+
+# קובץ שנגעו בו לאחרונה לא נמחק, כי בקשה אחרת עשויה לקרוא אותו ממש עכשיו
+EVICTION_GRACE_SECONDS = 300
+# סריקת גיל לכל היותר פעם בדקה; חריגה מהגודל מפעילה פינוי מיד
+SWEEP_INTERVAL_SECONDS = 60
+
+_EXTENSION = re.compile(r"^\.[a-z0-9]{1,8}$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    ext TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS blobs_accessed ON blobs (accessed);
+CREATE TABLE IF NOT EXISTS derived (
+    source TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (source, kind)
+);
+CREATE INDEX IF NOT EXISTS derived_digest ON derived (digest);
+"""
+
+
+def normalize_extension(filename):
+    ext = os.path.splitext(filename or "")[1].lower()
+    return ext if _EXTENSION.match(ext) else ".bin"
+
+
+class ContentStore:
+    """
+    Files keyed by the sha256 of their bytes, stored once as <root>/<ab>/<digest><ext>.
+    An sqlite index (kept outside the served folders) records size and last access (for size and
+    age eviction) and the artifacts derived from a blob (e.g. the preprocessed mask of an uploaded map).
+    Safe across threads and worker processes: files are written to a temporary name and
+    renamed into place under the index's write lock.
+    """
+
+    def __init__(self, root, index_path, max_bytes, max_age_seconds, grace_seconds=EVICTION_GRACE_SECONDS,
+                 clock=time.time):
+        self.root = os.path.abspath(root)
+        self.index_path = os.path.abspath(index_path)
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.grace_seconds = grace_seconds
+        self._clock = clock
+        self._local = threading.local()
+        self._last_sweep = 0.0
+        os.makedirs(self.root, exist_ok=True)
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        self._connection().executescript(_SCHEMA)
+
+    # חיבור לכל thread; אחרי fork (gunicorn --preload) נפתח חיבור חדש
+    def _connection(self):
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.index_path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    # BEGIN IMMEDIATE: כתיבה לאינדקס ולתיקייה נעשית תחת נעילת הכתיבה של sqlite, גם בין תהליכים
+    @contextmanager
+    def _transaction(self):
+        db = self._connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def _blob_path(self, digest, ext):
+        return os.path.join(self.root, digest[:2], f"{digest}{ext}")
+
+    # Returns the path of a stored blob, or None. With touch the blob is marked as used; the last-use time
+    # is only written when it is older than half the grace period, so most lookups are plain reads.
+    def path(self, digest, touch=True):
+        db = self._connection()
+        row = db.execute("SELECT ext, accessed FROM blobs WHERE digest = ?", (digest,)).fetchone()
+        if row is None:
+            return None
+        ext, accessed = row
+        now = self._clock()
+        if touch and now - accessed > self.grace_seconds / 2:
+            # אם evict מחק את הרשומה בינתיים, אף שורה לא מתעדכנת; אחרי העדכון הקובץ מוגן בתקופת החסד
+            if db.execute("UPDATE blobs SET accessed = ? WHERE digest = ?", (now, digest)).rowcount == 0:
+                return None
+        path = self._blob_path(digest, ext)
+        return path if os.path.isfile(path) else None
+
+    # Stores the bytes read from `stream` and returns (digest, path). When the caller already knows
+    # the digest and the blob is stored, nothing is read or written.
+    def put_stream(self, stream, ext, digest=None):
+        ext = ext if _EXTENSION.match(ext) else ".bin"
+        if digest is not None:
+            path = self.path(digest)
+            if path is not None:
+                return digest, path
+        hasher = hashlib.sha256()
+        tmp_path = os.path.join(self.root, f".{os.getpid()}-{threading.get_ident()}-{time.monotonic_ns()}.tmp")
+        size = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in iter(lambda: stream.read(1 << 20), b""):
+                    hasher.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            digest = hasher.hexdigest()
+            path = self._commit(tmp_path, digest, ext, size)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._maybe_evict()
+        return digest, path
+
+    def put_bytes(self, data, ext):
+        return self.put_stream(io.BytesIO(data), ext, digest=hashlib.sha256(data).hexdigest())
+
+    # Moves a fully written temporary file into place, unless the same content is already stored
+    def _commit(self, tmp_path, digest, ext, size):
+        now = self._clock()
+        with self._transaction() as db:
+            row = db.execute("SELECT ext FROM blobs WHERE digest = ?", (digest,)).fetchone()
+            if row is not None and os.path.isfile(self._blob_path(digest, row[0])):
+                db.execute("UPDATE blobs SET accessed = ? WHERE digest = ?", (now, digest))
+                return self._blob_path(digest, row[0])
+            path = self._blob_path(digest, ext)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+            db.execute("INSERT OR REPLACE INTO blobs (digest, ext, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                       (digest, ext, size, now, now))
+        return path
+
+    # Records that `digest` was derived from `source` as `kind` (one artifact per source and kind)
+    def link_derived(self, source, kind, digest):
+        with self._transaction() as db:
+            db.execute("INSERT OR REPLACE INTO derived (source, kind, digest) VALUES (?, ?, ?)", (source, kind, digest))
+
+    # Returns the path of the `kind` artifact previously derived from `source`, or None;
+    # touch=False only checks for it, without marking it as used
+    def derived(self, source, kind, touch=True):
+        row = self._connection().execute(
+            "SELECT digest FROM derived WHERE source = ? AND kind = ?", (source, kind)).fetchone()
+        return self.path(row[0], touch) if row is not None else None
+
+    def put_derived(self, source, kind, data, ext):
+        digest, path = self.put_bytes(data, ext)
+        self.link_derived(source, kind, digest)
+        return path
+
+    def _maybe_evict(self):
+        now = self._clock()
+        if now - self._last_sweep >= SWEEP_INTERVAL_SECONDS or self.total_bytes() > self.max_bytes:
+            self._last_sweep = now
+            self.evict()
+
+    def total_bytes(self):
+        return self._connection().execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    # Removes blobs not used for max_age_seconds, then the least recently used ones until the store
+    # fits in max_bytes. Blobs used within grace_seconds are kept. Returns the number of removed blobs.
+    def evict(self):
+        now = self._clock()
+        protected_after = now - self.grace_seconds
+        with self._transaction() as db:
+            victims = db.execute("SELECT digest, ext, size FROM blobs WHERE accessed < ?",
+                                 (min(now - self.max_age_seconds, protected_after),)).fetchall()
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+            total -= sum(size for _, _, size in victims)
+            if total > self.max_bytes:
+                expired = {digest for digest, _, _ in victims}
+                for digest, ext, size in db.execute(
+                        "SELECT digest, ext, size FROM blobs WHERE accessed < ? ORDER BY accessed",
+                        (protected_after,)):
+                    if total <= self.max_bytes:
+                        break
+                    if digest not in expired:
+                        victims.append((digest, ext, size))
+                        total -= size
+            for digest, ext, _ in victims:
+                try:
+                    os.remove(self._blob_path(digest, ext))
+                except FileNotFoundError:
+                    pass
+            db.executemany("DELETE FROM blobs WHERE digest = ?", [(digest,) for digest, _, _ in victims])
+            db.executemany("DELETE FROM derived WHERE digest = ?", [(digest,) for digest, _, _ in victims])
+        return len(victims)
+
+    def stats(self):
+        db = self._connection()
+        blobs, total = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        return {
+            "blobs": blobs,
+            "bytes": total,
+            "derived": db.execute("SELECT COUNT(*) FROM derived").fetchone()[0],
+            "maxBytes": self.max_bytes,
+            "maxAgeSeconds": self.max_age_seconds,
+        }
+
+
+# קבצים שהועלו (מפות ותמונות לווין) וקבצי הפלט של המשימות; הפלט מוגש תחת /static/outputs/objects/
+upload_store = ContentStore(os.path.join(BASE_DIR, 'uploads'), os.path.join(INDEX_DIR, 'uploads.sqlite'),
+                            UPLOAD_STORE_MAX_BYTES, UPLOAD_STORE_MAX_AGE)
+output_store = ContentStore(os.path.join(BASE_DIR, 'outputs', 'objects'), os.path.join(INDEX_DIR, 'outputs.sqlite'),
+                            OUTPUT_STORE_MAX_BYTES, OUTPUT_STORE_MAX_AGE)
@@ -0,0 +1,115 @@
+from flask import jsonify
+from core import metrics
+from core.graph_builder import attach_points
+from core.pathfinder import optimize_path
+from core.dispatch import rank_bases, nearest_base
+from services.mission_utils import (error_response, save_uploaded_file, parse_coord, parse_coord_list,
+                                    find_color_pixels, group_marker_pixels, file_digest,
+                                    pixel_to_real, real_to_pixel)
+from services.map_cache import get_map
+from services.content_store import upload_store
+
+GREEN = (0, 255, 0)
+RED = (0, 0, 255)
+
+# rank – חיפוש אחד מהיעד שמדרג את כל הבסיסים; nearest – חיפוש רב-מקורי שמחזיר רק את הקרוב ביותר
+DISPATCH_MODES = ("rank", "nearest")
+
+
+def _to_pixels(coords_str, corners, width, height):
+    pixels = []
+    for (real_x, real_y) in parse_coord_list(coords_str):
+        pixel = real_to_pixel(real_x, real_y, corners, width, height)
+        if not (0 <= pixel[0] < width and 0 <= pixel[1] < height):
+            raise ValueError(f"Point ({real_x}, {real_y}) is outside the map.")
+        pixels.append(pixel)
+    return pixels
+
+
+def dispatch(request):
+    try:
+        if "buildings_image" not in request.files:
+            return error_response("Missing file: buildings_image.")
+
+        buildings_file = request.files["buildings_image"]
+        buildings_digest = file_digest(buildings_file)
+        buildings_path = save_uploaded_file(buildings_file, upload_store, buildings_digest)
+
+        top_left_coord_str = request.form.get("top_left_coord")
+        bottom_right_coord_str = request.form.get("bottom_right_coord")
+        if not (top_left_coord_str and bottom_right_coord_str):
+            return error_response("Missing top_left_coord or bottom_right_coord")
+        corners = (*parse_coord(top_left_coord_str), *parse_coord(bottom_right_coord_str))
+
+        mode = request.form.get("mode", "rank").strip().lower()
+        if mode not in DISPATCH_MODES:
+            return error_response(f"Unknown mode: {mode}. Expected one of: {', '.join(DISPATCH_MODES)}")
+        limit = None
+        if request.form.get("limit", "").strip():
+            try:
+                limit = int(request.form["limit"])
+            except ValueError:
+                return error_response("limit must be a positive integer.")
+            if limit < 1:
+                return error_response("limit must be a positive integer.")
+
+        map_artifacts = get_map(buildings_path, buildings_digest)
+        height, width = map_artifacts.original_image.shape[:2]
+
+        # יעד ובסיסים: מהשדות target/bases, או מהסמנים בתמונה (אדום – יעד, ירוקים – בסיסים)
+        markers = find_color_pixels(map_artifacts.original_image, [GREEN, RED])
+        try:
+            if request.form.get("target"):
+                target = _to_pixels(request.form["target"], corners, width, height)[0]
+            else:
+                target = markers[RED][0] if markers[RED] else None
+            if request.form.get("bases"):
+                bases = _to_pixels(request.form["bases"], corners, width, height)
+            else:
+                bases = group_marker_pixels(markers[GREEN])
+        except ValueError as ex:
+            return error_response(str(ex))
+        if target is None or not bases:
+            return error_response("Missing target and/or bases.")
+
+        building_mask = map_artifacts.building_mask
+        final_image, node_list, adjacency_dict = map_artifacts.skeleton_graph()
+        points = [target] + bases
+        failed = attach_points(points, adjacency_dict, building_mask, final_image, node_list,
+                               direct_pairs=[(0, i) for i in range(1, len(points))])
+        if failed is not None:
+            return error_response(f"Could not connect point {failed} to the graph.")
+
+        if mode == "nearest":
+            ranked = nearest_base(target, bases, adjacency_dict)
+        else:
+            ranked = rank_bases(target, bases, adjacency_dict, limit=limit)
+
+        def to_real(pixel):
+            real_x, real_y = pixel_to_real(pixel[0], pixel[1], corners, width, height)
+            return {"x": real_x, "y": real_y}
+
+        results = []
+        for item in ranked:
+            path = optimize_path(item["path"], building_mask)
+            real_path = [pixel_to_real(x, y, corners, width, height) for (x, y) in path]
+            results.append({
+                "index": item["index"],
+                "base": to_real(item["base"]),
+                "distancePixels": item["distance"],
+                "routeLength": metrics.compute_path_length(real_path),
+                "path": [{"x": x, "y": y} for (x, y) in real_path],
+            })
+
+        reached = {item["index"] for item in ranked}
+        return jsonify({
+            "message": "Dispatch computed successfully",
+            "success": True,
+            "mode": mode,
+            "target": to_real(target),
+            "bases": results,
+            "unreachable": [i for i in range(len(bases)) if i not in reached] if mode == "rank" else [],
+        }), 200
+
+    except Exception as e:
+        return error_response(f"Error: {str(e)}", 500)
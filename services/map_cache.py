@@ -0,0 +1,229 @@
+import io
+import os
+import weakref
+import threading
+from collections import OrderedDict
+from shared import dependencies as dep
+from core.image_loader import load_and_preprocess_image
+from core.graph_builder import build_skeleton_graph
+from core.visibility_graph import build_visibility_graph
+from core.lazy_graph import build_edge_tracer
+from core.graph_simplifier import simplify_graph
+from core.skeletonizer import merge_images
+from core.roi import build_roi_graph
+from services.result_cache import ResultCache
+from services.profiling import stage
+from services import shared_maps
+from services.content_store import upload_store
+
+DEFAULT_MAX_MAPS = int(os.environ.get("SKYOPS_MAP_CACHE_SIZE", "16"))
+DEFAULT_MAP_TTL_SECONDS = float(os.environ.get("SKYOPS_MAP_CACHE_TTL", "21600"))
+# גרפי אזור (roi=1) שנשמרים לכל מפה, לפי התיבה
+ROI_GRAPHS_PER_MAP = 32
+
+# תוצרים שנשמרים במאגר ההעלאות לפי תוכן המפה ושורדים הפעלה מחדש; הגרסה משתנה כשהעיבוד משתנה
+DERIVED_BINARY_IMAGE = "binary-image:v1"
+DERIVED_SKELETON_GRAPH = "skeleton-graph:v1"
+
+
+# Skeleton graph of the map, loaded from the upload store when it was already built for the same bytes
+def _skeleton_graph(artifacts):
+    stored = upload_store.derived(artifacts.digest, DERIVED_SKELETON_GRAPH)
+    if stored is not None:
+        with dep.np.load(stored) as arrays:
+            return (arrays["final_image"], *shared_maps.arrays_to_graph(arrays))
+    final_image, node_list, adjacency_dict = build_skeleton_graph(artifacts.binary_image)
+    buffer = io.BytesIO()
+    dep.np.savez(buffer, final_image=final_image, **shared_maps.graph_to_arrays(node_list, adjacency_dict))
+    upload_store.put_derived(artifacts.digest, DERIVED_SKELETON_GRAPH, buffer.getvalue(), ".npz")
+    return final_image, node_list, adjacency_dict
+
+
+# בוני גרפים לפי סוג; כל גרף נבנה פעם אחת למפה ונשמר עם שאר תוצרי המפה
+GRAPH_BUILDERS = {
+    "skeleton": _skeleton_graph,
+    "visibility": lambda artifacts: build_visibility_graph(artifacts.building_mask),
+    "skeleton-lazy": lambda artifacts: build_edge_tracer(artifacts.binary_image),
+}
+
+
+class MapArtifacts:
+    """
+    Everything derived from one buildings image: the decoded image, the binary/building masks
+    and the graphs built on them. Graphs are built on first use and shared by all requests for the map.
+
+    With shared maps (from_shared), the image and masks live in shared memory from the start, and the
+    skeleton graph's image and CSR arrays are published the first time any worker builds the graph.
+    What stays per worker: the adjacency dict the planners search, which is rebuilt from the shared arrays
+    (Python objects cannot live in shared memory), and the visibility, lazy, simplified and ROI graphs.
+    This tree has no separate clearance map; the visibility graph's corners are the only clearance data.
+    """
+
+    def __init__(self, digest, original_image, binary_image, building_mask=None):
+        self.digest = digest
+        self.original_image = original_image
+        self.binary_image = binary_image
+        self.building_mask = (binary_image == 1).astype(dep.np.uint8) if building_mask is None else building_mask
+        self._graphs = {}
+        self._roi_graphs = OrderedDict()
+        self._buildings_image = None
+        self._lock = threading.RLock()
+        self._shared = None
+
+    # Artifacts backed by the read-only shared-memory arrays of shared_maps.acquire. The mappings are released
+    # when the artifacts are garbage collected, i.e. after the map left the cache and the last request using it ended.
+    @classmethod
+    def from_shared(cls, digest, shared):
+        artifacts = cls(digest, shared["original_image"], shared["binary_image"], shared["building_mask"])
+        artifacts._shared = shared
+        weakref.finalize(artifacts, shared.release)
+        return artifacts
+
+    # Arrays published to shared memory when the map is loaded: the image and the masks
+    def shared_arrays(self):
+        return {
+            "original_image": self.original_image,
+            "binary_image": self.binary_image,
+            "building_mask": self.building_mask,
+        }
+
+    # גרף השלד מתפרסם לזיכרון המשותף רק כשהוא נדרש בפעם הראשונה; worker שבנה אותו שומר את המילון שבנה,
+    # והשאר בונים את המילון מהמערכים המשותפים פעם אחת בכל תהליך
+    def _shared_skeleton_graph(self):
+        built = []
+
+        def build():
+            built.append(_skeleton_graph(self))
+            final_image, node_list, adjacency_dict = built[0]
+            return {"final_image": final_image, **shared_maps.graph_to_arrays(node_list, adjacency_dict)}
+
+        shared = shared_maps.acquire(self.digest, build, group="skeleton")
+        weakref.finalize(self, shared.release)
+        graph = built[0][1:] if built else shared_maps.arrays_to_graph(shared.arrays)
+        return (shared["final_image"], *graph)
+
+    def graph(self, kind="skeleton", build=None):
+        with self._lock:
+            if kind not in self._graphs:
+                if kind == "skeleton" and self._shared is not None:
+                    build = MapArtifacts._shared_skeleton_graph
+                with stage(f"graph:{kind if isinstance(kind, str) else kind[0]}"):
+                    self._graphs[kind] = (build or GRAPH_BUILDERS[kind])(self)
+            return self._graphs[kind]
+
+    # True when the graph was already built (or loaded) in this process
+    def has_graph(self, kind="skeleton"):
+        return kind in self._graphs
+
+    # Edge count of the skeleton graph when it is built in this process or kept in the upload store, else None
+    def skeleton_edge_count(self):
+        if self.has_graph("skeleton"):
+            return sum(len(edges) for edges in self.graph("skeleton")[2].values()) // 2
+        stored = upload_store.derived(self.digest, DERIVED_SKELETON_GRAPH, touch=False)
+        if stored is None:
+            return None
+        with dep.np.load(stored) as arrays:
+            return len(arrays["targets"]) // 2
+
+    # Skeleton graph after merging junctions within merge_radius and contracting degree-2 chains;
+    # returns (final_image, node_list, adjacency_dict, stats)
+    def simplified_skeleton(self, merge_radius):
+        def build(artifacts):
+            final_image, _, adjacency_dict = artifacts.graph("skeleton")
+            simplified, stats = simplify_graph(adjacency_dict, artifacts.building_mask, merge_radius=merge_radius)
+            return final_image, list(simplified), simplified, stats
+        return self.graph(("skeleton-simplified", merge_radius), build)
+
+    # Returns a private copy of the skeleton graph (simplified when merge_radius is given)
+    # that the caller may add points and draw on
+    def skeleton_graph(self, merge_radius=None):
+        if merge_radius is None:
+            final_image, node_list, adjacency_dict = self.graph("skeleton")
+        else:
+            final_image, node_list, adjacency_dict, _ = self.simplified_skeleton(merge_radius)
+        return final_image.copy(), list(node_list), {node: list(edges) for node, edges in adjacency_dict.items()}
+
+    # Returns a private copy of the skeleton graph built only inside `box` (simplified when merge_radius is given)
+    # as (final_image, node_list, adjacency_dict, stats). The graphs of the last ROI_GRAPHS_PER_MAP boxes are kept.
+    # final_image is the whole map drawn as in the full skeleton graph, with the skeleton of the box inside it.
+    def roi_skeleton_graph(self, box, merge_radius=None):
+        key = (box, merge_radius)
+        with self._lock:
+            if key in self._roi_graphs:
+                self._roi_graphs.move_to_end(key)
+            else:
+                with stage("graph:roi"):
+                    roi_image, node_list, adjacency_dict = build_roi_graph(self.binary_image, box)
+                    stats = None
+                    if merge_radius is not None:
+                        adjacency_dict, stats = simplify_graph(adjacency_dict, self.building_mask,
+                                                               merge_radius=merge_radius)
+                        node_list = list(adjacency_dict)
+                self._roi_graphs[key] = (roi_image, node_list, adjacency_dict, stats)
+                while len(self._roi_graphs) > ROI_GRAPHS_PER_MAP:
+                    self._roi_graphs.popitem(last=False)
+            roi_image, node_list, adjacency_dict, stats = self._roi_graphs[key]
+            if self._buildings_image is None:
+                # הבניינים כמו בתמונת השלד המלאה (לבן על שחור), בלי השלד
+                self._buildings_image = merge_images(self.binary_image, dep.np.zeros_like(self.binary_image))
+        final_image = self._buildings_image.copy()
+        x0, y0, x1, y1 = box
+        final_image[y0:y1, x0:x1] = roi_image
+        return final_image, list(node_list), {node: list(edges) for node, edges in adjacency_dict.items()}, stats
+
+
+# מפה שיוצאת מהמטמון משחררת את הזיכרון המשותף רק כשאחרונת הבקשות שמשתמשות בה מסתיימת (from_shared)
+map_cache = ResultCache(max_entries=DEFAULT_MAX_MAPS, ttl_seconds=DEFAULT_MAP_TTL_SECONDS)
+_load_locks = {}
+_load_locks_guard = threading.Lock()
+
+
+def _load_lock(digest):
+    # נעילה לכל מפה, כך שבקשות לאותה מפה מחכות לעיבוד אחד ובקשות למפות אחרות לא נחסמות
+    with _load_locks_guard:
+        return _load_locks.setdefault(digest, threading.Lock())
+
+
+def _load_map(path, digest):
+    with stage("preprocess"):
+        stored = upload_store.derived(digest, DERIVED_BINARY_IMAGE)
+        if stored is not None:
+            original_image = dep.cv2.imread(path, dep.cv2.IMREAD_UNCHANGED)
+            binary_image = dep.cv2.imread(stored, dep.cv2.IMREAD_UNCHANGED)
+        else:
+            original_image, binary_image = load_and_preprocess_image(path)
+            upload_store.put_derived(digest, DERIVED_BINARY_IMAGE,
+                                     dep.cv2.imencode(".png", binary_image)[1].tobytes(), ".png")
+        if len(original_image.shape) == 3 and original_image.shape[2] == 4:
+            original_image = dep.cv2.cvtColor(original_image, dep.cv2.COLOR_BGRA2BGR)
+        return MapArtifacts(digest, original_image, binary_image)
+
+
+# True when the map's `kind` graph (None: only the masks) is ready without preprocessing, in this worker's cache
+# or, for the skeleton graph and the masks, in the upload store. Read-only: the map's position in the cache
+# and its stored artifacts' last use are left as they are, so a request rejected by admission changes nothing.
+def is_preprocessed(digest, kind="skeleton"):
+    artifacts = map_cache.peek(digest)
+    if artifacts is not None and (kind is None or artifacts.has_graph(kind)):
+        return True
+    derived_kind = {None: DERIVED_BINARY_IMAGE, "skeleton": DERIVED_SKELETON_GRAPH}.get(kind)
+    return derived_kind is not None and upload_store.derived(digest, derived_kind, touch=False) is not None
+
+
+# Returns the artifacts of the buildings image at `path` (content hash `digest`), preprocessing it on a miss
+def get_map(path, digest):
+    artifacts = map_cache.get(digest)
+    if artifacts is not None:
+        return artifacts
+    with _load_lock(digest):
+        artifacts = map_cache.get(digest)
+        if artifacts is None:
+            if shared_maps.SHARED_MAPS_ENABLED:
+                shared = shared_maps.acquire(digest, lambda: _load_map(path, digest).shared_arrays())
+                artifacts = MapArtifacts.from_shared(digest, shared)
+            else:
+                artifacts = _load_map(path, digest)
+            map_cache.put(digest, artifacts)
+    with _load_locks_guard:
+        _load_locks.pop(digest, None)
+    return artifacts
@@ -2,6 +2,11 @@ import os
 import json
 from flask import jsonify
 from shared import dependencies as dep
+from services.tile_renderer import render_mission_tiles
+from services.mission_utils import pixel_to_real
+from services.profiling import stage
+from services.content_store import output_store
+from services.artifacts import prune_folders
 
 GREEN = (0, 255, 0)
 
@@ -9,17 +14,62 @@ GREEN = (0, 255, 0)
 SERVER_URL = "https://skyops-backend-production-0228.up.railway.app"
 
 OUTPUT_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'static', 'outputs')
+OUTPUTS_URL = f"{SERVER_URL}/static/outputs/"
 
+# תיקיות לכל משימה (אריחי מסלול, פרופילים) – עד MISSION_FOLDERS_MAX מהן ולא יותר מ-MISSION_FOLDER_MAX_AGE שניות
+MISSION_FOLDERS_MAX = int(os.environ.get("SKYOPS_MISSION_FOLDERS_MAX", "256"))
+MISSION_FOLDER_MAX_AGE = float(os.environ.get("SKYOPS_MISSION_FOLDER_MAX_AGE", str(7 * 86400)))
+# תיקיות המשותפות לכל המשימות, לא תיקיות משימה
+SHARED_OUTPUT_FOLDERS = ("objects", "tiles")
 
-def generate_and_respond_path(path_int, original_image, satellite_path,
-                              takeoff_pixel, landing_pixel,
-                              X_top_left, Y_top_left, X_bottom_right, Y_bottom_right):
+# image – תמונת לווין אחת בגודל מלא; tiles – פירמידת אריחים שבה רק אריחי המסלול מקודדים מחדש
+OUTPUT_MODES = ("image", "tiles")
+
+
+# Stores an output file by content (identical outputs are written once) and returns its URL
+def store_output(data, ext):
+    _, path = output_store.put_bytes(data, ext)
+    return OUTPUTS_URL + os.path.relpath(path, OUTPUT_FOLDER).replace(os.sep, "/")
+
+
+def store_image(image):
+    _, encoded = dep.cv2.imencode(".png", image)
+    return store_output(encoded.tobytes(), ".png")
+
+
+# Returns the output folder of one mission, marked as just used; the least recently used mission folders
+# beyond MISSION_FOLDERS_MAX, and those unused for MISSION_FOLDER_MAX_AGE, are removed
+def mission_folder(mission_id):
+    folder = os.path.join(OUTPUT_FOLDER, mission_id)
+    os.makedirs(folder, exist_ok=True)
+    os.utime(folder)
+    prune_folders(OUTPUT_FOLDER, MISSION_FOLDERS_MAX, MISSION_FOLDER_MAX_AGE, keep=SHARED_OUTPUT_FOLDERS)
+    return folder
+
+
+# Checks that every artifact URL in a mission response still exists on disk (used before serving a cached result)
+def artifacts_exist(response):
+    for key, value in response.items():
+        if isinstance(value, dict) and not artifacts_exist(value):
+            return False
+        if key.endswith("Url") and isinstance(value, str) and value.startswith(OUTPUTS_URL):
+            if not os.path.isfile(os.path.join(OUTPUT_FOLDER, value[len(OUTPUTS_URL):])):
+                return False
+    return True
+
+
+# Draws the route on the map and satellite images, stores them with the coordinates file and
+# returns the mission response (without Flask, so the batch planner can use it as well)
+@stage("render")
+def render_mission_outputs(path_int, original_image, satellite_path,
+                           X_top_left, Y_top_left, X_bottom_right, Y_bottom_right, extra=None,
+                           mission_id=None, output_mode="image", verbose=True):
 
     height, width = original_image.shape[:2]
+    corners = (X_top_left, Y_top_left, X_bottom_right, Y_bottom_right)
     real_path = []
     for (pixel_x, pixel_y) in path_int:
-        real_x = X_top_left + pixel_x * ((X_bottom_right - X_top_left) / width)
-        real_y = Y_top_left + pixel_y * ((Y_bottom_right - Y_top_left) / height)
+        real_x, real_y = pixel_to_real(pixel_x, pixel_y, corners, width, height)
         real_path.append({"x": real_x, "y": real_y})
 
     # ציור המסלול על התמונה
@@ -30,47 +80,67 @@ def generate_and_respond_path(path_int, original_image, satellite_path,
         dep.cv2.line(final_image, (xA, yA), (xB, yB), GREEN, 2)
 
     rgb_out = dep.cv2.cvtColor(final_image, dep.cv2.COLOR_BGR2RGB)
-    output_graph_filename = "auto_route.png"
-    route_image_path = os.path.join(OUTPUT_FOLDER, output_graph_filename)
-    dep.cv2.imwrite(route_image_path, rgb_out)
-
-    # ציור המסלול גם על תמונת הלווין
-    satellite_image = dep.cv2.imread(satellite_path)
-    if satellite_image.shape[2] == 4:
-        satellite_image = dep.cv2.cvtColor(satellite_image, dep.cv2.COLOR_BGRA2BGR)
-
-    for i in range(len(path_int) - 1):
-        pt1 = path_int[i]
-        pt2 = path_int[i+1]
-        dep.cv2.line(satellite_image, pt1, pt2, (255, 0, 0), 2)
-
-    output_satellite_filename = "mission_satellite.png"
-    satellite_output_path = os.path.join(OUTPUT_FOLDER, output_satellite_filename)
-    dep.cv2.imwrite(satellite_output_path, satellite_image)
+    route_image_url = store_image(rgb_out)
+
+    satellite_fields = {}
+    if output_mode == "tiles":
+        # אריחי הלווין: רק האריחים שהמסלול עובר בהם מצוירים מחדש, השאר מהפירמידה השמורה
+        mission_id = mission_id or "latest"
+        mission_folder(mission_id)
+        satellite_fields["satelliteTiles"] = render_mission_tiles(
+            path_int, satellite_path, OUTPUT_FOLDER, OUTPUTS_URL, mission_id
+        )
+    else:
+        # ציור המסלול גם על תמונת הלווין
+        satellite_image = dep.cv2.imread(satellite_path)
+        if satellite_image.shape[2] == 4:
+            satellite_image = dep.cv2.cvtColor(satellite_image, dep.cv2.COLOR_BGRA2BGR)
+
+        for i in range(len(path_int) - 1):
+            pt1 = path_int[i]
+            pt2 = path_int[i+1]
+            dep.cv2.line(satellite_image, pt1, pt2, (255, 0, 0), 2)
+
+        satellite_fields["satelliteImageUrl"] = store_image(satellite_image)
 
     # כתיבת קובץ הקואורדינטות
-    coord_filename = "auto_route_coordinates.txt"
-    coord_filepath = os.path.join(OUTPUT_FOLDER, coord_filename)
     coords_json = {"path": real_path}
-    with open(coord_filepath, "w", encoding="utf-8") as f:
-        f.write(json.dumps(coords_json, indent=2))
-    print("🛰️ Final URLs:")
-    print(" → routeImageUrl:", f"{SERVER_URL}/static/outputs/{output_graph_filename}")
-    print(" → satelliteImageUrl:", f"{SERVER_URL}/static/outputs/{output_satellite_filename}")
-    print(" → coordinatesFileUrl:", f"{SERVER_URL}/static/outputs/{coord_filename}")
+    coordinates_url = store_output(json.dumps(coords_json, indent=2).encode("utf-8"), ".txt")
+    if verbose:
+        print("🛰️ Final URLs:")
+        print(" → routeImageUrl:", route_image_url)
+        for key, value in satellite_fields.items():
+            print(f" → {key}:", value if isinstance(value, str) else value["manifestUrl"])
+        print(" → coordinatesFileUrl:", coordinates_url)
 
     # שליחה ל-Frontend עם כתובות מלאות
-    return jsonify({
+    response = {
         "message": "Mission created successfully (path processed)",
         "success": True,
-        "routeImageUrl": f"{SERVER_URL}/static/outputs/{output_graph_filename}",
-        "satelliteImageUrl": f"{SERVER_URL}/static/outputs/{output_satellite_filename}",
-        "coordinatesFileUrl": f"{SERVER_URL}/static/outputs/{coord_filename}"
-    }), 200
+        "routeImageUrl": route_image_url,
+        **satellite_fields,
+        "coordinatesFileUrl": coordinates_url
+    }
+    # שדות נוספים (למשל metrics) מתווספים לתשובה כמו שהם
+    if extra:
+        response.update(extra)
+    return response
+
+
+def generate_and_respond_path(path_int, original_image, satellite_path,
+                              takeoff_pixel, landing_pixel,
+                              X_top_left, Y_top_left, X_bottom_right, Y_bottom_right, extra=None,
+                              mission_id=None, output_mode="image"):
+    return jsonify(render_mission_outputs(
+        path_int, original_image, satellite_path,
+        X_top_left, Y_top_left, X_bottom_right, Y_bottom_right, extra=extra,
+        mission_id=mission_id, output_mode=output_mode
+    )), 200
 
 
 def handle_direct_route(takeoff_pixel, landing_pixel, building_mask, satellite_path,
-                        X_top_left, Y_top_left, X_bottom_right, Y_bottom_right, original_image):
+                        X_top_left, Y_top_left, X_bottom_right, Y_bottom_right, original_image,
+                        extra=None, mission_id=None, output_mode="image"):
     mask_image = (building_mask * 255).astype(dep.np.uint8)
     mask_image = dep.cv2.cvtColor(mask_image, dep.cv2.COLOR_GRAY2BGR)
     dep.cv2.line(mask_image, takeoff_pixel, landing_pixel, GREEN, 2)
@@ -85,7 +155,10 @@ def handle_direct_route(takeoff_pixel, landing_pixel, building_mask, satellite_p
         X_top_left=X_top_left,
         Y_top_left=Y_top_left,
         X_bottom_right=X_bottom_right,
-        Y_bottom_right=Y_bottom_right
+        Y_bottom_right=Y_bottom_right,
+        extra=extra,
+        mission_id=mission_id,
+        output_mode=output_mode
     )
 
 
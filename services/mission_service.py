@@ -1,20 +1,185 @@
-import os
-import json
-from flask import request
+import time
+import uuid
+from flask import request, jsonify
 from core import metrics
 from shared import dependencies as dep
-from core.image_loader import load_and_preprocess_image
-from core.skeletonizer import skeletonize_image, remove_deadends, merge_images
-from core.junction_detector import highlight_dense_skeleton_nodes, refine_yellow_nodes
-from core.graph_builder import connect_yellow_junctions, add_point_to_graph, line_intersects_building
-from core.pathfinder import dijkstra, optimize_path
-from services.mission_utils import error_response, save_uploaded_file, parse_coord, find_color_pixel
-from services.mission_io import generate_and_respond_path, handle_direct_route
+from core.graph_builder import add_point_to_graph, attach_points, line_intersects_building
+from core.graph_simplifier import expand_path, connect_to_simplified, DEFAULT_MERGE_RADIUS
+from core.roi import roi_boxes
+from core.pathfinder import dijkstra, astar, optimize_path
+from core.lazy_graph import LazyAdjacency
+from core.theta_star import theta_star
+from core.visibility_graph import visibility_path
+from core.tour import pairwise_routes, order_tour, tour_cost, stitch_tour
+from services.mission_utils import (error_response, save_uploaded_file, parse_coord, parse_coord_list,
+                                    find_color_pixels, group_marker_pixels, file_digest,
+                                    pixel_to_real, real_to_pixel, parse_flag)
+from services.mission_io import (generate_and_respond_path, handle_direct_route, artifacts_exist, OUTPUT_MODES,
+                                 OUTPUTS_URL, mission_folder)
+from services.result_cache import ResultCache, mission_cache_key
+from services.map_cache import get_map, is_preprocessed
+from services.admission import admission_controller, mission_cost, AdmissionRejected, rejected_response
+from services.content_store import upload_store
+from services.profiling import RequestProfile, profile_trigger, stage
 
 GREEN = (0, 255, 0)
 RED = (0, 0, 255)
-
-UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'static', 'uploads')
+BLUE = (255, 0, 0)  # נקודות ביניים (waypoints)
+
+# מנועי תכנון זמינים – נבחרים לכל בקשה דרך השדה planner
+PLANNERS = ("skeleton", "theta", "visibility")
+DEFAULT_PLANNER = "skeleton"
+DEFAULT_THETA_DOWNSAMPLE = 4
+# נקודות ביניים לכל היותר במשימה אחת (מהשדה ומהסמנים יחד)
+MAX_WAYPOINTS = 50
+# הגרף שכל מתכנן צריך מוכן מראש; Theta* צריך רק את המסכות
+PLANNER_GRAPHS = {"skeleton": "skeleton", "visibility": "visibility", "theta": None}
+
+# תוצאות של בקשות זהות (ניסיונות חוזרים, "תכנן מחדש") מוחזרות מהמטמון
+result_cache = ResultCache()
+
+
+def mission_metrics(path_raw, path_int, takeoff_pixel, landing_pixel, building_mask, image, metric_groups):
+    return {"metrics": metrics.compute_path_metrics(
+        path_int,
+        groups=metric_groups,
+        takeoff=takeoff_pixel,
+        landing=landing_pixel,
+        path_raw=path_raw,
+        building_mask=building_mask,
+        image_size=(image.shape[1], image.shape[0])
+    )}
+
+
+def plan_theta_route(takeoff_pixel, landing_pixel, building_mask, satellite_path,
+                     X_top_left, Y_top_left, X_bottom_right, Y_bottom_right,
+                     downsample=DEFAULT_THETA_DOWNSAMPLE, lazy=True,
+                     metric_groups=metrics.DEFAULT_METRIC_GROUPS, mission_id=None, output_mode="image"):
+    with stage("theta"):
+        path = theta_star(takeoff_pixel, landing_pixel, building_mask, downsample=downsample, lazy=lazy)
+    if path is None:
+        return error_response("No path found.", 404)
+    path_int = [(int(x), int(y)) for (x, y) in path]
+
+    mask_image = (building_mask * 255).astype(dep.np.uint8)
+    mask_image = dep.cv2.cvtColor(mask_image, dep.cv2.COLOR_GRAY2BGR)
+
+    return generate_and_respond_path(
+        path_int=path_int,
+        original_image=mask_image,
+        satellite_path=satellite_path,
+        takeoff_pixel=takeoff_pixel,
+        landing_pixel=landing_pixel,
+        X_top_left=X_top_left,
+        Y_top_left=Y_top_left,
+        X_bottom_right=X_bottom_right,
+        Y_bottom_right=Y_bottom_right,
+        extra=mission_metrics(path_int, path_int, takeoff_pixel, landing_pixel,
+                              building_mask, mask_image, metric_groups),
+        mission_id=mission_id,
+        output_mode=output_mode
+    )
+
+
+# Any-angle route on the visibility graph of the building corners; the path needs no optimize_path pass
+def plan_visibility_route(takeoff_pixel, landing_pixel, map_artifacts, satellite_path,
+                          X_top_left, Y_top_left, X_bottom_right, Y_bottom_right,
+                          metric_groups=metrics.DEFAULT_METRIC_GROUPS, mission_id=None, output_mode="image"):
+    building_mask = map_artifacts.building_mask
+    try:
+        visibility_graph = map_artifacts.graph("visibility")
+    except ValueError as ex:
+        return error_response(f"{ex} Use planner=skeleton or planner=theta.")
+    with stage("visibility"):
+        path = visibility_path(takeoff_pixel, landing_pixel, visibility_graph, building_mask)
+    if path is None:
+        return error_response("No path found.", 404)
+    path_int = [(int(x), int(y)) for (x, y) in path]
+
+    original_image = map_artifacts.original_image
+    extra = mission_metrics(path_int, path_int, takeoff_pixel, landing_pixel,
+                            building_mask, original_image, metric_groups)
+    extra["graph"] = {"nodes": len(visibility_graph[1]),
+                      "edges": sum(len(edges) for edges in visibility_graph[2].values()) // 2}
+
+    return generate_and_respond_path(
+        path_int=path_int,
+        original_image=original_image,
+        satellite_path=satellite_path,
+        takeoff_pixel=takeoff_pixel,
+        landing_pixel=landing_pixel,
+        X_top_left=X_top_left,
+        Y_top_left=Y_top_left,
+        X_bottom_right=X_bottom_right,
+        Y_bottom_right=Y_bottom_right,
+        extra=extra,
+        mission_id=mission_id,
+        output_mode=output_mode
+    )
+
+
+def plan_waypoint_route(takeoff_pixel, landing_pixel, waypoints, skeleton_graph, building_mask, satellite_path,
+                        X_top_left, Y_top_left, X_bottom_right, Y_bottom_right,
+                        metric_groups=metrics.DEFAULT_METRIC_GROUPS, mission_id=None, output_mode="image",
+                        graph_stats=None):
+    final_image, node_list, adjacency_dict = skeleton_graph
+
+    # רגל ישירה בין שתי נקודות משימה כשהקו פנוי – תמיד הקצרה ביותר
+    points = [takeoff_pixel] + waypoints + [landing_pixel]
+    failed = attach_points(points, adjacency_dict, building_mask, final_image, node_list,
+                           connect=connect_to_simplified if graph_stats else None)
+    if failed is not None:
+        return error_response(f"Could not connect point {failed} of the mission to the graph.")
+
+    with stage("tour"):
+        cost, paths = pairwise_routes(points, adjacency_dict)
+        order = order_tour(cost)
+    total = tour_cost(order, cost)
+    if total == float('inf'):
+        return error_response("No path found through all waypoints.", 404)
+
+    legs = list(zip(order, order[1:]))
+    paths = {leg: expand_path(paths[leg], adjacency_dict) for leg in legs}
+    if isinstance(adjacency_dict, LazyAdjacency):
+        adjacency_dict.draw_edges(final_image)
+    with stage("optimize"):
+        optimized = {leg: optimize_path(paths[leg], building_mask) for leg in legs}
+    path_raw = stitch_tour(order, paths)
+    path_int = [(int(x), int(y)) for (x, y) in stitch_tour(order, optimized)]
+
+    height, width = final_image.shape[:2]
+    corners = (X_top_left, Y_top_left, X_bottom_right, Y_bottom_right)
+    visited = []
+    for index in order[1:-1]:
+        real_x, real_y = pixel_to_real(*points[index], corners, width, height)
+        visited.append({"x": real_x, "y": real_y})
+
+    extra = mission_metrics(path_raw, path_int, takeoff_pixel, landing_pixel,
+                            building_mask, final_image, metric_groups)
+    extra["waypoints"] = {
+        "order": [index - 1 for index in order[1:-1]],
+        "visited": visited,
+        "tourLength": total,
+    }
+    if graph_stats:
+        extra["graph"] = graph_stats
+    if isinstance(adjacency_dict, LazyAdjacency):
+        extra["lazyGraph"] = adjacency_dict.stats()
+
+    return generate_and_respond_path(
+        path_int=path_int,
+        original_image=final_image,
+        satellite_path=satellite_path,
+        takeoff_pixel=takeoff_pixel,
+        landing_pixel=landing_pixel,
+        X_top_left=X_top_left,
+        Y_top_left=Y_top_left,
+        X_bottom_right=X_bottom_right,
+        Y_bottom_right=Y_bottom_right,
+        extra=extra,
+        mission_id=mission_id,
+        output_mode=output_mode
+    )
 
 
 def create_mission(request):
@@ -22,107 +187,331 @@ def create_mission(request):
         if "buildings_image" not in request.files or "satellite_image" not in request.files:
             return error_response("Missing files: buildings_image and/or satellite_image.")
 
-        buildings_path = save_uploaded_file(request.files["buildings_image"], UPLOAD_FOLDER)
-        satellite_path = save_uploaded_file(request.files["satellite_image"], UPLOAD_FOLDER)
-
-        top_left_coord_str = request.form.get("top_left_coord")
-        bottom_right_coord_str = request.form.get("bottom_right_coord")
-        if not (top_left_coord_str and bottom_right_coord_str):
-            return error_response("Missing top_left_coord or bottom_right_coord")
-
-        X_top_left, Y_top_left = parse_coord(top_left_coord_str)
-        X_bottom_right, Y_bottom_right = parse_coord(bottom_right_coord_str)
-
-        original_image, binary_image = load_and_preprocess_image(buildings_path)
-        if len(original_image.shape) == 3 and original_image.shape[2] == 4:
-            original_image = dep.cv2.cvtColor(original_image, dep.cv2.COLOR_BGRA2BGR)
-
-        takeoff_pixel = find_color_pixel(original_image, GREEN)
-        landing_pixel = find_color_pixel(original_image, RED)
-        if takeoff_pixel is None or landing_pixel is None:
-            return error_response("Could not find takeoff and/or landing pixels.")
-
-        building_mask = (binary_image == 1).astype(dep.np.uint8)
-
-        # אם אפשר – קו ישיר
-        if not line_intersects_building(takeoff_pixel[0], takeoff_pixel[1], landing_pixel[0], landing_pixel[1], building_mask):
-            return handle_direct_route(
-                takeoff_pixel, landing_pixel, building_mask,
-                satellite_path, X_top_left, Y_top_left, X_bottom_right, Y_bottom_right,
-                original_image
-            )
-
-        # שלב גרף
-        skeleton_image = skeletonize_image(binary_image)
-        refined_skeleton = remove_deadends(skeleton_image)
-        merged_image = merge_images(binary_image, refined_skeleton)
-
-        junctions_highlighted = highlight_dense_skeleton_nodes(merged_image)
-        refined_junctions = refine_yellow_nodes(junctions_highlighted)
-
-        yellow_mask = ((refined_junctions[:, :, 0] == 255) &
-                       (refined_junctions[:, :, 1] == 255) &
-                       (refined_junctions[:, :, 2] == 0))
-        skeleton_mask = ((merged_image[:, :, 0] == 0) &
-                         (merged_image[:, :, 1] == 0) &
-                         (merged_image[:, :, 2] == 255))
-
-        final_image, node_list, adjacency_dict = connect_yellow_junctions(
-            merged_image, yellow_mask, skeleton_mask
+        buildings_file = request.files["buildings_image"]
+        satellite_file = request.files["satellite_image"]
+
+        buildings_digest = file_digest(buildings_file)
+        satellite_digest = file_digest(satellite_file)
+        cache_key = mission_cache_key(buildings_digest, satellite_digest, request.form)
+        mission_id = cache_key[:16]
+
+        # בקשה שביקשה פרופיל (כותרת) מריצה את כל הצינור גם כשהתוצאה כבר במטמון; דגימה רק למה שלא במטמון
+        trigger = profile_trigger(request)
+        if trigger != "header":
+            cached = result_cache.get(cache_key, validate=artifacts_exist)
+            if cached is not None:
+                return jsonify({**cached, "cached": True}), 200
+
+        # מספר נקודות הביניים מהשדה ידוע לפני הבקרה; חריגה נדחית לפני שהבקשה תופסת קיבולת
+        waypoint_count = len([part for part in request.form.get("waypoints", "").split(";") if part.strip()])
+        if waypoint_count > MAX_WAYPOINTS:
+            return error_response(f"Too many waypoints: at most {MAX_WAYPOINTS} are supported.")
+
+        # פרופיל אחד בתהליך: המקום נתפס לפני בקרת הכניסה, כדי שבקשה לא תחזיק קיבולת בזמן שהיא מחכה לו.
+        # בקשה מהכותרת כשפרופיל אחר רץ נדחית עם 409; בקשה שנדגמה פשוט לא מפורפלת
+        profile = RequestProfile(trigger) if trigger is not None else None
+        if profile is not None and not profile.acquire():
+            if trigger == "header":
+                return error_response("Another request is being profiled, retry later.", 409)
+            profile = None
+
+        # בקרת כניסה: רק מה שלא נענה מהמטמון מחכה לקיבולת, ומעבר לתור המוגבל נדחה מיד עם 503
+        try:
+            cost = admission_cost(request, buildings_file, satellite_file, buildings_digest, waypoint_count)
+            with admission_controller.admit(cost):
+                if profile is not None:
+                    profile.start()
+                try:
+                    response, status = plan_mission(request, buildings_file, satellite_file, buildings_digest,
+                                                    satellite_digest, mission_id=mission_id)
+                finally:
+                    if profile is not None:
+                        profile.stop()
+        except AdmissionRejected as rejection:
+            return rejected_response(rejection)
+        finally:
+            if profile is not None:
+                profile.release()
+
+        # ריצה מפורפלת איטית מהרגיל ולא נשמרת במטמון
+        if status == 200 and profile is None:
+            result_cache.put(cache_key, response.get_json())
+        if profile is not None:
+            summary = save_profile(profile, mission_id)
+            # רק מי שביקש פרופיל בכותרת מקבל אותו בתשובה; פרופיל שנדגם נשאר בשרת
+            if trigger == "header":
+                response = jsonify({**response.get_json(), "profile": summary})
+            else:
+                print(f"📊 Sampled profile of mission {mission_id}: {summary['profileUrl']}")
+        return response, status
+
+    except Exception as e:
+        return error_response(f"Error: {str(e)}", 500)
+
+
+# Estimated admission cost of a mission from its form fields; invalid values are rejected later by plan_mission,
+# here they fall back to the defaults
+def admission_cost(request, buildings_file, satellite_file, buildings_digest, waypoint_count):
+    planner = request.form.get("planner", DEFAULT_PLANNER).strip().lower()
+    if planner not in PLANNERS or waypoint_count:
+        planner = DEFAULT_PLANNER
+    try:
+        downsample = max(1, int(request.form.get("theta_downsample", DEFAULT_THETA_DOWNSAMPLE)))
+    except ValueError:
+        downsample = DEFAULT_THETA_DOWNSAMPLE
+    return mission_cost(buildings_file, satellite_file,
+                        map_cached=is_preprocessed(buildings_digest, PLANNER_GRAPHS[planner]),
+                        planner=planner, theta_downsample=downsample, waypoints=waypoint_count)
+
+
+# The map's cached skeleton graph (simplified when merge_radius is given) as
+# (final_image, node_list, adjacency_dict, simplification stats or None, box=None).
+# With lazy, a map without a built graph gets a LazyAdjacency whose edges are traced during the search.
+def full_skeleton_graph(map_artifacts, merge_radius=None, lazy=False):
+    if lazy and not map_artifacts.has_graph("skeleton"):
+        tracer = map_artifacts.graph("skeleton-lazy")
+        adjacency_dict = LazyAdjacency(tracer, total_edges=map_artifacts.skeleton_edge_count())
+        return tracer.image.copy(), list(tracer.node_list), adjacency_dict, None, None
+    final_image, node_list, adjacency_dict = map_artifacts.skeleton_graph(merge_radius)
+    graph_stats = map_artifacts.simplified_skeleton(merge_radius)[3] if merge_radius is not None else None
+    return final_image, node_list, adjacency_dict, graph_stats, None
+
+
+# Skeleton graphs built only inside growing boxes around the points, in the same form as full_skeleton_graph;
+# once the box would cover the whole image the map's cached graph is used instead
+def roi_skeleton_graphs(map_artifacts, points, merge_radius=None, lazy=False):
+    height, width = map_artifacts.binary_image.shape[:2]
+    for box in roi_boxes(points, map_artifacts.binary_image.shape):
+        if box == (0, 0, width, height):
+            break
+        yield (*map_artifacts.roi_skeleton_graph(box, merge_radius), box)
+    yield full_skeleton_graph(map_artifacts, merge_radius, lazy)
+
+
+# Saves the request profile next to the mission outputs and returns its summary and download URLs
+def save_profile(profile, mission_id):
+    # סיומת אקראית: שני פרופילים באותה שנייה לא דורסים זה את זה, וכתובת של פרופיל שנדגם לא ניתנת לניחוש
+    basename = f"profile_{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+    profile.save(mission_folder(mission_id), basename)
+    return {
+        "trigger": profile.trigger,
+        "seconds": profile.seconds,
+        "stages": [{key: s[key] for key in ("name", "seconds", "peakBytes") if key in s} for s in profile.stages],
+        "profileUrl": f"{OUTPUTS_URL}{mission_id}/{basename}.prof",
+        "memoryUrl": f"{OUTPUTS_URL}{mission_id}/{basename}_memory.json",
+    }
+
+
+def plan_mission(request, buildings_file, satellite_file, buildings_digest, satellite_digest=None, mission_id=None):
+    buildings_path = save_uploaded_file(buildings_file, upload_store, buildings_digest)
+    satellite_path = save_uploaded_file(satellite_file, upload_store, satellite_digest)
+
+    top_left_coord_str = request.form.get("top_left_coord")
+    bottom_right_coord_str = request.form.get("bottom_right_coord")
+    if not (top_left_coord_str and bottom_right_coord_str):
+        return error_response("Missing top_left_coord or bottom_right_coord")
+
+    X_top_left, Y_top_left = parse_coord(top_left_coord_str)
+    X_bottom_right, Y_bottom_right = parse_coord(bottom_right_coord_str)
+
+    planner = request.form.get("planner", DEFAULT_PLANNER).strip().lower()
+    if planner not in PLANNERS:
+        return error_response(f"Unknown planner: {planner}. Expected one of: {', '.join(PLANNERS)}")
+
+    try:
+        metric_groups = metrics.parse_metric_groups(request.form.get("metrics"))
+    except ValueError as ex:
+        return error_response(str(ex))
+
+    output_mode = request.form.get("output_mode", "image").strip().lower()
+    if output_mode not in OUTPUT_MODES:
+        return error_response(f"Unknown output_mode: {output_mode}. Expected one of: {', '.join(OUTPUT_MODES)}")
+
+    # עיבוד המפה (מסכות וגרף) נשמר לפי תוכן הקובץ ומשותף לכל הבקשות על אותה מפה
+    map_artifacts = get_map(buildings_path, buildings_digest)
+    original_image = map_artifacts.original_image
+
+    # סמנים כחולים הם נקודות ביניים רק כשהבקשה מבקשת זאת (waypoint_markers=1), כי פיקסלים כחולים
+    # טהורים יכולים להופיע במפה גם בלי כוונה
+    waypoint_markers = parse_flag(request.form.get("waypoint_markers", "0"))
+    markers = find_color_pixels(original_image, [GREEN, RED, BLUE] if waypoint_markers else [GREEN, RED])
+    takeoff_pixel = markers[GREEN][0] if markers[GREEN] else None
+    landing_pixel = markers[RED][0] if markers[RED] else None
+    if takeoff_pixel is None or landing_pixel is None:
+        return error_response("Could not find takeoff and/or landing pixels.")
+
+    # נקודות ביניים: סמנים כחולים בתמונה ו/או רשימת קואורדינטות בשדה waypoints
+    waypoints = group_marker_pixels(markers[BLUE]) if waypoint_markers else []
+    waypoints_str = request.form.get("waypoints")
+    if waypoints_str:
+        height, width = original_image.shape[:2]
+        corners = (X_top_left, Y_top_left, X_bottom_right, Y_bottom_right)
+        for (real_x, real_y) in parse_coord_list(waypoints_str):
+            pixel = real_to_pixel(real_x, real_y, corners, width, height)
+            if not (0 <= pixel[0] < width and 0 <= pixel[1] < height):
+                return error_response(f"Waypoint ({real_x}, {real_y}) is outside the map.")
+            waypoints.append(pixel)
+    if len(waypoints) > MAX_WAYPOINTS:
+        return error_response(f"Too many waypoints: at most {MAX_WAYPOINTS} are supported.")
+
+    building_mask = map_artifacts.building_mask
+
+    # פישוט גרף (simplify=1): איחוד צמתים קרובים וכיווץ שרשראות של צמתי מעבר
+    merge_radius = None
+    if parse_flag(request.form.get("simplify", "0")):
+        try:
+            merge_radius = float(request.form.get("merge_radius", DEFAULT_MERGE_RADIUS))
+        except ValueError:
+            return error_response("merge_radius must be a non-negative number.")
+        if not 0 <= merge_radius < float("inf"):
+            return error_response("merge_radius must be a non-negative number.")
+    use_roi = parse_flag(request.form.get("roi", "0"))
+    # lazy=1: צמתי השלד ידועים מראש, והקשתות של צומת נבנות רק כשהחיפוש מגיע אליו
+    lazy = parse_flag(request.form.get("lazy", "0"))
+    if lazy and merge_radius is not None:
+        return error_response("lazy=1 cannot be combined with simplify=1.")
+
+    if waypoints:
+        if planner != "skeleton":
+            return error_response("Waypoint missions are planned on the skeleton graph; use planner=skeleton.")
+        final_image, node_list, adjacency_dict, graph_stats, _ = full_skeleton_graph(map_artifacts, merge_radius, lazy)
+        return plan_waypoint_route(
+            takeoff_pixel, landing_pixel, waypoints, (final_image, node_list, adjacency_dict), building_mask,
+            satellite_path, X_top_left, Y_top_left, X_bottom_right, Y_bottom_right,
+            metric_groups=metric_groups,
+            mission_id=mission_id,
+            output_mode=output_mode,
+            graph_stats=graph_stats
+        )
+
+    direct_path = [takeoff_pixel, landing_pixel]
+
+    # אם אפשר – קו ישיר
+    if not line_intersects_building(takeoff_pixel[0], takeoff_pixel[1], landing_pixel[0], landing_pixel[1], building_mask):
+        return handle_direct_route(
+            takeoff_pixel, landing_pixel, building_mask,
+            satellite_path, X_top_left, Y_top_left, X_bottom_right, Y_bottom_right,
+            original_image,
+            extra=mission_metrics(direct_path, direct_path, takeoff_pixel, landing_pixel,
+                                  building_mask, original_image, metric_groups),
+            mission_id=mission_id,
+            output_mode=output_mode
+        )
+
+    if planner == "theta":
+        try:
+            downsample = int(request.form.get("theta_downsample", DEFAULT_THETA_DOWNSAMPLE))
+        except ValueError:
+            return error_response("theta_downsample must be a positive integer.")
+        if downsample < 1:
+            return error_response("theta_downsample must be a positive integer.")
+        return plan_theta_route(
+            takeoff_pixel, landing_pixel, building_mask,
+            satellite_path, X_top_left, Y_top_left, X_bottom_right, Y_bottom_right,
+            downsample=downsample,
+            metric_groups=metric_groups,
+            mission_id=mission_id,
+            output_mode=output_mode
         )
 
-        start_node = takeoff_pixel
-        end_node = landing_pixel
+    if planner == "visibility":
+        return plan_visibility_route(
+            takeoff_pixel, landing_pixel, map_artifacts,
+            satellite_path, X_top_left, Y_top_left, X_bottom_right, Y_bottom_right,
+            metric_groups=metric_groups,
+            mission_id=mission_id,
+            output_mode=output_mode
+        )
 
-        res_start = add_point_to_graph(start_node, adjacency_dict, building_mask, final_image, ignore_building=True)
+    # שלב גרף – במצב roi=1 הגרף נבנה קודם רק סביב הסמנים, ואזור שאין בו מסלול מוגדל עד המפה כולה
+    if use_roi and not map_artifacts.has_graph("skeleton"):
+        graphs = roi_skeleton_graphs(map_artifacts, [takeoff_pixel, landing_pixel], merge_radius, lazy)
+    else:
+        graphs = [full_skeleton_graph(map_artifacts, merge_radius, lazy)]
+
+    start_node = takeoff_pixel
+    end_node = landing_pixel
+    attempts = 0
+    for final_image, node_list, adjacency_dict, graph_stats, box in graphs:
+        attempts += 1
+        regional = box is not None
+
+        # בגרף המפושט מתחברים לנקודה הקרובה על הקשתות המכווצות, ומעדיפים חיבור שלא חוצה בניין
+        if merge_radius is None:
+            res_start = add_point_to_graph(start_node, adjacency_dict, building_mask, final_image, ignore_building=True)
+        else:
+            res_start = connect_to_simplified(start_node, adjacency_dict, building_mask, final_image, candidates=node_list)
         if not res_start:
+            if regional:
+                continue
             return error_response("Could not connect takeoff node to the graph.")
 
-        res_end = add_point_to_graph(end_node, adjacency_dict, building_mask, final_image, ignore_building=True)
+        if merge_radius is None:
+            res_end = add_point_to_graph(end_node, adjacency_dict, building_mask, final_image, ignore_building=True)
+        else:
+            res_end = connect_to_simplified(end_node, adjacency_dict, building_mask, final_image, candidates=node_list)
         if not res_end:
+            if regional:
+                continue
             return error_response("Could not connect landing node to the graph.")
 
         if len(node_list) < 3:
+            if regional:
+                continue
             if not line_intersects_building(takeoff_pixel[0], takeoff_pixel[1], landing_pixel[0], landing_pixel[1], building_mask):
                 return handle_direct_route(
                     takeoff_pixel, landing_pixel, building_mask,
                     satellite_path, X_top_left, Y_top_left, X_bottom_right, Y_bottom_right,
-                    final_image
+                    final_image,
+                    extra=mission_metrics(direct_path, direct_path, takeoff_pixel, landing_pixel,
+                                          building_mask, final_image, metric_groups),
+                    mission_id=mission_id,
+                    output_mode=output_mode
                 )
             else:
                 return error_response("No path found (only 2 points, and direct line blocked).", 404)
 
-        path = dijkstra(start_node, end_node, adjacency_dict)
-        if path is None:
+        # בגרף העצל A* מרחיב פחות צמתים, ולכן גם בונה פחות קשתות
+        search = astar if isinstance(adjacency_dict, LazyAdjacency) else dijkstra
+        with stage("dijkstra"):
+            path = search(start_node, end_node, adjacency_dict)
+        if path is not None:
+            break
+        if not regional:
             return error_response("No path found.", 404)
 
-        path_raw = path.copy()
+    # קשתות מכווצות שומרות את הקו המקורי; מחזירים את המסלול לצמתים המקוריים
+    path = expand_path(path, adjacency_dict)
+    path_raw = path.copy()
+    with stage("optimize"):
         path = optimize_path(path, building_mask)
-        path_int = [(int(x), int(y)) for (x, y) in path]
-
-        metrics.print_all_metrics(
-            path_raw=path_raw,
-            path_opt=path_int,
-            takeoff=takeoff_pixel,
-            landing=landing_pixel,
-            building_mask=building_mask,
-            image_size=(final_image.shape[1], final_image.shape[0])
-        )
-
-        return generate_and_respond_path(
-            path_int=path_int,
-            original_image=final_image,
-            satellite_path=satellite_path,
-            takeoff_pixel=takeoff_pixel,
-            landing_pixel=landing_pixel,
-            X_top_left=X_top_left,
-            Y_top_left=Y_top_left,
-            X_bottom_right=X_bottom_right,
-            Y_bottom_right=Y_bottom_right
-        )
-
-    except Exception as e:
-        return error_response(f"Error: {str(e)}", 500)
+    path_int = [(int(x), int(y)) for (x, y) in path]
+
+    lazy_stats = None
+    if isinstance(adjacency_dict, LazyAdjacency):
+        adjacency_dict.draw_edges(final_image)
+        lazy_stats = adjacency_dict.stats()
+
+    return generate_and_respond_path(
+        path_int=path_int,
+        original_image=final_image,
+        satellite_path=satellite_path,
+        takeoff_pixel=takeoff_pixel,
+        landing_pixel=landing_pixel,
+        X_top_left=X_top_left,
+        Y_top_left=Y_top_left,
+        X_bottom_right=X_bottom_right,
+        Y_bottom_right=Y_bottom_right,
+        extra={
+            **mission_metrics(path_raw, path_int, takeoff_pixel, landing_pixel,
+                              building_mask, final_image, metric_groups),
+            **({"graph": graph_stats} if graph_stats else {}),
+            **({"roi": {"box": list(box) if box else None, "attempts": attempts}} if use_roi else {}),
+            **({"lazyGraph": lazy_stats} if lazy_stats else {})
+        },
+        mission_id=mission_id,
+        output_mode=output_mode
+    )
 
 
 # import os
@@ -1,15 +1,24 @@
-import os
+import hashlib
 from flask import jsonify
+from services.content_store import normalize_extension
 
 def error_response(message: str, code: int = 400):
     return jsonify({"message": message, "success": False}), code
 
-def save_uploaded_file(file_storage, upload_folder: str) -> str:
-    filename = file_storage.filename
-    path = os.path.join(upload_folder, filename)
-    file_storage.save(path)
+def save_uploaded_file(file_storage, store, digest: str = None) -> str:
+    # הקובץ נשמר לפי תוכנו, פעם אחת; כשה-digest ידוע ושמור – לא נכתב כלום
+    _, path = store.put_stream(file_storage.stream, normalize_extension(file_storage.filename), digest=digest)
+    file_storage.stream.seek(0)
     return path
 
+def file_digest(file_storage) -> str:
+    digest = hashlib.sha256()
+    stream = file_storage.stream
+    for chunk in iter(lambda: stream.read(1 << 20), b""):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
 def parse_coord(coord_str):
     try:
         coord_str = coord_str.strip()
@@ -20,6 +29,25 @@ def parse_coord(coord_str):
     except Exception as ex:
         raise ValueError(f"Invalid coordinate format: {coord_str}")
 
+def parse_coord_list(coords_str):
+    # "(x1, y1); (x2, y2); ..." – רשימת קואורדינטות מופרדת בנקודה-פסיק
+    return [parse_coord(part) for part in coords_str.split(";") if part.strip()]
+
+def pixel_to_real(pixel_x, pixel_y, corners, width, height):
+    X_top_left, Y_top_left, X_bottom_right, Y_bottom_right = corners
+    real_x = X_top_left + pixel_x * ((X_bottom_right - X_top_left) / width)
+    real_y = Y_top_left + pixel_y * ((Y_bottom_right - Y_top_left) / height)
+    return real_x, real_y
+
+def real_to_pixel(real_x, real_y, corners, width, height):
+    X_top_left, Y_top_left, X_bottom_right, Y_bottom_right = corners
+    pixel_x = (real_x - X_top_left) * width / (X_bottom_right - X_top_left)
+    pixel_y = (real_y - Y_top_left) * height / (Y_bottom_right - Y_top_left)
+    return (int(round(pixel_x)), int(round(pixel_y)))
+
+def parse_flag(value) -> bool:
+    return str(value).strip().lower() in ("1", "true", "yes", "on")
+
 def find_color_pixel(image, target_color):
     import numpy as np
     if len(image.shape) == 3 and image.shape[2] == 4:
@@ -30,3 +58,44 @@ def find_color_pixel(image, target_color):
         return None
     y, x = coords[0]
     return (int(x), int(y))
+
+def find_color_pixels(image, target_colors):
+    # מעבר אחד על התמונה: כל פיקסל נארז למספר אחד ומושווה מול כל הצבעים יחד
+    import numpy as np
+    if len(image.shape) == 3 and image.shape[2] == 4:
+        image = image[:, :, :3]
+    packed = ((image[:, :, 0].astype(np.uint32) << 16) |
+              (image[:, :, 1].astype(np.uint32) << 8) |
+              image[:, :, 2].astype(np.uint32))
+    keys = {(int(c[0]) << 16) | (int(c[1]) << 8) | int(c[2]): tuple(c) for c in target_colors}
+    coords = np.argwhere(np.isin(packed, np.array(list(keys), dtype=np.uint32)))
+    found = {color: [] for color in keys.values()}
+    if coords.shape[0] == 0:
+        return found
+    values = packed[coords[:, 0], coords[:, 1]]
+    for key, color in keys.items():
+        found[color] = [(int(x), int(y)) for (y, x) in coords[values == key]]
+    return found
+
+def group_marker_pixels(pixels):
+    # פיקסלים סמוכים (8 שכנים) הם אותו סמן; כל סמן מיוצג ע"י המרכז שלו
+    remaining = set(pixels)
+    markers = []
+    for pixel in pixels:
+        if pixel not in remaining:
+            continue
+        remaining.discard(pixel)
+        stack, group = [pixel], []
+        while stack:
+            x, y = stack.pop()
+            group.append((x, y))
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    n = (x + dx, y + dy)
+                    if n in remaining:
+                        remaining.discard(n)
+                        stack.append(n)
+        cx = sum(p[0] for p in group) / len(group)
+        cy = sum(p[1] for p in group) / len(group)
+        markers.append(min(group, key=lambda p: (p[0] - cx) ** 2 + (p[1] - cy) ** 2))
+    return markers
@@ -0,0 +1,167 @@
+import os
+import hmac
+import json
+import time
+import random
+import pstats
+import cProfile
+import threading
+import tracemalloc
+import contextvars
+from contextlib import contextmanager
+
+# פרופיילינג לבקשה בודדת: כותרת עם הטוקן המוגדר, או דגימה של חלק מהבקשות
+PROFILE_HEADER = "X-SkyOps-Profile"
+PROFILE_TOKEN = os.environ.get("SKYOPS_PROFILE_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.environ.get("SKYOPS_PROFILE_SAMPLE_RATE", "0"))
+# tracemalloc מאט בערך פי 2 את השלבים שמקצים הרבה אובייקטים; SKYOPS_PROFILE_MEMORY=0 מכבה אותו
+PROFILE_MEMORY = os.environ.get("SKYOPS_PROFILE_MEMORY", "1") != "0"
+
+TOP_ALLOCATIONS = 10
+TOP_FUNCTIONS = 25
+
+_current = contextvars.ContextVar("skyops_profile", default=None)
+# tracemalloc (המונים והשיא) והפרופיילר של cProfile גלובליים לתהליך – פרופיל אחד בכל פעם
+_profile_lock = threading.Lock()
+
+
+# Returns "header" when the request carries the profiling token, "sample" when it was sampled, otherwise None
+def profile_trigger(request):
+    header = request.headers.get(PROFILE_HEADER)
+    if header and PROFILE_TOKEN and hmac.compare_digest(header, PROFILE_TOKEN):
+        return "header"
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return "sample"
+    return None
+
+
+def _allocation_diff(before, after):
+    ignored = (tracemalloc.__file__, __file__)
+    diff = (stat for stat in after.compare_to(before, "lineno") if stat.traceback[0].filename not in ignored)
+    return [{
+        "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+        "sizeDiffBytes": stat.size_diff,
+        "countDiff": stat.count_diff,
+    } for stat, _ in zip(diff, range(TOP_ALLOCATIONS))]
+
+
+class RequestProfile:
+    """
+    cProfile of one request plus a tracemalloc record of each named stage
+    (time, allocated bytes, peak and the lines that allocated the most).
+    Only one request per process is profiled at a time: acquire() takes the process's profile slot
+    without waiting, start() and stop() profile the request and release() frees the slot.
+    The memory figures are process-wide, so requests running unprofiled at the same time are
+    counted in them as well.
+    """
+
+    def __init__(self, trigger, memory=PROFILE_MEMORY):
+        self.trigger = trigger
+        self.memory = memory
+        self.profiler = cProfile.Profile()
+        self.stages = []
+        self.seconds = None
+        self._snapshots = []
+        self._open = []
+        self._started = None
+        self._token = None
+        self._acquired = False
+
+    # Returns False when another request of this process holds the profile slot
+    def acquire(self):
+        self._acquired = _profile_lock.acquire(blocking=False)
+        return self._acquired
+
+    def release(self):
+        if self._acquired:
+            self._acquired = False
+            _profile_lock.release()
+
+    def start(self):
+        if not self._acquired:
+            raise RuntimeError("acquire() the profile slot before start()")
+        if self.memory:
+            tracemalloc.start()
+        self._token = _current.set(self)
+        self._started = time.perf_counter()
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+        self.seconds = time.perf_counter() - self._started
+        _current.reset(self._token)
+        if self.memory:
+            tracemalloc.stop()
+        self.release()
+
+    @contextmanager
+    def stage(self, name):
+        # המדידות והסנאפשוטים נלקחים מחוץ לפרופיילר כדי שלא יופיעו בו
+        self.profiler.disable()
+        record = {"name": name, "depth": len(self._open)}
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._open:
+                self._open[-1]["peak"] = max(self._open[-1]["peak"], peak)
+            tracemalloc.reset_peak()
+            record.update(start=current, peak=current, snapshot=tracemalloc.take_snapshot())
+        self._open.append(record)
+        started = time.perf_counter()
+        self.profiler.enable()
+        try:
+            yield
+        finally:
+            self.profiler.disable()
+            seconds = time.perf_counter() - started
+            record = self._open.pop()
+            stage_record = {"name": name, "depth": record["depth"], "seconds": seconds}
+            if self.memory:
+                current, peak = tracemalloc.get_traced_memory()
+                record["peak"] = max(record["peak"], peak)
+                if self._open:
+                    self._open[-1]["peak"] = max(self._open[-1]["peak"], record["peak"])
+                stage_record.update(allocatedBytes=current - record["start"],
+                                    peakBytes=record["peak"] - record["start"])
+                # ההשוואה בין הסנאפשוטים יקרה, לכן היא נדחית ל-save
+                self._snapshots.append((stage_record, record["snapshot"], tracemalloc.take_snapshot()))
+            self.stages.append(stage_record)
+            self.profiler.enable()
+
+    # Writes <basename>.prof (open with pstats/snakeviz) and <basename>_memory.json; returns both paths
+    def save(self, folder, basename="profile"):
+        os.makedirs(folder, exist_ok=True)
+        for stage_record, before, after in self._snapshots:
+            stage_record["topAllocations"] = _allocation_diff(before, after)
+        self._snapshots = []
+
+        prof_path = os.path.join(folder, f"{basename}.prof")
+        self.profiler.dump_stats(prof_path)
+
+        stats = pstats.Stats(self.profiler)
+        functions = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP_FUNCTIONS]
+        memory_path = os.path.join(folder, f"{basename}_memory.json")
+        with open(memory_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "trigger": self.trigger,
+                "seconds": self.seconds,
+                "memoryTraced": self.memory,
+                "stages": self.stages,
+                "topFunctions": [{
+                    "function": f"{filename}:{lineno}({name})",
+                    "calls": calls,
+                    "totalSeconds": total,
+                    "cumulativeSeconds": cumulative,
+                } for (filename, lineno, name), (_, calls, total, cumulative, _) in functions],
+            }, f, indent=2)
+        return prof_path, memory_path
+
+
+# Marks a stage of the current request's profile; does nothing when the request is not profiled
+@contextmanager
+def stage(name):
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    with profile.stage(name):
+        yield
@@ -0,0 +1,115 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+# גודל ו-TTL ברירת מחדל, ניתנים לשינוי דרך משתני סביבה
+DEFAULT_MAX_ENTRIES = int(os.environ.get("SKYOPS_RESULT_CACHE_SIZE", "128"))
+DEFAULT_TTL_SECONDS = float(os.environ.get("SKYOPS_RESULT_CACHE_TTL", "3600"))
+
+
+class ResultCache:
+    """
+    Bounded LRU cache with per-entry TTL. Thread safe; one instance per worker process.
+    on_evict(key, value) is called, outside the lock, for every entry that leaves the cache.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS, clock=time.monotonic,
+                 on_evict=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._on_evict = on_evict
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, validate=None):
+        evicted = []
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at < self._clock() or (validate is not None and not validate(value)):
+                    del self._entries[key]
+                    self.evictions += 1
+                    evicted.append((key, value))
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+            self.misses += 1
+        self._notify(evicted)
+        return None
+
+    # Returns the live value without counting a hit or refreshing its position
+    def peek(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry[1] if entry is not None and entry[0] >= self._clock() else None
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            self._notify([(key, value)])
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            evicted = [(key, previous[1])] if previous is not None and previous[1] is not value else []
+            self._entries[key] = (self._clock() + self.ttl_seconds, value)
+            evicted += self._evict_expired()
+            while len(self._entries) > self.max_entries:
+                evicted_key, (_, evicted_value) = self._entries.popitem(last=False)
+                self.evictions += 1
+                evicted.append((evicted_key, evicted_value))
+        self._notify(evicted)
+
+    def invalidate(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        self._notify([(key, entry[1])] if entry is not None else [])
+
+    def clear(self):
+        with self._lock:
+            evicted = [(key, value) for key, (_, value) in self._entries.items()]
+            self._entries.clear()
+        self._notify(evicted)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "maxEntries": self.max_entries,
+                "ttlSeconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _evict_expired(self):
+        now = self._clock()
+        expired = [key for key, (expires_at, _) in self._entries.items() if expires_at < now]
+        evicted = []
+        for key in expired:
+            evicted.append((key, self._entries.pop(key)[1]))
+            self.evictions += 1
+        return evicted
+
+    def _notify(self, evicted):
+        if self._on_evict is not None:
+            for key, value in evicted:
+                self._on_evict(key, value)
+
+
+# Builds the cache key of a mission: hash of the map bytes, satellite bytes and every form field
+# (corner coordinates, planner options, ...). Takeoff and landing markers are part of the map bytes.
+def mission_cache_key(buildings_digest, satellite_digest, form_fields):
+    payload = json.dumps({
+        "buildings": buildings_digest,
+        "satellite": satellite_digest,
+        "form": sorted((k, v) for k, v in form_fields.items()),
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
@@ -0,0 +1,248 @@
+import os
+import sys
+import json
+import fcntl
+import tempfile
+import threading
+from contextlib import contextmanager
+from multiprocessing import shared_memory, resource_tracker
+from shared import dependencies as dep
+
+# SKYOPS_SHARED_MAPS=1: מפה שעובדה מתפרסמת פעם אחת לזיכרון משותף וכל ה-workers מתחברים אליה לקריאה בלבד
+SHARED_MAPS_ENABLED = os.environ.get("SKYOPS_SHARED_MAPS") == "1"
+REGISTRY_DIR = os.environ.get("SKYOPS_SHARED_MAPS_DIR", os.path.join(tempfile.gettempdir(), "skyops-shared-maps"))
+
+
+# מיפויים שלא נסגרו כי עדיין קיים אליהם view (למשל תמונה שבקשה עדיין מחזיקה); נסגרים בשחרור או בטעינה הבאים
+_unclosed = []
+_unclosed_lock = threading.Lock()
+
+
+# Retries closing the pending mappings; those of map `skip` are left alone, since they belong to the
+# artifacts being finalized right now, whose arrays are only freed afterwards
+def _close_unclosed(skip=None):
+    with _unclosed_lock:
+        pending = [entry for entry in _unclosed if entry[1] != skip]
+        _unclosed[:] = [entry for entry in _unclosed if entry[1] == skip]
+    for shm, digest, attempts in pending:
+        _close(shm, digest, attempts)
+
+
+def _close(shm, digest, attempts=0):
+    try:
+        shm.close()
+    except BufferError:
+        # בניסיון הראשון זה צפוי (ה-finalizer רץ לפני שהמערכים של המפה משתחררים); מעבר לזה זו דליפה של view
+        if attempts == 1:
+            print(f"⚠️ Shared map segment {shm.name} is still in use; retrying to close it later")
+        with _unclosed_lock:
+            _unclosed.append((shm, digest, attempts + 1))
+
+
+def _segment_name(digest, group, key):
+    return f"skyops_{digest[:16]}_{group}_{key}"
+
+
+# עד Python 3.13 כל פתיחה נרשמת ב-resource_tracker, שמוחק את הסגמנט כשהתהליך יוצא –
+# את מחזור החיים מנהל כאן מונה ההפניות, לכן הרישום מבוטל
+_UNTRACKED_OPEN = sys.version_info >= (3, 13)
+
+
+def _open_segment(name, create=False, size=0):
+    if _UNTRACKED_OPEN:
+        return shared_memory.SharedMemory(name=name, create=create, size=size, track=False)
+    shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+def _unlink(name):
+    try:
+        shm = _open_segment(name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    if not _UNTRACKED_OPEN:
+        # unlink() מבטל את הרישום בעצמו
+        resource_tracker.register(shm._name, "shared_memory")
+    shm.unlink()
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+# כל מפה מפרסמת קבוצות מערכים נפרדות (למשל המסכות בטעינה וגרף השלד כשהוא נבנה), לכל אחת מניפסט ונעילה משלה
+def _registry_name(digest, group):
+    return f"{digest}.{group}"
+
+
+@contextmanager
+def _registry_lock(name):
+    os.makedirs(REGISTRY_DIR, exist_ok=True)
+    with open(os.path.join(REGISTRY_DIR, f"{name}.lock"), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _manifest_path(name):
+    return os.path.join(REGISTRY_DIR, f"{name}.json")
+
+
+def _read_manifest(name):
+    try:
+        with open(_manifest_path(name), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    # workers שמתו בלי לשחרר את המפה לא נספרים
+    manifest["refs"] = {pid: count for pid, count in manifest["refs"].items() if _alive(int(pid))}
+    return manifest
+
+
+def _write_manifest(name, manifest):
+    path = _manifest_path(name)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+def _destroy(name, manifest):
+    for segment in manifest["segments"].values():
+        _unlink(segment["name"])
+    try:
+        os.remove(_manifest_path(name))
+    except FileNotFoundError:
+        pass
+
+
+class SharedArrays:
+    """
+    Read-only numpy views of one group of a map's arrays in named shared-memory segments.
+    release() drops this process's reference; the last reference unlinks the segments.
+    """
+
+    def __init__(self, digest, group, segments):
+        self.digest = digest
+        self.group = group
+        self.arrays = {}
+        self._handles = []
+        for key, segment in segments.items():
+            shm = _open_segment(segment["name"])
+            # frombuffer מחזיק את ה-buffer כל עוד קיים view, כך ש-close() נכשל ב-BufferError במקום לשחרר זיכרון בשימוש
+            count = int(dep.np.prod(segment["shape"]))
+            array = dep.np.frombuffer(shm.buf, dtype=segment["dtype"], count=count).reshape(segment["shape"])
+            array.flags.writeable = False
+            self._handles.append(shm)
+            self.arrays[key] = array
+        self._released = False
+
+    def __getitem__(self, key):
+        return self.arrays[key]
+
+    def nbytes(self):
+        return sum(array.nbytes for array in self.arrays.values())
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        pid = str(os.getpid())
+        name = _registry_name(self.digest, self.group)
+        with _registry_lock(name):
+            manifest = _read_manifest(name)
+            if manifest is not None:
+                count = manifest["refs"].pop(pid, 0) - 1
+                if count > 0:
+                    manifest["refs"][pid] = count
+                if manifest["refs"]:
+                    _write_manifest(name, manifest)
+                else:
+                    _destroy(name, manifest)
+        self.arrays = {}
+        _close_unclosed(skip=self.digest)
+        for shm in self._handles:
+            _close(shm, self.digest)
+        self._handles = []
+
+
+def _publish(digest, group, arrays):
+    segments = {}
+    try:
+        for key, array in arrays.items():
+            array = dep.np.ascontiguousarray(array)
+            name = _segment_name(digest, group, key)
+            _unlink(name)  # שארית של תהליך שקרס
+            shm = _open_segment(name, create=True, size=max(1, array.nbytes))
+            dep.np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+            shm.close()
+            segments[key] = {"name": name, "shape": list(array.shape), "dtype": array.dtype.str}
+    except Exception:
+        for segment in segments.values():
+            _unlink(segment["name"])
+        raise
+    return {"segments": segments, "refs": {}}
+
+
+# Attaches to the `group` arrays of map `digest`, publishing build() (a dict of name → ndarray) first
+# if no worker has published them yet. Workers asking for the same arrays wait for a single build.
+def acquire(digest, build, group="map"):
+    _close_unclosed()
+    pid = str(os.getpid())
+    name = _registry_name(digest, group)
+    with _registry_lock(name):
+        manifest = _read_manifest(name)
+        if manifest is None:
+            manifest = _publish(digest, group, build())
+        try:
+            shared = SharedArrays(digest, group, manifest["segments"])
+        except FileNotFoundError:
+            _destroy(name, manifest)
+            manifest = _publish(digest, group, build())
+            shared = SharedArrays(digest, group, manifest["segments"])
+        manifest["refs"][pid] = manifest["refs"].get(pid, 0) + 1
+        _write_manifest(name, manifest)
+    return shared
+
+
+# Packs a graph as arrays: node coordinates, CSR offsets into the edge arrays, edge targets (node index) and weights.
+# Only plain numeric weights are supported (the skeleton graph).
+def graph_to_arrays(node_list, adjacency_dict):
+    nodes = list(adjacency_dict)
+    index = {node: i for i, node in enumerate(nodes)}
+    offsets = [0]
+    targets, weights = [], []
+    for node in nodes:
+        for _, v, w in adjacency_dict[node]:
+            targets.append(index[v])
+            weights.append(w)
+        offsets.append(len(targets))
+    return {
+        "nodes": dep.np.array(nodes, dtype=dep.np.int32).reshape(-1, 2),
+        "node_list": dep.np.array([index[node] for node in node_list], dtype=dep.np.int32),
+        "offsets": dep.np.array(offsets, dtype=dep.np.int64),
+        "targets": dep.np.array(targets, dtype=dep.np.int32),
+        "weights": dep.np.array(weights, dtype=dep.np.float64),
+    }
+
+
+# Rebuilds (node_list, adjacency_dict) from graph_to_arrays output
+def arrays_to_graph(arrays):
+    nodes = [tuple(p) for p in arrays["nodes"].tolist()]
+    offsets = arrays["offsets"].tolist()
+    targets = arrays["targets"].tolist()
+    weights = arrays["weights"].tolist()
+    adjacency_dict = {}
+    for i, node in enumerate(nodes):
+        adjacency_dict[node] = [[node, nodes[targets[k]], weights[k]] for k in range(offsets[i], offsets[i + 1])]
+    return [nodes[i] for i in arrays["node_list"].tolist()], adjacency_dict
@@ -0,0 +1,161 @@
+import os
+import math
+import json
+import shutil
+import tempfile
+from shared import dependencies as dep
+from services.artifacts import file_etag, prune_folders
+
+TILE_SIZE = 256
+ROUTE_COLOR = (255, 0, 0)
+ROUTE_THICKNESS = 2
+
+TILES_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'static', 'outputs', 'tiles')
+BASE_FOLDER = os.path.join(TILES_FOLDER, 'base')
+MANIFEST_NAME = "pyramid.json"
+# פירמידות בסיס שמורות – עד TILE_PYRAMIDS_MAX מהן, ולא יותר מ-TILE_PYRAMID_MAX_AGE שניות מהשימוש האחרון
+TILE_PYRAMIDS_MAX = int(os.environ.get("SKYOPS_TILE_PYRAMIDS_MAX", "32"))
+TILE_PYRAMID_MAX_AGE = float(os.environ.get("SKYOPS_TILE_PYRAMID_MAX_AGE", str(30 * 86400)))
+
+
+# Returns the highest zoom level: at max_zoom the image is at full resolution, each level below halves it
+def max_zoom_level(width, height, tile_size=TILE_SIZE):
+    return max(0, math.ceil(math.log2(max(width, height) / tile_size)))
+
+
+def tile_name(x, y):
+    return f"{x}_{y}.png"
+
+
+# Cuts one pyramid level into tile_size × tile_size tiles (edge tiles are smaller)
+def write_level_tiles(level_image, folder, tile_size=TILE_SIZE):
+    os.makedirs(folder, exist_ok=True)
+    height, width = level_image.shape[:2]
+    for ty in range(0, math.ceil(height / tile_size)):
+        for tx in range(0, math.ceil(width / tile_size)):
+            tile = level_image[ty * tile_size:(ty + 1) * tile_size, tx * tile_size:(tx + 1) * tile_size]
+            dep.cv2.imwrite(os.path.join(folder, tile_name(tx, ty)), tile)
+
+
+# Builds the base tile pyramid of a satellite image in `folder` and returns its manifest
+def build_base_pyramid(satellite_image, folder, tile_size=TILE_SIZE):
+    height, width = satellite_image.shape[:2]
+    max_zoom = max_zoom_level(width, height, tile_size)
+    level_image = satellite_image
+    for z in range(max_zoom, -1, -1):
+        write_level_tiles(level_image, os.path.join(folder, str(z)), tile_size)
+        if z > 0:
+            size = (max(1, level_image.shape[1] // 2), max(1, level_image.shape[0] // 2))
+            level_image = dep.cv2.resize(level_image, size, interpolation=dep.cv2.INTER_AREA)
+    manifest = {"width": width, "height": height, "tileSize": tile_size, "minZoom": 0, "maxZoom": max_zoom}
+    with open(os.path.join(folder, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    return manifest
+
+
+# Returns (digest, manifest) of the cached base pyramid for this satellite image, building it on first use.
+# The least recently used pyramids beyond TILE_PYRAMIDS_MAX, and those unused for TILE_PYRAMID_MAX_AGE, are removed.
+def ensure_base_pyramid(satellite_path, tile_size=TILE_SIZE):
+    digest = file_etag(satellite_path)
+    folder = os.path.join(BASE_FOLDER, digest)
+    manifest_path = os.path.join(folder, MANIFEST_NAME)
+    if os.path.isfile(manifest_path):
+        os.utime(folder)
+        with open(manifest_path, encoding="utf-8") as f:
+            return digest, json.load(f)
+
+    satellite_image = dep.cv2.imread(satellite_path)
+    if satellite_image.shape[2] == 4:
+        satellite_image = dep.cv2.cvtColor(satellite_image, dep.cv2.COLOR_BGRA2BGR)
+
+    # בונים בתיקייה זמנית ומעבירים בבת אחת, כך שעובד אחר לעולם לא רואה פירמידה חלקית
+    os.makedirs(BASE_FOLDER, exist_ok=True)
+    tmp_folder = tempfile.mkdtemp(dir=BASE_FOLDER, prefix=f".{digest[:8]}-")
+    manifest = build_base_pyramid(satellite_image, tmp_folder, tile_size)
+    try:
+        os.rename(tmp_folder, folder)
+    except OSError:
+        shutil.rmtree(tmp_folder, ignore_errors=True)
+        # רק אם עובד אחר כבר העביר פירמידה שלמה למקום; כל כשל אחר עולה למעלה
+        if not os.path.isfile(manifest_path):
+            raise
+    prune_folders(BASE_FOLDER, TILE_PYRAMIDS_MAX, TILE_PYRAMID_MAX_AGE)
+    return digest, manifest
+
+
+# Liang–Barsky: whether the segment p–q crosses the rectangle [x0, x1] × [y0, y1]
+def segment_hits_rect(p, q, x0, y0, x1, y1):
+    t0, t1 = 0.0, 1.0
+    for start, delta, low, high in ((p[0], q[0] - p[0], x0, x1), (p[1], q[1] - p[1], y0, y1)):
+        if delta == 0:
+            if start < low or start > high:
+                return False
+            continue
+        ta, tb = (low - start) / delta, (high - start) / delta
+        t0, t1 = max(t0, min(ta, tb)), min(t1, max(ta, tb))
+        if t0 > t1:
+            return False
+    return True
+
+
+# Returns the tiles at zoom z that the polyline (full-resolution pixels) passes through, padded by the line width
+def route_tiles(path_int, z, manifest):
+    tile_size = manifest["tileSize"]
+    scale = 2.0 ** (z - manifest["maxZoom"])
+    level_w = max(1, int(manifest["width"] * scale))
+    level_h = max(1, int(manifest["height"] * scale))
+    max_tx = (level_w - 1) // tile_size
+    max_ty = (level_h - 1) // tile_size
+    # עובי הקו ועיגול הנקודות לפיקסלים
+    pad = ROUTE_THICKNESS + 1
+
+    tiles = set()
+    points = [(x * scale, y * scale) for (x, y) in path_int]
+    for p, q in zip(points, points[1:] or points):
+        # כל אריח בתיבה החוסמת של הקטע נבדק מול הקטע, כשהאריח מורחב בעובי הקו
+        for tx in range(max(0, int((min(p[0], q[0]) - pad) // tile_size)),
+                        min(max_tx, int((max(p[0], q[0]) + pad) // tile_size)) + 1):
+            for ty in range(max(0, int((min(p[1], q[1]) - pad) // tile_size)),
+                            min(max_ty, int((max(p[1], q[1]) + pad) // tile_size)) + 1):
+                if segment_hits_rect(p, q, tx * tile_size - pad, ty * tile_size - pad,
+                                     (tx + 1) * tile_size - 1 + pad, (ty + 1) * tile_size - 1 + pad):
+                    tiles.add((tx, ty))
+    return scale, sorted(tiles)
+
+
+# Re-encodes only the route-touching tiles of every zoom level into out_folder; returns {z: ["x_y", ...]}
+def render_route_tiles(path_int, manifest, base_folder, out_folder):
+    tile_size = manifest["tileSize"]
+    rendered = {}
+    for z in range(manifest["minZoom"], manifest["maxZoom"] + 1):
+        scale, tiles = route_tiles(path_int, z, manifest)
+        level_folder = os.path.join(out_folder, str(z))
+        os.makedirs(level_folder, exist_ok=True)
+        for tx, ty in tiles:
+            tile = dep.cv2.imread(os.path.join(base_folder, str(z), tile_name(tx, ty)))
+            offset = dep.np.array([tx * tile_size, ty * tile_size], dtype=dep.np.float64)
+            pts = dep.np.round(dep.np.array(path_int, dtype=dep.np.float64) * scale - offset).astype(dep.np.int32)
+            dep.cv2.polylines(tile, [pts.reshape(-1, 1, 2)], False, ROUTE_COLOR, ROUTE_THICKNESS)
+            dep.cv2.imwrite(os.path.join(level_folder, tile_name(tx, ty)), tile)
+        rendered[str(z)] = [f"{tx}_{ty}" for tx, ty in tiles]
+    return rendered
+
+
+# Renders the route overlay of one mission as tiles and returns the tile description for the response
+def render_mission_tiles(path_int, satellite_path, output_folder, outputs_url, mission_folder):
+    digest, manifest = ensure_base_pyramid(satellite_path)
+    base_folder = os.path.join(BASE_FOLDER, digest)
+    out_folder = os.path.join(output_folder, mission_folder, "tiles")
+    route = render_route_tiles(path_int, manifest, base_folder, out_folder)
+
+    description = {
+        **manifest,
+        "baseUrlTemplate": f"{outputs_url}tiles/base/{digest}/{{z}}/{{x}}_{{y}}.png",
+        "routeUrlTemplate": f"{outputs_url}{mission_folder}/tiles/{{z}}/{{x}}_{{y}}.png",
+        "routeTiles": route,
+        "baseManifestUrl": f"{outputs_url}tiles/base/{digest}/{MANIFEST_NAME}",
+        "manifestUrl": f"{outputs_url}{mission_folder}/tiles/{MANIFEST_NAME}",
+    }
+    with open(os.path.join(out_folder, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(description, f)
+    return description
@@ -1,10 +1,58 @@
-import cv2
-import numpy as np
-import matplotlib.pyplot as plt
-#import tkinter as tk
-#from tkinter import filedialog
-from skimage.morphology import skeletonize
-from skimage.measure import label, regionprops
-from skimage.draw import line
+"""
+Heavy third-party dependencies shared by the core and services modules.
+
+Modules use them as attributes (dep.cv2, dep.np, dep.skeletonize, ...). Each one is
+imported on first access and cached in this module's globals, so a worker only pays
+for what its requests actually use (e.g. matplotlib is loaded only by utils.visualization).
+Call warm_up() to import them ahead of the first request.
+"""
+
+import importlib
+import time
 from collections import deque
 import heapq
+
+# שם המאפיין → (מודול לייבוא, מאפיין בתוך המודול או None למודול עצמו)
+_LAZY_ATTRIBUTES = {
+    "cv2": ("cv2", None),
+    "np": ("numpy", None),
+    "plt": ("matplotlib.pyplot", None),
+    "skeletonize": ("skimage.morphology", "skeletonize"),
+    "label": ("skimage.measure", "label"),
+    "regionprops": ("skimage.measure", "regionprops"),
+    "line": ("skimage.draw", "line"),
+}
+
+# מה שהצינור של create_mission צריך; matplotlib נשאר עצל
+DEFAULT_WARM_UP = ("np", "cv2", "skeletonize", "label", "regionprops", "line")
+
+
+def __getattr__(name):
+    try:
+        module_name, attribute = _LAZY_ATTRIBUTES[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = importlib.import_module(module_name)
+    if attribute is not None:
+        value = getattr(value, attribute)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
+
+
+def is_loaded(name):
+    return name in globals()
+
+
+# Imports the given dependencies now and returns the seconds each one took (0 if already loaded)
+def warm_up(names=DEFAULT_WARM_UP):
+    timings = {}
+    for name in names:
+        start = time.perf_counter()
+        if not is_loaded(name):
+            __getattr__(name)
+        timings[name] = time.perf_counter() - start
+    return timings
@@ -0,0 +1,57 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+MAPS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'static', 'uploads')
+
+
+# Binary images of the maps bundled in static/uploads, loaded once per test session
+@pytest.fixture(scope="session")
+def load_binary():
+    from core.image_loader import load_and_preprocess_image
+    images = {}
+
+    def load(name):
+        if name not in images:
+            images[name] = load_and_preprocess_image(os.path.join(MAPS_FOLDER, name))[1]
+        return images[name]
+    return load
+
+
+# Building masks of the bundled maps
+@pytest.fixture(scope="session")
+def load_mask(load_binary):
+    masks = {}
+
+    def load(name):
+        if name not in masks:
+            masks[name] = (load_binary(name) == 1).astype("uint8")
+        return masks[name]
+    return load
+
+
+# Skeleton graph (final_image, node_list, adjacency_dict) of a bundled map, built once; callers must copy it
+@pytest.fixture(scope="session")
+def load_skeleton_graph(load_binary):
+    from core.graph_builder import build_skeleton_graph
+    graphs = {}
+
+    def load(name):
+        if name not in graphs:
+            graphs[name] = build_skeleton_graph(load_binary(name))
+        return graphs[name]
+    return load
+
+
+def copy_graph(adjacency_dict):
+    return {node: [list(edge) for edge in edges] for node, edges in adjacency_dict.items()}
+
+
+# Asserts that no segment of `path` crosses a building pixel
+def assert_clear_path(path, building_mask):
+    from core.graph_builder import line_intersects_building
+    for (x1, y1), (x2, y2) in zip(path, path[1:]):
+        assert not line_intersects_building(x1, y1, x2, y2, building_mask), f"({x1}, {y1}) -> ({x2}, {y2})"
@@ -0,0 +1,219 @@
+import io
+import struct
+import threading
+import time
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from services.admission import (AdmissionController, AdmissionRejected, image_dimensions, mission_cost,
+                                _png_size, _jpeg_size)
+
+
+def _wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached")
+        time.sleep(0.001)
+
+
+class _Holder:
+    """Keeps one admitted request running until release() is called."""
+
+    def __init__(self, controller, cost):
+        self._admitted = threading.Event()
+        self._release = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(controller, cost))
+        self._thread.start()
+        assert self._admitted.wait(2)
+
+    def _run(self, controller, cost):
+        with controller.admit(cost):
+            self._admitted.set()
+            self._release.wait(2)
+
+    def release(self):
+        self._release.set()
+        self._thread.join(2)
+
+
+def _queue_request(controller, cost, order, name, errors):
+    def run():
+        try:
+            with controller.admit(cost):
+                order.append(name)
+        except AdmissionRejected as rejection:
+            errors.append((name, rejection.reason))
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+# Admission control
+
+def test_admits_immediately_within_capacity():
+    controller = AdmissionController(capacity=2, max_queue=4, max_wait_seconds=1)
+    with controller.admit(1):
+        with controller.admit(1):
+            assert controller.stats()["inFlight"] == 2
+    stats = controller.stats()
+    assert stats["inFlight"] == 0
+    assert stats["admitted"] == 2
+    assert stats["queued"] == 0
+
+
+def test_waiting_requests_are_admitted_in_fifo_order():
+    controller = AdmissionController(capacity=1, max_queue=4, max_wait_seconds=2)
+    holder = _Holder(controller, 0.5)
+    order, errors = [], []
+    first = _queue_request(controller, 1, order, "first", errors)
+    _wait_until(lambda: controller.stats()["queueDepth"] == 1)
+    # fits next to the running request, but must not overtake the one already waiting
+    second = _queue_request(controller, 0.1, order, "second", errors)
+    _wait_until(lambda: controller.stats()["queueDepth"] == 2)
+    assert order == []
+
+    holder.release()
+    first.join(2)
+    second.join(2)
+    assert order == ["first", "second"]
+    assert errors == []
+    assert controller.stats()["queued"] == 2
+
+
+def test_wait_times_out():
+    controller = AdmissionController(capacity=1, max_queue=4, max_wait_seconds=0.05)
+    holder = _Holder(controller, 1)
+    try:
+        with pytest.raises(AdmissionRejected) as rejected:
+            with controller.admit(1):
+                pass
+    finally:
+        holder.release()
+    assert rejected.value.reason == "queue wait timed out"
+    assert rejected.value.retry_after >= 1
+    stats = controller.stats()
+    assert stats["rejectedTimeout"] == 1
+    assert stats["queueDepth"] == 0
+
+
+def test_full_queue_rejects_at_once():
+    controller = AdmissionController(capacity=1, max_queue=0, max_wait_seconds=5)
+    holder = _Holder(controller, 1)
+    started = time.monotonic()
+    try:
+        with pytest.raises(AdmissionRejected) as rejected:
+            with controller.admit(1):
+                pass
+    finally:
+        holder.release()
+    assert rejected.value.reason == "queue full"
+    assert time.monotonic() - started < 1
+    assert controller.stats()["rejectedQueueFull"] == 1
+
+
+def test_oversize_request_runs_alone():
+    controller = AdmissionController(capacity=1, max_queue=4, max_wait_seconds=0.05)
+    # nothing running: admitted although it costs more than the whole capacity
+    with controller.admit(5):
+        assert controller.stats()["inFlight"] == 1
+        # while it runs, even a small request waits
+        with pytest.raises(AdmissionRejected) as rejected:
+            with controller.admit(0.1):
+                pass
+    assert rejected.value.reason == "queue wait timed out"
+    assert controller.stats()["admitted"] == 1
+
+
+def test_oversize_request_waits_for_running_requests():
+    controller = AdmissionController(capacity=1, max_queue=4, max_wait_seconds=2)
+    holder = _Holder(controller, 0.2)
+    order, errors = [], []
+    oversize = _queue_request(controller, 5, order, "oversize", errors)
+    _wait_until(lambda: controller.stats()["queueDepth"] == 1)
+    assert order == []
+    holder.release()
+    oversize.join(2)
+    assert order == ["oversize"]
+    assert errors == []
+
+
+def test_zero_capacity_disables_admission_control():
+    controller = AdmissionController(capacity=0, max_queue=0, max_wait_seconds=0)
+    with controller.admit(100):
+        with controller.admit(100):
+            pass
+    assert controller.stats()["admitted"] == 0
+
+
+# Cost estimate
+
+def _png(width, height):
+    return b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR" + struct.pack(">II", width, height) + b"\x08\x02\x00\x00\x00"
+
+
+def _upload(data):
+    return FileStorage(stream=io.BytesIO(data), filename="map.png")
+
+
+def test_mission_cost_weighs_planner_and_waypoints():
+    buildings, satellite = _upload(_png(1000, 1000)), _upload(_png(1000, 1000))
+    skeleton = mission_cost(buildings, satellite)
+    assert mission_cost(buildings, satellite, map_cached=True) < skeleton
+    assert mission_cost(buildings, satellite, waypoints=10) > skeleton
+    assert mission_cost(buildings, satellite, planner="visibility") > skeleton
+    assert (mission_cost(buildings, satellite, planner="theta", theta_downsample=4)
+            < skeleton
+            < mission_cost(buildings, satellite, planner="theta", theta_downsample=1))
+
+
+# Header parsers
+
+def _jpeg(width, height, fill=0, before_sof=b""):
+    app0 = b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"
+    sof0 = b"\xff" * fill + b"\xff\xc0" + struct.pack(">HBHHB", 17, 8, height, width, 3) + b"\x00" * 9
+    return b"\xff\xd8" + app0 + before_sof + sof0 + b"\xff\xda\x00\x08" + b"\x00" * 6 + b"\xff\xd9"
+
+
+def test_png_size():
+    assert _png_size(_png(640, 480)[:24]) == (640, 480)
+    assert _png_size(b"GIF89a" + b"\x00" * 18) is None
+
+
+def test_jpeg_size():
+    assert _jpeg_size(io.BytesIO(_jpeg(1151, 807))) == (1151, 807)
+
+
+def test_jpeg_size_skips_fill_bytes():
+    assert _jpeg_size(io.BytesIO(_jpeg(300, 200, fill=3))) == (300, 200)
+
+
+def test_jpeg_size_truncated_frame_header():
+    data = _jpeg(300, 200)
+    truncated = data[:data.index(b"\xff\xc0") + 6]
+    assert _jpeg_size(io.BytesIO(truncated)) is None
+
+
+def test_jpeg_size_without_frame_header():
+    data = b"\xff\xd8\xff\xda\x00\x08" + b"\x00" * 6 + b"\xff\xd9"
+    assert _jpeg_size(io.BytesIO(data)) is None
+
+
+def test_image_dimensions_rewinds_the_upload():
+    upload = _upload(_jpeg(64, 32, fill=1))
+    assert image_dimensions(upload) == (64, 32)
+    assert upload.stream.tell() == 0
+
+
+def test_image_dimensions_of_encoded_images():
+    cv2 = pytest.importorskip("cv2")
+    np = pytest.importorskip("numpy")
+    image = np.zeros((45, 70, 3), dtype=np.uint8)
+    for ext in (".png", ".jpg"):
+        upload = _upload(cv2.imencode(ext, image)[1].tobytes())
+        assert image_dimensions(upload) == (70, 45)
+
+
+def test_image_dimensions_unknown_format():
+    assert image_dimensions(_upload(b"not an image")) is None
@@ -0,0 +1,108 @@
+import io
+import os
+
+from services.content_store import ContentStore
+
+
+class _Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _store(tmp_path, clock, max_bytes=1 << 20, max_age_seconds=3600, grace_seconds=10):
+    return ContentStore(tmp_path / "blobs", tmp_path / "index.sqlite", max_bytes, max_age_seconds,
+                        grace_seconds=grace_seconds, clock=clock)
+
+
+# Deduplication
+
+def test_same_bytes_are_stored_once(tmp_path):
+    store = _store(tmp_path, _Clock())
+    digest, path = store.put_bytes(b"map bytes", ".png")
+    assert store.put_bytes(b"map bytes", ".png") == (digest, path)
+    # the content decides, not the name: a stream of the same bytes with another extension finds the stored file
+    assert store.put_stream(io.BytesIO(b"map bytes"), ".jpg") == (digest, path)
+    assert open(path, "rb").read() == b"map bytes"
+    assert store.stats()["blobs"] == 1
+    assert store.stats()["bytes"] == len(b"map bytes")
+    assert [name for name in os.listdir(store.root) if name.endswith(".tmp")] == []
+
+
+def test_known_digest_is_not_read_again(tmp_path):
+    store = _store(tmp_path, _Clock())
+    digest, path = store.put_bytes(b"map bytes", ".png")
+
+    class _Unreadable:
+        def read(self, size):
+            raise AssertionError("the stream was read")
+
+    assert store.put_stream(_Unreadable(), ".png", digest=digest) == (digest, path)
+
+
+def test_unknown_extension_is_stored_as_bin(tmp_path):
+    store = _store(tmp_path, _Clock())
+    _, path = store.put_bytes(b"data", ".PNG?x")
+    assert path.endswith(".bin")
+
+
+# Eviction
+
+def test_size_eviction_removes_least_recently_used(tmp_path):
+    clock = _Clock()
+    store = _store(tmp_path, clock, max_bytes=350)
+    first, _ = store.put_bytes(b"a" * 100, ".bin")
+    clock.now += 20
+    second, _ = store.put_bytes(b"b" * 100, ".bin")
+    clock.now += 20
+    third, _ = store.put_bytes(b"c" * 100, ".bin")
+    clock.now += 60
+    assert store.path(first) is not None  # used again: now the most recently used of the three
+    fourth, _ = store.put_bytes(b"d" * 100, ".bin")
+
+    assert store.path(second) is None
+    assert all(store.path(digest) is not None for digest in (first, third, fourth))
+    assert store.total_bytes() == 300
+
+
+def test_age_eviction(tmp_path):
+    clock = _Clock()
+    store = _store(tmp_path, clock, max_age_seconds=100)
+    old, old_path = store.put_bytes(b"old", ".bin")
+    clock.now += 90
+    recent, _ = store.put_bytes(b"recent", ".bin")
+    clock.now += 60
+
+    assert store.evict() == 1
+    assert store.path(old) is None
+    assert not os.path.exists(old_path)
+    assert store.path(recent) is not None
+
+
+def test_recently_used_blobs_survive_eviction(tmp_path):
+    clock = _Clock()
+    store = _store(tmp_path, clock, max_bytes=1, max_age_seconds=0, grace_seconds=10)
+    digest, _ = store.put_bytes(b"in use", ".bin")
+    clock.now += 5
+    assert store.evict() == 0
+    assert store.path(digest) is not None
+    clock.now += 20
+    assert store.evict() == 1
+
+
+def test_evicted_blob_drops_its_derived_links(tmp_path):
+    clock = _Clock()
+    store = _store(tmp_path, clock, max_age_seconds=100)
+    source, _ = store.put_bytes(b"map", ".png")
+    store.put_derived(source, "mask:v1", b"mask", ".npy")
+    assert store.derived(source, "mask:v1") is not None
+    clock.now += 50
+    store.path(source)
+    clock.now += 100
+
+    assert store.evict() == 1
+    assert store.derived(source, "mask:v1") is None
+    assert store.path(source) is not None
+    assert store.stats()["derived"] == 0
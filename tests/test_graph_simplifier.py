@@ -0,0 +1,111 @@
+import math
+import random
+
+import pytest
+
+from conftest import copy_graph
+from core.pathfinder import dijkstra_many
+from core.graph_simplifier import (simplify_graph, merge_nearby_junctions, contract_degree2, expand_path,
+                                   connect_to_simplified, polyline_length, edge_weight)
+
+
+def _graph(*edges):
+    adjacency = {}
+    for u, v in edges:
+        w = math.dist(u, v)
+        adjacency.setdefault(u, []).append([u, v, w])
+        adjacency.setdefault(v, []).append([v, u, w])
+    return adjacency
+
+
+def _assert_same_distances(original, simplified, sources):
+    kept = list(simplified)
+    for source in sources:
+        expected, _ = dijkstra_many(source, kept, original)
+        actual, _ = dijkstra_many(source, kept, simplified)
+        for node in kept:
+            assert actual[node] == pytest.approx(expected[node]), (source, node)
+
+
+def _no_buildings(shape=(100, 100)):
+    np = pytest.importorskip("numpy")
+    return np.zeros(shape, dtype=np.uint8)
+
+
+# Two junctions joined by a long bent chain and a short direct chain, plus a dead end and a separate ring
+GRAPH = _graph(
+    ((0, 0), (10, 0)), ((10, 0), (20, 5)), ((20, 5), (30, 0)), ((30, 0), (40, 0)),
+    ((0, 0), (0, 20)), ((0, 20), (20, 30)), ((20, 30), (40, 20)), ((40, 20), (40, 0)),
+    ((40, 0), (50, 0)), ((50, 0), (60, 5)),
+    ((0, 0), (-10, -10)),
+    ((80, 80), (90, 80)), ((90, 80), (90, 90)), ((90, 90), (80, 90)), ((80, 90), (80, 80)),
+)
+
+
+def test_contraction_keeps_junctions_and_distances():
+    simplified = contract_degree2(GRAPH)
+    assert {(0, 0), (40, 0), (60, 5), (-10, -10)} <= set(simplified)
+    assert (10, 0) not in simplified and (20, 30) not in simplified
+    # one node of the ring is kept
+    assert len([node for node in simplified if node[0] >= 80]) == 1
+    _assert_same_distances(GRAPH, simplified, [node for node in simplified])
+
+
+def test_contracted_edges_keep_their_polyline():
+    simplified = contract_degree2(GRAPH)
+    edge = min((e for e in simplified[(0, 0)] if e[1] == (40, 0)), key=lambda e: edge_weight(e[2]))
+    weight, polyline = edge[2]
+    assert polyline == ((0, 0), (10, 0), (20, 5), (30, 0), (40, 0))
+    assert weight == pytest.approx(polyline_length(polyline))
+
+
+def test_protected_nodes_are_kept():
+    simplified = contract_degree2(GRAPH, protected=[(20, 5)])
+    assert (20, 5) in simplified
+    _assert_same_distances(GRAPH, simplified, [(0, 0), (20, 5)])
+
+
+def test_expanded_path_has_the_original_length():
+    simplified, stats = simplify_graph(GRAPH, _no_buildings(), merge_radius=0)
+    assert stats["nodesBefore"] == len(GRAPH)
+    assert stats["nodesAfter"] == len(simplified)
+    distances, came_from = dijkstra_many((-10, -10), [(60, 5)], simplified)
+    path = [(60, 5)]
+    while path[-1] != (-10, -10):
+        path.append(came_from[path[-1]])
+    expanded = expand_path(path[::-1], simplified)
+    assert expanded[:3] == [(-10, -10), (0, 0), (10, 0)]
+    assert polyline_length(expanded) == pytest.approx(distances[(60, 5)])
+
+
+def test_point_attaches_inside_a_contracted_edge():
+    np = pytest.importorskip("numpy")
+    simplified = contract_degree2(GRAPH)
+    image = np.zeros((100, 100, 3), dtype=np.uint8)
+    building_mask = _no_buildings()
+    assert connect_to_simplified((20, 8), simplified, building_mask, image, candidates=list(simplified))
+    # the chain was split at its vertex (20, 5), which now joins the new point to both junctions
+    assert {e[1] for e in simplified[(20, 5)]} >= {(0, 0), (40, 0), (20, 8)}
+    distances, _ = dijkstra_many((20, 8), [(0, 0)], simplified)
+    assert distances[(0, 0)] == pytest.approx(3 + math.dist((0, 0), (10, 0)) + math.dist((10, 0), (20, 5)))
+
+
+def test_nearby_junctions_merge_unless_a_building_is_between():
+    graph = _graph(((5, 5), (8, 5)), ((5, 5), (5, 35)), ((8, 5), (30, 30)), ((8, 5), (35, 5)))
+    merged, stats = simplify_graph(graph, _no_buildings(), merge_radius=5)
+    assert stats["nodesAfterMerge"] == len(graph) - 1
+
+    building_mask = _no_buildings((40, 40))
+    building_mask[5, 6:8] = 1
+    kept = merge_nearby_junctions(graph, 5, building_mask)
+    assert len(kept) == len(graph)
+    assert (5, 5) in kept and (8, 5) in kept
+
+
+def test_skeleton_graph_distances_are_kept(load_mask, load_skeleton_graph):
+    _, _, adjacency = load_skeleton_graph("Buildings_marked.png")
+    original = copy_graph(adjacency)
+    simplified, stats = simplify_graph(copy_graph(adjacency), load_mask("Buildings_marked.png"), merge_radius=0)
+    assert stats["nodesAfter"] < stats["nodesBefore"]
+    assert original == adjacency
+    _assert_same_distances(original, simplified, random.Random(0).sample(sorted(simplified), 5))
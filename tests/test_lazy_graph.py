@@ -0,0 +1,56 @@
+from core.lazy_graph import LazyAdjacency, build_edge_tracer
+
+
+def _neighbors(edges):
+    return sorted((tuple(int(c) for c in v), round(w, 6)) for _, v, w in edges)
+
+
+def _edge_count(adjacency_dict):
+    return len({(u, v) if u < v else (v, u) for u, edges in adjacency_dict.items() for _, v, _ in edges})
+
+
+def test_lazy_neighbors_match_the_eager_graph(load_binary, load_skeleton_graph):
+    _, node_list, adjacency_dict = load_skeleton_graph("Buildings_marked.png")
+    lazy = LazyAdjacency(build_edge_tracer(load_binary("Buildings_marked.png")))
+    assert sorted(lazy) == sorted(node_list)
+    for node in node_list:
+        assert _neighbors(lazy[node]) == _neighbors(adjacency_dict[node]), node
+
+
+def test_stats_estimate_the_edge_total_until_every_node_is_traced(load_binary, load_skeleton_graph):
+    _, node_list, adjacency_dict = load_skeleton_graph("Buildings_marked.png")
+    lazy = LazyAdjacency(build_edge_tracer(load_binary("Buildings_marked.png")))
+    stats = lazy.stats()
+    assert stats["totalEdges"] is None and stats["totalEdgesEstimated"]
+
+    for node in node_list[:len(node_list) // 4]:
+        lazy[node]
+    stats = lazy.stats()
+    assert stats["materializedNodes"] == len(node_list) // 4
+    assert stats["totalEdgesEstimated"]
+    assert 0.5 * _edge_count(adjacency_dict) < stats["totalEdges"] < 2 * _edge_count(adjacency_dict)
+
+    for node in node_list:
+        lazy[node]
+    stats = lazy.stats()
+    assert stats["totalEdges"] == stats["materializedEdges"] == _edge_count(adjacency_dict)
+    assert not stats["totalEdgesEstimated"]
+
+
+def test_stats_use_the_eager_edge_count_when_given(load_binary):
+    lazy = LazyAdjacency(build_edge_tracer(load_binary("Buildings_marked.png")), total_edges=1833)
+    stats = lazy.stats()
+    assert stats["totalEdges"] == 1833
+    assert not stats["totalEdgesEstimated"]
+    assert stats["materializedEdges"] == 0
+
+
+def test_points_added_to_the_lazy_graph(load_binary):
+    lazy = LazyAdjacency(build_edge_tracer(load_binary("Buildings_marked.png")))
+    node = next(iter(lazy))
+    lazy[(0, 0)] = [[(0, 0), node, 1.0]]
+    lazy[node].append([node, (0, 0), 1.0])
+    assert (0, 0) in lazy and len(lazy) == lazy.stats()["nodes"]
+    assert [node, (0, 0), 1.0] in lazy[node]
+    del lazy[(0, 0)]
+    assert (0, 0) not in lazy
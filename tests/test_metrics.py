@@ -0,0 +1,75 @@
+import math
+
+import pytest
+
+from core.metrics import compute_path_metrics, parse_metric_groups, METRIC_GROUPS, DEFAULT_METRIC_GROUPS
+
+# Straight, then a right-angle turn, then a repeated point (two NaN angles), then a diagonal
+PATH = [(0, 0), (10, 0), (20, 0), (20, 10), (20, 10), (30, 20)]
+LENGTH = 30 + math.hypot(10, 10)
+
+
+def test_length_metrics():
+    length = compute_path_metrics(PATH, groups=("length",))["length"]
+    assert length["pathLength"] == pytest.approx(LENGTH)
+    assert length["nodes"] == 6
+    assert length["avgStepLength"] == pytest.approx(LENGTH / 5)
+    assert length["maxStepLength"] == pytest.approx(math.hypot(10, 10))
+
+
+def test_turn_percentages_ignore_repeated_points():
+    turns = compute_path_metrics(PATH, groups=("turns",))["turns"]
+    # finite angles: 180 (straight) and 90 (sharp)
+    assert turns["sharpTurns"] == 1
+    assert turns["sharpTurnsPercent"] == pytest.approx(50)
+    assert turns["straightSegmentsPercent"] == pytest.approx(50)
+    assert turns["avgSmoothnessAngle"] == pytest.approx(135)
+
+
+def test_deviation_metrics():
+    deviation = compute_path_metrics(PATH, groups=("deviation",))["deviation"]
+    line_length = math.hypot(30, 20)
+    # distances of the points from the line through (0, 0) and (30, 20)
+    distances = [abs(x * 20 - y * 30) / line_length for x, y in PATH]
+    assert deviation["straightLineLength"] == pytest.approx(line_length)
+    assert deviation["detourRatio"] == pytest.approx(LENGTH / line_length)
+    assert deviation["avgDeviation"] == pytest.approx(sum(distances) / len(distances))
+    assert deviation["maxDeviation"] == pytest.approx(max(distances))
+
+
+def test_comparison_metrics():
+    comparison = compute_path_metrics([(0, 0), (10, 10)], groups=("comparison",),
+                                      path_raw=[(0, 0), (0, 10), (10, 10)])["comparison"]
+    assert comparison["nodesBefore"] == 3
+    assert comparison["nodesAfter"] == 2
+    assert comparison["nodeReductionPercent"] == pytest.approx(100 / 3)
+    assert comparison["lengthBefore"] == pytest.approx(20)
+    assert comparison["lengthReductionPercent"] == pytest.approx((1 - math.hypot(10, 10) / 20) * 100)
+
+
+def test_density_and_collisions():
+    np = pytest.importorskip("numpy")
+    building_mask = np.zeros((30, 40), dtype=np.uint8)
+    metrics = compute_path_metrics(PATH, groups=("density", "collisions"), building_mask=building_mask,
+                                   image_size=(40, 30))
+    assert metrics["density"]["nodesPerPixel"] == pytest.approx(6 / 1200)
+    assert metrics["collisions"]["crossesBuilding"] is False
+    building_mask[0, 15] = 1
+    assert compute_path_metrics(PATH, groups=("collisions",), building_mask=building_mask)["collisions"] == {
+        "crossesBuilding": True}
+
+
+def test_short_paths():
+    metrics = compute_path_metrics([(5, 5)], groups=METRIC_GROUPS)
+    assert metrics["length"]["pathLength"] == 0
+    assert metrics["turns"]["sharpTurnsPercent"] == 0
+    assert metrics["deviation"]["detourRatio"] == 1.0
+
+
+def test_parse_metric_groups():
+    assert parse_metric_groups(None) == DEFAULT_METRIC_GROUPS
+    assert parse_metric_groups("all") == METRIC_GROUPS
+    assert parse_metric_groups(" none ") == ()
+    assert parse_metric_groups("length, turns") == ("length", "turns")
+    with pytest.raises(ValueError):
+        parse_metric_groups("length,speed")
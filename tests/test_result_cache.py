@@ -0,0 +1,86 @@
+from services.result_cache import ResultCache, mission_cache_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _cache(**kwargs):
+    clock = FakeClock()
+    evicted = []
+    cache = ResultCache(clock=clock, on_evict=lambda key, value: evicted.append(key), **kwargs)
+    return cache, clock, evicted
+
+
+def test_hit_and_miss():
+    cache, _, _ = _cache(max_entries=4, ttl_seconds=10)
+    assert cache.get("a") is None
+    cache.put("a", {"success": True})
+    assert cache.get("a") == {"success": True}
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+
+def test_entries_expire_after_ttl():
+    cache, clock, evicted = _cache(max_entries=4, ttl_seconds=10)
+    cache.put("a", 1)
+    clock.now = 10
+    assert cache.get("a") == 1
+    clock.now = 10.5
+    assert cache.peek("a") is None
+    assert cache.get("a") is None
+    assert evicted == ["a"]
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache, _, evicted = _cache(max_entries=2, ttl_seconds=10)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert evicted == ["b"]
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_peek_does_not_refresh_position():
+    cache, _, evicted = _cache(max_entries=2, ttl_seconds=10)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.peek("a") == 1
+    cache.put("c", 3)
+    assert evicted == ["a"]
+    assert cache.stats()["hits"] == 0
+
+
+def test_invalid_entries_are_dropped():
+    cache, _, evicted = _cache(max_entries=2, ttl_seconds=10)
+    cache.put("a", {"files": "gone"})
+    assert cache.get("a", validate=lambda value: False) is None
+    assert evicted == ["a"]
+
+
+def test_replacing_and_disabling():
+    cache, _, evicted = _cache(max_entries=2, ttl_seconds=10)
+    cache.put("a", 1)
+    cache.put("a", 2)
+    assert evicted == ["a"]
+    assert cache.get("a") == 2
+
+    disabled, _, dropped = _cache(max_entries=0, ttl_seconds=10)
+    disabled.put("a", 1)
+    assert disabled.get("a") is None
+    assert dropped == ["a"]
+
+
+def test_mission_cache_key():
+    key = mission_cache_key("map", "satellite", {"planner": "theta", "theta_downsample": "4"})
+    assert key == mission_cache_key("map", "satellite", {"theta_downsample": "4", "planner": "theta"})
+    assert key != mission_cache_key("map", "satellite", {"planner": "theta", "theta_downsample": "2"})
+    assert key != mission_cache_key("other map", "satellite", {"planner": "theta", "theta_downsample": "4"})
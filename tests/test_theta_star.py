@@ -0,0 +1,55 @@
+import pytest
+
+from conftest import assert_clear_path
+from core.theta_star import theta_star, downsample_mask
+
+BUILDINGS_MARKED_TAKEOFF = (987, 629)
+BUILDINGS_MARKED_LANDING = (196, 123)
+
+
+@pytest.mark.parametrize("downsample", [2, 4, 8])
+def test_path_is_clear_of_buildings(load_mask, downsample):
+    building_mask = load_mask("Buildings_marked.png")
+    path = theta_star(BUILDINGS_MARKED_TAKEOFF, BUILDINGS_MARKED_LANDING, building_mask, downsample=downsample)
+    assert path[0] == BUILDINGS_MARKED_TAKEOFF
+    assert path[-1] == BUILDINGS_MARKED_LANDING
+    assert_clear_path(path, building_mask)
+
+
+# Pairs whose paths used to clip building corners on the downsampled grid
+@pytest.mark.parametrize("name, start, end, downsample", [
+    ("nablus.png", (4, 712), (912, 272), 2),
+    ("nablus.png", (1022, 517), (805, 603), 8),
+    ("Buildings_marked.png", (516, 133), (17, 574), 2),
+])
+def test_downsampled_path_does_not_clip_corners(load_mask, name, start, end, downsample):
+    building_mask = load_mask(name)
+    path = theta_star(start, end, building_mask, downsample=downsample)
+    assert path is not None
+    assert_clear_path(path, building_mask)
+
+
+def test_eager_search_is_clear_of_buildings(load_mask):
+    building_mask = load_mask("Buildings_marked.png")
+    path = theta_star(BUILDINGS_MARKED_TAKEOFF, BUILDINGS_MARKED_LANDING, building_mask, downsample=4, lazy=False)
+    assert_clear_path(path, building_mask)
+
+
+def test_straight_line_when_nothing_is_in_the_way():
+    np = pytest.importorskip("numpy")
+    building_mask = np.zeros((40, 60), dtype=np.uint8)
+    assert theta_star((2, 3), (55, 30), building_mask, downsample=4) == [(2, 3), (55, 30)]
+
+
+def test_no_path_through_a_closed_wall():
+    np = pytest.importorskip("numpy")
+    building_mask = np.zeros((40, 60), dtype=np.uint8)
+    building_mask[:, 30] = 1
+    assert theta_star((5, 5), (50, 5), building_mask, downsample=2) is None
+
+
+def test_downsample_mask_blocks_partly_built_cells():
+    np = pytest.importorskip("numpy")
+    building_mask = np.zeros((5, 5), dtype=np.uint8)
+    building_mask[4, 4] = 1
+    assert downsample_mask(building_mask, 2).tolist() == [[0, 0, 0], [0, 0, 0], [0, 0, 1]]
@@ -0,0 +1,68 @@
+import math
+import random
+import itertools
+
+import pytest
+
+from core.tour import order_tour, tour_cost, pairwise_routes, stitch_tour, _nearest_neighbour_2opt
+
+
+def _random_costs(n, seed):
+    rng = random.Random(seed)
+    points = [(rng.uniform(0, 100), rng.uniform(0, 100)) for _ in range(n)]
+    return [[math.dist(a, b) for b in points] for a in points]
+
+
+def _brute_force(cost):
+    n = len(cost)
+    return min(tour_cost([0, *inner, n - 1], cost) for inner in itertools.permutations(range(1, n - 1)))
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_order_tour_matches_brute_force(seed):
+    cost = _random_costs(6, seed)
+    order = order_tour(cost)
+    assert order[0] == 0 and order[-1] == 5
+    assert sorted(order) == list(range(6))
+    assert tour_cost(order, cost) == pytest.approx(_brute_force(cost))
+
+
+def test_order_tour_with_road_distances():
+    # non-Euclidean costs: the only cheap route is 0 -> 3 -> 1 -> 4 -> 2 -> 5
+    order = [0, 3, 1, 4, 2, 5]
+    cost = [[0.0 if i == j else 10.0 for j in range(6)] for i in range(6)]
+    for a, b in zip(order, order[1:]):
+        cost[a][b] = cost[b][a] = 1.0
+    assert order_tour(cost) == order
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_heuristic_tour_is_valid(seed):
+    cost = _random_costs(8, seed)
+    order = _nearest_neighbour_2opt(cost)
+    assert order[0] == 0 and order[-1] == 7
+    assert sorted(order) == list(range(8))
+    assert tour_cost(order, cost) >= _brute_force(cost) - 1e-9
+
+
+def test_short_tours_keep_their_order():
+    assert order_tour([[0.0]]) == [0]
+    assert order_tour(_random_costs(3, 0)) == [0, 1, 2]
+
+
+def test_pairwise_routes_and_stitching():
+    # a - b - c on a line, d hanging off b
+    a, b, c, d = (0, 0), (10, 0), (20, 0), (10, 5)
+    adjacency = {a: [], b: [], c: [], d: []}
+    for u, v in ((a, b), (b, c), (b, d)):
+        w = math.dist(u, v)
+        adjacency[u].append([u, v, w])
+        adjacency[v].append([v, u, w])
+    points = [a, d, c]
+    cost, paths = pairwise_routes(points, adjacency)
+    assert cost[0][2] == pytest.approx(20)
+    assert cost[1][2] == cost[2][1] == pytest.approx(15)
+    assert paths[(0, 1)] == [a, b, d]
+    assert paths[(1, 0)] == [d, b, a]
+    order = order_tour(cost)
+    assert stitch_tour(order, paths) == [a, b, d, b, c]
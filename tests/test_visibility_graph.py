@@ -0,0 +1,59 @@
+import random
+
+import pytest
+
+from conftest import assert_clear_path
+from core.graph_builder import line_intersects_building
+from core.visibility_graph import ENDPOINT_CLEARANCE, build_visibility_graph, visibility_path
+
+
+@pytest.fixture(scope="module")
+def nablus(load_mask):
+    building_mask = load_mask("nablus.png")
+    return building_mask, build_visibility_graph(building_mask)
+
+
+def _free_points(building_mask, count, seed):
+    rng = random.Random(seed)
+    height, width = building_mask.shape
+    points = []
+    while len(points) < count:
+        x, y = rng.randrange(width), rng.randrange(height)
+        if not building_mask[max(0, y - 1):y + 2, max(0, x - 1):x + 2].any():
+            points.append((x, y))
+    return points
+
+
+# A free endpoint with buildings a few pixels away used to see through them: its whole 9 px square counted as clear
+def test_free_endpoint_next_to_buildings(nablus):
+    building_mask, visibility_graph = nablus
+    path = visibility_path((623, 470), (649, 449), visibility_graph, building_mask)
+    assert path[0] == (623, 470) and path[-1] == (649, 449)
+    assert_clear_path(path, building_mask)
+
+
+def test_paths_between_free_points_are_collision_free(nablus):
+    building_mask, visibility_graph = nablus
+    points = _free_points(building_mask, 40, seed=7)
+    for start, end in zip(points[::2], points[1::2]):
+        path = visibility_path(start, end, visibility_graph, building_mask)
+        assert path[0] == start and path[-1] == end
+        assert_clear_path(path, building_mask)
+
+
+def test_endpoint_on_a_building_is_still_connected(nablus):
+    building_mask, visibility_graph = nablus
+    # a building pixel on the edge of a building
+    ys, xs = building_mask[1:-1, 1:-1].nonzero()
+    start = next((int(x) + 1, int(y) + 1) for y, x in zip(ys, xs)
+                 if not building_mask[y:y + 3, x:x + 3].all())
+    end = _free_points(building_mask, 1, seed=3)[0]
+    path = visibility_path(start, end, visibility_graph, building_mask)
+    assert path[0] == start and path[-1] == end
+    # only the first leg may leave the building, and only within the cleared square
+    (x1, y1), (x2, y2) = path[0], path[1]
+    cleared = building_mask.copy()
+    cleared[max(0, y1 - ENDPOINT_CLEARANCE):y1 + ENDPOINT_CLEARANCE + 1,
+            max(0, x1 - ENDPOINT_CLEARANCE):x1 + ENDPOINT_CLEARANCE + 1] = 0
+    assert not line_intersects_building(x1, y1, x2, y2, cleared)
+    assert_clear_path(path[1:], building_mask)